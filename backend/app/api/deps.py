@@ -4,6 +4,7 @@ from jose import JWTError, jwt
 from pydantic import ValidationError
 from app.schemas.auth import TokenPayload
 from app.db.mongodb import get_database
+from app.db.projections import USER_ACCOUNT_PROJECTION
 from app.core.config import settings
 from app.models.user import UserInDB
 from bson.objectid import ObjectId
@@ -35,18 +36,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
         clean_id = user_id.replace('manual_', '')
         try:
             object_id = ObjectId(clean_id)
-            user = await db.users.find_one({"_id": object_id})
+            user = await db.users.find_one({"_id": object_id}, USER_ACCOUNT_PROJECTION)
         except InvalidId:
             # If still invalid after cleanup, try finding by string ID
-            user = await db.users.find_one({"id": user_id})  # Some systems might store string IDs
+            user = await db.users.find_one({"id": user_id}, USER_ACCOUNT_PROJECTION)  # Some systems might store string IDs
     else:
         # For regular IDs, try direct ObjectId conversion
         try:
             object_id = ObjectId(user_id)
-            user = await db.users.find_one({"_id": object_id})
+            user = await db.users.find_one({"_id": object_id}, USER_ACCOUNT_PROJECTION)
         except InvalidId:
             # If invalid, try finding by string ID
-            user = await db.users.find_one({"id": user_id})
+            user = await db.users.find_one({"id": user_id}, USER_ACCOUNT_PROJECTION)
     
     if not user:
         raise HTTPException(
@@ -1,34 +1,39 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query, Body, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, status, Query, Body, UploadFile, File, Form
 from app.models.user import UserCreate, UserInDB
-from app.schemas.admin import SuperAdminCheck, SuperAdminCreate, ServiceProviderApprovalAction
+from app.schemas.admin import (
+    SuperAdminCheck, SuperAdminCreate, ServiceProviderApprovalAction,
+    BulkApprovalRequest, BulkRejectionRequest, BulkDecisionItem, BulkDecisionResult
+)
 from app.schemas.promotions import PromotionCreate, PublicEventCreate, PromotionUpdate, PublicEventUpdate, PromotionResponse
 from app.core.security import get_password_hash
 from app.db.mongodb import get_database
-from datetime import datetime
+from app.db.projections import EXISTS_PROJECTION, PROFILE_NAME_PROJECTION, USER_ACCOUNT_PROJECTION, USER_CONTACT_PROJECTION, USER_NAME_PROJECTION
+from app.db.analytics import ANALYTICS_COLLECTION, DEFAULT_RANGE_DAYS, MAX_RANGE_DAYS, summarize
+from datetime import date, datetime, timedelta
 from app.api.deps import get_current_user, get_current_admin_user
-from typing import List, Optional
+from typing import Dict, List, Optional
 from bson.objectid import ObjectId
-import cloudinary
-import cloudinary.uploader
-from app.core.config import settings
+from app.utils.storage import get_storage
+from app.utils.response_cache import response_cache, PROMOTIONS_TAG, provider_tag, provider_packages_tag
 from app.utils.email import send_approval_email, send_rejection_email
+from app.utils.booking_export import EXPORT_BATCH_SIZE, EXPORT_PROJECTION, booking_filters, check_export_format, export_response
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_SEARCH_COUNT, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER,
+    cached_count, keyset_filter, next_cursor
+)
+from app.utils.search import MAX_SEARCH_LENGTH, prefix_filter, search_fields
+from app.utils.serialization import MongoJSONResponse
+from app.db.catalogue import catalogue
 
 router = APIRouter()
 
-# Configure Cloudinary for image uploads
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
-)
-
 @router.get("/admin/check-superadmin", response_model=SuperAdminCheck)
 async def check_superadmin_exists():
     """Check if a super_admin user exists in the system"""
     db = await get_database()
     
     # Check if any super_admin exists
-    super_admin = await db.users.find_one({"role": "super_admin"})
+    super_admin = await db.users.find_one({"role": "super_admin"}, EXISTS_PROJECTION)
     
     return {"exists": super_admin is not None}
 
@@ -38,7 +43,7 @@ async def create_superadmin(admin_data: SuperAdminCreate):
     db = await get_database()
     
     # Check if any super_admin already exists
-    existing_admin = await db.users.find_one({"role": "super_admin"})
+    existing_admin = await db.users.find_one({"role": "super_admin"}, EXISTS_PROJECTION)
     if existing_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -51,7 +56,7 @@ async def create_superadmin(admin_data: SuperAdminCreate):
             {"email": admin_data.email},
             {"username": admin_data.username}
         ]
-    })
+    }, EXISTS_PROJECTION)
     
     if existing_user:
         raise HTTPException(
@@ -73,67 +78,101 @@ async def create_superadmin(admin_data: SuperAdminCreate):
         "updated_at": datetime.utcnow(),
         "profile_image": None
     }
+    super_admin.update(search_fields("users", super_admin))
     
     # Insert super admin into database
     await db.users.insert_one(super_admin)
     
     return {"message": "Super admin created successfully"}
 
+async def _admin_page(collection, query: dict, search: Optional[str], cursor: Optional[str], limit: int, projection=None):
+    """One page of an admin list, newest first by (created_at, _id), with its total and next-cursor headers"""
+    try:
+        after = keyset_filter("created_at", cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
+    search = (search or "").strip()
+    if search:
+        query = {**query, **prefix_filter(collection.name, search)}
+    total = await cached_count(collection, query, MAX_SEARCH_COUNT if search else None)
+    
+    # Seek past the cursor on the (created_at, _id) index instead of skipping rows
+    page_query = {"$and": [query, after]} if after else query
+    documents = await collection.find(page_query, projection).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    following = next_cursor(documents, "created_at", limit)
+    
+    headers = {TOTAL_COUNT_HEADER: str(total)}
+    if following:
+        headers[NEXT_CURSOR_HEADER] = following
+    return documents, headers
+
 @router.get("/admin/service-providers/pending", response_model=List[dict])
 async def get_pending_service_providers(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
+    search: Optional[str] = Query(None, max_length=MAX_SEARCH_LENGTH, description="Prefix of the name, business name or email"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
     current_admin: UserInDB = Depends(get_current_admin_user)
 ):
     """Get all pending service provider approvals"""
     db = await get_database()
     
-    # Get all service provider profiles with status pending
-    cursor = db.service_provider_profiles.find({"approval_status": "pending"}).skip(skip).limit(limit)
-    pending_providers = await cursor.to_list(length=limit)
+    # Get service provider profiles with status pending
+    pending_providers, headers = await _admin_page(
+        db.service_provider_profiles, {"approval_status": "pending"}, search, cursor, limit
+    )
     
     # Convert ObjectIds to strings for JSON serialization
     for provider in pending_providers:
         provider["id"] = str(provider["_id"])
         del provider["_id"]
     
-    return pending_providers
+    return MongoJSONResponse(pending_providers, headers=headers)
 
 @router.get("/admin/service-providers/approved", response_model=List[dict])
 async def get_approved_service_providers(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
+    search: Optional[str] = Query(None, max_length=MAX_SEARCH_LENGTH, description="Prefix of the name, business name or email"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
     current_admin: UserInDB = Depends(get_current_admin_user)
 ):
     """Get all approved service providers"""
     db = await get_database()
     
-    cursor = db.service_provider_profiles.find({"approval_status": "approved"}).skip(skip).limit(limit)
-    approved_providers = await cursor.to_list(length=limit)
+    approved_providers, headers = await _admin_page(
+        db.service_provider_profiles, {"approval_status": "approved"}, search, cursor, limit
+    )
     
     for provider in approved_providers:
         provider["id"] = str(provider["_id"])
         del provider["_id"]
     
-    return approved_providers
+    return MongoJSONResponse(approved_providers, headers=headers)
 
 @router.get("/admin/service-providers/rejected", response_model=List[dict])
 async def get_rejected_service_providers(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
+    search: Optional[str] = Query(None, max_length=MAX_SEARCH_LENGTH, description="Prefix of the name, business name or email"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
     current_admin: UserInDB = Depends(get_current_admin_user)
 ):
     """Get all rejected service providers"""
     db = await get_database()
     
-    cursor = db.service_provider_profiles.find({"approval_status": "rejected"}).skip(skip).limit(limit)
-    rejected_providers = await cursor.to_list(length=limit)
+    rejected_providers, headers = await _admin_page(
+        db.service_provider_profiles, {"approval_status": "rejected"}, search, cursor, limit
+    )
     
     for provider in rejected_providers:
         provider["id"] = str(provider["_id"])
         del provider["_id"]
     
-    return rejected_providers
+    return MongoJSONResponse(rejected_providers, headers=headers)
 
 @router.post("/admin/service-providers/{provider_id}/approve", response_model=dict)
 async def approve_service_provider(
@@ -144,7 +183,7 @@ async def approve_service_provider(
     db = await get_database()
     
     # Find the service provider profile
-    provider_profile = await db.service_provider_profiles.find_one({"_id": ObjectId(provider_id)})
+    provider_profile = await db.service_provider_profiles.find_one({"_id": ObjectId(provider_id)}, PROFILE_NAME_PROJECTION)
     if not provider_profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -152,7 +191,7 @@ async def approve_service_provider(
         )
     
     # Get the user to access their email
-    user = await db.users.find_one({"_id": ObjectId(provider_profile["user_id"])})
+    user = await db.users.find_one({"_id": ObjectId(provider_profile["user_id"])}, USER_CONTACT_PROJECTION)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -185,6 +224,10 @@ async def approve_service_provider(
         }}
     )
     
+    # Add or drop the provider in the catalogue snapshot
+    await catalogue.refresh_provider(db, provider_profile["user_id"])
+    response_cache.invalidate(provider_tag(provider_profile["user_id"]), provider_packages_tag(provider_profile["user_id"]))
+    
     # Send approval email
     business_name = provider_profile.get("business_name", "Your Business")
     provider_name = provider_profile.get("provider_name", user.get("name", "Service Provider"))
@@ -209,7 +252,7 @@ async def reject_service_provider(
     db = await get_database()
     
     # Find the service provider profile
-    provider_profile = await db.service_provider_profiles.find_one({"_id": ObjectId(provider_id)})
+    provider_profile = await db.service_provider_profiles.find_one({"_id": ObjectId(provider_id)}, PROFILE_NAME_PROJECTION)
     if not provider_profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -217,7 +260,7 @@ async def reject_service_provider(
         )
     
     # Get the user to access their email
-    user = await db.users.find_one({"_id": ObjectId(provider_profile["user_id"])})
+    user = await db.users.find_one({"_id": ObjectId(provider_profile["user_id"])}, USER_CONTACT_PROJECTION)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -251,6 +294,10 @@ async def reject_service_provider(
         }}
     )
     
+    # Add or drop the provider in the catalogue snapshot
+    await catalogue.refresh_provider(db, provider_profile["user_id"])
+    response_cache.invalidate(provider_tag(provider_profile["user_id"]), provider_packages_tag(provider_profile["user_id"]))
+    
     # Send rejection email
     business_name = provider_profile.get("business_name", "Your Business")
     provider_name = provider_profile.get("provider_name", user.get("name", "Service Provider"))
@@ -266,29 +313,165 @@ async def reject_service_provider(
         "email_sent": email_sent
     }
 
+async def _apply_bulk_decision(db, profile_ids: List[str], decision: str, admin_id: str, extra_fields: dict):
+    """Move many applications to approved or rejected; returns per-item results and the decided profiles.
+
+    Profiles and users are each updated with a single write. Both the profile read
+    and the write skip applications already in the target status, and the decided
+    ones are read back by the timestamp this request wrote. A concurrent decision
+    on the same application is therefore never reported, or emailed, twice.
+    """
+    now = datetime.utcnow()
+    # BSON dates keep milliseconds, so truncate to match the stored timestamp exactly
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    results: Dict[str, BulkDecisionItem] = {}
+    
+    # Invalid ids and duplicates are answered without touching the database
+    object_ids = []
+    for profile_id in dict.fromkeys(profile_ids):
+        if ObjectId.is_valid(profile_id):
+            object_ids.append(ObjectId(profile_id))
+        else:
+            results[profile_id] = BulkDecisionItem(profile_id=profile_id, status="failed", detail="Invalid profile id")
+    
+    profiles = {
+        str(profile["_id"]): profile for profile in await db.service_provider_profiles.find(
+            {"_id": {"$in": object_ids}}, {**PROFILE_NAME_PROJECTION, "approval_status": 1}
+        ).to_list(length=None)
+    }
+    users = {
+        str(user["_id"]): user for user in await db.users.find(
+            {"_id": {"$in": [ObjectId(p["user_id"]) for p in profiles.values() if ObjectId.is_valid(p.get("user_id") or "")]}},
+            USER_CONTACT_PROJECTION
+        ).to_list(length=None)
+    }
+    
+    candidates = []
+    for object_id in object_ids:
+        profile_id = str(object_id)
+        profile = profiles.get(profile_id)
+        if not profile:
+            results[profile_id] = BulkDecisionItem(profile_id=profile_id, status="failed", detail="Service provider profile not found")
+        elif profile.get("user_id") not in users:
+            results[profile_id] = BulkDecisionItem(profile_id=profile_id, status="failed", detail="User not found")
+        elif profile.get("approval_status") == decision:
+            results[profile_id] = BulkDecisionItem(profile_id=profile_id, status="skipped", detail=f"Already {decision}")
+        else:
+            candidates.append(object_id)
+    
+    decided = []
+    if candidates:
+        await db.service_provider_profiles.update_many(
+            {"_id": {"$in": candidates}, "approval_status": {"$ne": decision}},
+            {"$set": {
+                "approval_status": decision,
+                f"{decision}_at": now,
+                f"{decision}_by": admin_id,
+                "updated_at": now,
+                **extra_fields
+            }}
+        )
+        applied = {
+            str(profile["_id"]) for profile in await db.service_provider_profiles.find(
+                {"_id": {"$in": candidates}, f"{decision}_at": now, f"{decision}_by": admin_id}, EXISTS_PROJECTION
+            ).to_list(length=None)
+        }
+        for object_id in candidates:
+            profile_id = str(object_id)
+            if profile_id in applied:
+                results[profile_id] = BulkDecisionItem(profile_id=profile_id, status=decision)
+                decided.append(profiles[profile_id])
+            else:
+                results[profile_id] = BulkDecisionItem(profile_id=profile_id, status="skipped", detail="Changed concurrently")
+    
+    if decided:
+        user_ids = [profile["user_id"] for profile in decided]
+        await db.users.update_many(
+            {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}},
+            {"$set": {"approval_status": decision, "updated_at": now}}
+        )
+        
+        # Add or drop the providers in the catalogue snapshot
+        await catalogue.refresh_providers(db, user_ids)
+        response_cache.invalidate(*[tag for user_id in user_ids for tag in (provider_tag(user_id), provider_packages_tag(user_id))])
+    
+    ordered = [results[profile_id] for profile_id in dict.fromkeys(profile_ids)]
+    return ordered, [(profile, users[profile["user_id"]]) for profile in decided]
+
+def _bulk_result(results: List[BulkDecisionItem]) -> BulkDecisionResult:
+    return BulkDecisionResult(
+        processed=sum(1 for item in results if item.status in ("approved", "rejected")),
+        failed=sum(1 for item in results if item.status == "failed"),
+        skipped=sum(1 for item in results if item.status == "skipped"),
+        results=results
+    )
+
+@router.post("/admin/service-providers/bulk-approve", response_model=BulkDecisionResult)
+async def bulk_approve_service_providers(
+    request: BulkApprovalRequest,
+    background_tasks: BackgroundTasks,
+    current_admin: UserInDB = Depends(get_current_admin_user)
+):
+    """Approve many service provider applications at once"""
+    db = await get_database()
+    
+    results, decided = await _apply_bulk_decision(db, request.profile_ids, "approved", str(current_admin.id), {})
+    
+    # Emails go out after the response is sent
+    for profile, user in decided:
+        background_tasks.add_task(
+            send_approval_email,
+            email=user.get("email"),
+            business_name=profile.get("business_name", "Your Business"),
+            provider_name=profile.get("provider_name", user.get("name", "Service Provider"))
+        )
+    
+    return _bulk_result(results)
+
+@router.post("/admin/service-providers/bulk-reject", response_model=BulkDecisionResult)
+async def bulk_reject_service_providers(
+    request: BulkRejectionRequest,
+    background_tasks: BackgroundTasks,
+    current_admin: UserInDB = Depends(get_current_admin_user)
+):
+    """Reject many service provider applications at once, with one shared reason"""
+    db = await get_database()
+    
+    results, decided = await _apply_bulk_decision(
+        db, request.profile_ids, "rejected", str(current_admin.id), {"rejection_reason": request.reason}
+    )
+    
+    # Emails go out after the response is sent
+    for profile, user in decided:
+        background_tasks.add_task(
+            send_rejection_email,
+            email=user.get("email"),
+            business_name=profile.get("business_name", "Your Business"),
+            provider_name=profile.get("provider_name", user.get("name", "Service Provider")),
+            reason=request.reason or "No specific reason provided."
+        )
+    
+    return _bulk_result(results)
+
 @router.get("/admin/users", response_model=List[dict])
 async def get_all_users(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
+    search: Optional[str] = Query(None, max_length=MAX_SEARCH_LENGTH, description="Prefix of the name, business name or email"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
     current_admin: UserInDB = Depends(get_current_admin_user)
 ):
     """Get all regular users"""
     db = await get_database()
     
-    # Find all users with role="user"
-    cursor = db.users.find({"role": "user"}).skip(skip).limit(limit)
-    users = await cursor.to_list(length=limit)
+    # Find users with role="user" (password hashes are never fetched)
+    users, headers = await _admin_page(db.users, {"role": "user"}, search, cursor, limit, USER_ACCOUNT_PROJECTION)
     
     # Convert ObjectIds to strings for JSON serialization
     for user in users:
         user["id"] = str(user["_id"])
         del user["_id"]
-        
-        # Remove password hash for security
-        if "password" in user:
-            del user["password"]
     
-    return users
+    return MongoJSONResponse(users, headers=headers)
 
 @router.get("/admin/stats", response_model=dict)
 async def get_admin_stats(
@@ -313,6 +496,75 @@ async def get_admin_stats(
         "pending_providers_count": pending_providers_count,
     }
 
+@router.get("/admin/bookings/export")
+async def export_all_bookings(
+    export_format: str = Query("csv", alias="format", description="csv or parquet"),
+    provider_id: Optional[str] = Query(None, alias="providerId"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Comma separated statuses"),
+    date_from: Optional[datetime] = Query(None, alias="dateFrom", description="Earliest event date"),
+    date_to: Optional[datetime] = Query(None, alias="dateTo", description="Latest event date"),
+    current_admin: UserInDB = Depends(get_current_admin_user)
+):
+    """Download bookings across all providers, one row per payment"""
+    check_export_format(export_format)
+    
+    db = await get_database()
+    
+    # Streamed straight from the cursor, so memory stays flat however many bookings there are
+    query = booking_filters({"providerId": provider_id} if provider_id else {}, status_filter, date_from, date_to)
+    cursor = db.bookings.find(query, EXPORT_PROJECTION).sort("createdAt", 1).batch_size(EXPORT_BATCH_SIZE)
+    return export_response(cursor, export_format, "all-bookings")
+
+@router.get("/admin/analytics", response_model=dict)
+async def get_platform_analytics(
+    start: Optional[date] = Query(None, description="First day (UTC), defaults to 30 days before end"),
+    end: Optional[date] = Query(None, description="Last day (UTC), defaults to today"),
+    current_admin: UserInDB = Depends(get_current_admin_user)
+):
+    """Platform KPIs for a date range, read from the precomputed daily counters"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be on or before end"
+        )
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range cannot exceed {MAX_RANGE_DAYS} days"
+        )
+    
+    db = await get_database()
+    
+    # One small document per day, so the cost doesn't depend on the number of bookings
+    days = await db[ANALYTICS_COLLECTION].find(
+        {"_id": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    ).to_list(length=MAX_RANGE_DAYS)
+    analytics = summarize(days, start, end)
+    
+    # Name the top providers with one lookup per collection
+    provider_ids = [provider["providerId"] for provider in analytics["topProviders"]]
+    profiles = {
+        profile["user_id"]: profile for profile in await db.service_provider_profiles.find(
+            {"user_id": {"$in": provider_ids}}, PROFILE_NAME_PROJECTION
+        ).to_list(length=None)
+    }
+    users = {
+        str(user["_id"]): user for user in await db.users.find(
+            {"_id": {"$in": [ObjectId(pid) for pid in provider_ids if ObjectId.is_valid(pid)]}}, USER_NAME_PROJECTION
+        ).to_list(length=None)
+    }
+    for provider in analytics["topProviders"]:
+        profile = profiles.get(provider["providerId"], {})
+        user = users.get(provider["providerId"], {})
+        provider["providerName"] = (
+            profile.get("business_name") or profile.get("provider_name")
+            or user.get("business_name") or user.get("name") or "Unknown Provider"
+        )
+    
+    return analytics
+
 # Promotions Management Routes
 @router.post("/admin/promotions", response_model=PromotionResponse)
 async def create_promotion(
@@ -338,8 +590,9 @@ async def create_promotion(
         "status": status,
         "published_date": datetime.utcnow().isoformat(),
         "created_by": str(current_admin.id),
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow().isoformat(),
+        **search_fields("promotions", {"title": title}),
     }
     
     # Add type-specific fields
@@ -354,12 +607,12 @@ async def create_promotion(
     # Handle banner image upload
     if bannerImage:
         try:
-            upload_result = cloudinary.uploader.upload(
+            upload_result = await get_storage().upload(
                 bannerImage.file,
                 folder="eventhub/promotions",
                 public_id=f"promo_{datetime.now().timestamp()}"
             )
-            promotion_data["banner_image"] = upload_result["secure_url"]
+            promotion_data["banner_image"] = upload_result["url"]
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -369,6 +622,9 @@ async def create_promotion(
     # Insert into database
     result = await db.promotions.insert_one(promotion_data)
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     # Get the created document
     created_promotion = await db.promotions.find_one({"_id": result.inserted_id})
     
@@ -398,9 +654,12 @@ async def create_promotion(
 async def get_promotions(
     type: Optional[str] = None,
     status: Optional[str] = None,
+    search: Optional[str] = Query(None, max_length=MAX_SEARCH_LENGTH, description="Prefix of the title"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
     current_admin: UserInDB = Depends(get_current_admin_user)
 ):
-    """Get all promotions with optional filters"""
+    """Get promotions with optional filters"""
     db = await get_database()
     
     # Build query based on filters
@@ -410,9 +669,8 @@ async def get_promotions(
     if status:
         query["status"] = status
     
-    # Get promotions from database
-    cursor = db.promotions.find(query)
-    promotions = await cursor.to_list(length=100)
+    # Get a page of promotions from database
+    promotions, headers = await _admin_page(db.promotions, query, search, cursor, limit)
     
     # Transform for response
     result = []
@@ -438,7 +696,7 @@ async def get_promotions(
         
         result.append(response_item)
     
-    return result
+    return MongoJSONResponse(result, headers=headers)
 
 @router.put("/admin/promotions/{promotion_id}", response_model=PromotionResponse)
 async def update_promotion(
@@ -473,6 +731,7 @@ async def update_promotion(
         "type": type,
         "status": status,
         "updated_at": datetime.utcnow().isoformat(),
+        **search_fields("promotions", {"title": title}),
     }
     
     # Add type-specific fields
@@ -487,12 +746,12 @@ async def update_promotion(
     # Handle banner image upload
     if bannerImage:
         try:
-            upload_result = cloudinary.uploader.upload(
+            upload_result = await get_storage().upload(
                 bannerImage.file,
                 folder="eventhub/promotions",
                 public_id=f"promo_{datetime.now().timestamp()}"
             )
-            update_data["banner_image"] = upload_result["secure_url"]
+            update_data["banner_image"] = upload_result["url"]
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -505,6 +764,9 @@ async def update_promotion(
         {"$set": update_data}
     )
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     # Get the updated document
     updated_promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     
@@ -549,6 +811,9 @@ async def delete_promotion(
     # Delete from database
     await db.promotions.delete_one({"_id": ObjectId(promotion_id)})
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     return {"message": "Promotion deleted successfully"}
 
 @router.post("/admin/promotions/{promotion_id}/publish", response_model=dict)
@@ -579,4 +844,7 @@ async def publish_promotion(
         }
     )
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     return {"message": "Promotion published successfully"}
\ No newline at end of file
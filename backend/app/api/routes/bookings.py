@@ -1,11 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
 from app.models.booking import BookingCreate, BookingInDB, BookingUpdate
 from app.db.mongodb import get_database
+from app.db.analytics import record_booking_created
+from app.db.booking_state import transition_booking
+from app.db.projections import PACKAGE_NAME_PROJECTION, PROFILE_NAME_PROJECTION, USER_NAME_PROJECTION
+from app.utils.response_cache import conditional_response
 from app.api.deps import get_current_user
 from app.models.user import UserInDB
 from bson.objectid import ObjectId
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from app.models.notification import NotificationCreate
 
 router = APIRouter()
@@ -23,6 +27,7 @@ async def create_booking(
     new_booking["userId"] = str(current_user.id)
     new_booking["status"] = "pending"  # Initial status is pending
     new_booking["createdAt"] = datetime.utcnow()
+    new_booking["version"] = 0  # Bumped by every status transition
     
     # Make sure providerId is included for provider-side lookups
     if "providerId" not in new_booking or not new_booking["providerId"]:
@@ -45,6 +50,7 @@ async def create_booking(
     
     # Insert into database
     result = await db.bookings.insert_one(new_booking)
+    await record_booking_created(db, new_booking)
     
     # Get the inserted booking
     booking = await db.bookings.find_one({"_id": result.inserted_id})
@@ -52,7 +58,7 @@ async def create_booking(
     # Try to get package name from the packageId
     package_name = "your service"
     if "packageId" in new_booking:
-        package = await db.provider_packages.find_one({"_id": ObjectId(new_booking["packageId"])})
+        package = await db.provider_packages.find_one({"_id": ObjectId(new_booking["packageId"])}, PACKAGE_NAME_PROJECTION)
         if package and "name" in package:
             package_name = package["name"]
     
@@ -78,69 +84,73 @@ async def create_booking(
     
     return booking
 @router.get("/bookings/user", response_model=List[dict])
-async def get_user_bookings(current_user: UserInDB = Depends(get_current_user)):
+async def get_user_bookings(request: Request, current_user: UserInDB = Depends(get_current_user)):
     """Get all bookings for the current user"""
     db = await get_database()
     
-    # First, auto-accept any pending bookings older than 12 hours
-    current_time = datetime.utcnow()
-    twelve_hours_ago = current_time - timedelta(hours=12)
+    # Get user bookings, newest first (pending bookings are auto-accepted by a background job)
+    cursor = db.bookings.find({"userId": str(current_user.id)}).sort("createdAt", -1)
+    bookings = await cursor.to_list(length=100)
     
-    # Update bookings that are pending and older than 12 hours
-    await db.bookings.update_many(
-        {
-            "userId": str(current_user.id),
-            "status": "pending",
-            "createdAt": {"$lt": twelve_hours_ago}
-        },
-        {"$set": {"status": "confirmed", "autoAcceptedAt": current_time}}
-    )
+    # Look up provider names and package names for the whole page at once
+    provider_ids = list({booking["providerId"] for booking in bookings if booking.get("providerId")})
+    profiles = {
+        profile["user_id"]: profile for profile in await db.service_provider_profiles.find(
+            {"user_id": {"$in": provider_ids}}, PROFILE_NAME_PROJECTION
+        ).to_list(length=None)
+    }
     
-    # Get user bookings
-    cursor = db.bookings.find({"userId": str(current_user.id)})
-    bookings = await cursor.to_list(length=100)
+    # Fall back to basic user info for providers without a profile
+    missing_ids = [ObjectId(provider_id) for provider_id in provider_ids if provider_id not in profiles and ObjectId.is_valid(provider_id)]
+    provider_users = {}
+    if missing_ids:
+        provider_users = {
+            str(user["_id"]): user for user in await db.users.find(
+                {"_id": {"$in": missing_ids}}, USER_NAME_PROJECTION
+            ).to_list(length=None)
+        }
+    
+    package_ids = [
+        ObjectId(booking["packageId"]) for booking in bookings
+        if not booking.get("services") and ObjectId.is_valid(booking.get("packageId") or "")
+    ]
+    packages = {}
+    if package_ids:
+        packages = {
+            str(package["_id"]): package for package in await db.provider_packages.find(
+                {"_id": {"$in": package_ids}}, PACKAGE_NAME_PROJECTION
+            ).to_list(length=None)
+        }
     
     # Add provider information to each booking
     for booking in bookings:
         booking["id"] = str(booking["_id"])
         del booking["_id"]
         
-        # Add debug logging to see what's happening with the provider lookup
         if "providerId" in booking:
-            print(f"Looking up provider for ID: {booking['providerId']}")
-            # First try to get the provider profile
-            provider_profile = await db.service_provider_profiles.find_one({"user_id": booking["providerId"]})
+            provider_profile = profiles.get(booking["providerId"])
+            provider_user = provider_users.get(booking["providerId"])
             if provider_profile:
-                print(f"Found provider profile: {provider_profile.get('provider_name')}")
                 booking["providerName"] = provider_profile.get("provider_name", "Unknown Provider")
                 booking["businessName"] = provider_profile.get("business_name", "Unknown Business")
+            elif provider_user:
+                booking["providerName"] = provider_user.get("name", "Unknown Provider")
+                booking["businessName"] = provider_user.get("business_name", provider_user.get("name", "") + "'s Business")
             else:
-                # If profile not found, try to get basic user info
-                provider_user = await db.users.find_one({"_id": ObjectId(booking["providerId"])})
-                if provider_user:
-                    print(f"Found provider user: {provider_user.get('name')}")
-                    booking["providerName"] = provider_user.get("name", "Unknown Provider")
-                    booking["businessName"] = provider_user.get("business_name", provider_user.get("name") + "'s Business")
-                else:
-                    print(f"No provider information found for ID: {booking['providerId']}")
-                    booking["providerName"] = "Unknown Provider"
-                    booking["businessName"] = "Unknown Business"
-        
-            # Make double sure these fields are in the response
-            print(f"Final provider name: {booking.get('providerName')}")
-            print(f"Final business name: {booking.get('businessName')}")
+                booking["providerName"] = "Unknown Provider"
+                booking["businessName"] = "Unknown Business"
         
         # Ensure services field exists
         if "services" not in booking or not booking["services"]:
             # Try to get service information from the package
             if "packageId" in booking:
-                package = await db.provider_packages.find_one({"_id": ObjectId(booking["packageId"])})
+                package = packages.get(booking["packageId"])
                 if package:
                     booking["services"] = [package.get("name", "Unknown Package")]
             else:
                 booking["services"] = []
     
-    return bookings
+    return conditional_response(request, bookings)
 
 @router.get("/bookings/{booking_id}", response_model=dict)
 async def get_booking(
@@ -171,55 +181,16 @@ async def get_booking(
 @router.post("/bookings/{booking_id}/cancel", response_model=dict)
 async def cancel_booking(
     booking_id: str,
+    version: Optional[int] = Query(None, description="Expected booking version (optimistic concurrency)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Cancel a booking"""
     db = await get_database()
     
-    # Check if booking exists and belongs to this user
-    booking = await db.bookings.find_one({
-        "_id": ObjectId(booking_id),
-        "userId": str(current_user.id)
-    })
-    
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    # Check if booking can be cancelled (within 12 hours of creation)
-    booking_created = booking.get("createdAt", datetime.utcnow())
-    current_time = datetime.utcnow()
-    time_difference = (current_time - booking_created).total_seconds() / 3600
-    
-    if time_difference > 12:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Booking can only be cancelled within 12 hours of creation"
-        )
-    
-    # Check if booking status allows cancellation
-    if booking["status"] not in ["pending", "confirmed"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot cancel booking with status: {booking['status']}"
-        )
-    
-    # Update booking status
-    result = await db.bookings.update_one(
-        {"_id": ObjectId(booking_id)},
-        {"$set": {"status": "cancelled", "cancelledAt": datetime.utcnow()}}
+    # Cancel atomically if the booking is ours, cancellable and still within 12 hours of creation
+    updated_booking = await transition_booking(
+        db, booking_id, "cancel", {"userId": str(current_user.id)}, expected_version=version
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to cancel booking"
-        )
-    
-    # Get updated booking
-    updated_booking = await db.bookings.find_one({"_id": ObjectId(booking_id)})
     updated_booking["id"] = str(updated_booking["_id"])
     del updated_booking["_id"]
     
@@ -229,70 +200,18 @@ async def cancel_booking(
 async def make_payment(
     booking_id: str,
     payment_data: dict,
+    version: Optional[int] = Query(None, description="Expected booking version (optimistic concurrency)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Add a payment to a booking"""
     db = await get_database()
     
-    # Check if booking exists and belongs to this user
-    booking = await db.bookings.find_one({
-        "_id": ObjectId(booking_id),
-        "userId": str(current_user.id)
-    })
-    
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    # Check if booking can accept payments
-    if booking["status"] not in ["pending", "confirmed"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot make payment for booking with status: {booking['status']}"
-        )
-    
-    # Create payment record
-    payment = {
-        "amount": payment_data["amount"],
-        "method": payment_data["method"],
-        "date": datetime.utcnow(),
-        "status": "completed",
-        "type": "balance"
-    }
-    
-    # Calculate new remaining amount
-    remaining = booking.get("remainingAmount", 0) - payment["amount"]
-    
-    # Check if the payment completes the booking
-    new_status = booking["status"]
-    if remaining <= 0:
-        new_status = "confirmed"
-        remaining = 0
-    
-    # Update booking with new payment and status
-    result = await db.bookings.update_one(
-        {"_id": ObjectId(booking_id)},
-        {
-            "$push": {"payments": payment},
-            "$set": {
-                "remainingAmount": remaining,
-                "status": new_status,
-                "updatedAt": datetime.utcnow()
-            }
-        }
+    # Record the payment and recompute the remaining amount in one conditional update
+    updated_booking = await transition_booking(
+        db, booking_id, "pay", {"userId": str(current_user.id)}, expected_version=version,
+        amount=payment_data["amount"], method=payment_data["method"]
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to process payment"
-        )
-    
-    # Get updated booking
-    updated_booking = await db.bookings.find_one({"_id": ObjectId(booking_id)})
     updated_booking["id"] = str(updated_booking["_id"])
     del updated_booking["_id"]
     
-    return updated_booking
\ No newline at end of file
+    return updated_booking
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends, status, Body
 from app.models.user import UserInDB
 from app.models.chat import ChatMessage, ChatConversation
 from app.db.mongodb import get_database
+from app.db.projections import EXISTS_PROJECTION, PROFILE_NAME_PROJECTION, USER_NAME_PROJECTION
+from app.utils.serialization import MongoJSONResponse
 from app.api.deps import get_current_user
 from bson import ObjectId
 from datetime import datetime
@@ -26,7 +28,7 @@ async def send_message(
     
     # Verify receiver exists
     try:
-        receiver = await db.users.find_one({"_id": ObjectId(receiver_id)})
+        receiver = await db.users.find_one({"_id": ObjectId(receiver_id)}, USER_NAME_PROJECTION)
         if not receiver:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -74,7 +76,7 @@ async def send_message(
             {"user_id": user_id, "provider_id": provider_id},
             {"user_id": provider_id, "provider_id": user_id}
         ]
-    })
+    }, EXISTS_PROJECTION)
     
     now = datetime.utcnow()
     
@@ -170,7 +172,7 @@ async def get_messages(
             "read": message.get("read", False)
         })
     
-    return formatted_messages
+    return MongoJSONResponse(formatted_messages)
 
 @router.get("/chat/conversations", response_model=list)
 async def get_conversations(current_user: UserInDB = Depends(get_current_user)):
@@ -199,7 +201,7 @@ async def get_conversations(current_user: UserInDB = Depends(get_current_user)):
         other_id = conv["user_id"] if conv["provider_id"] == user_id else conv["provider_id"]
         
         try:
-            other_user = await db.users.find_one({"_id": ObjectId(other_id)})
+            other_user = await db.users.find_one({"_id": ObjectId(other_id)}, USER_NAME_PROJECTION)
         except:
             # Skip if user not found
             continue
@@ -208,7 +210,7 @@ async def get_conversations(current_user: UserInDB = Depends(get_current_user)):
             # Get service provider profile for more details if needed
             profile = None
             if other_user.get("role") == "service_provider":
-                profile = await db.service_provider_profiles.find_one({"user_id": other_id})
+                profile = await db.service_provider_profiles.find_one({"user_id": other_id}, PROFILE_NAME_PROJECTION)
             
             # Format conversation
             formatted_conv = {
@@ -233,4 +235,4 @@ async def get_conversations(current_user: UserInDB = Depends(get_current_user)):
             
             result.append(formatted_conv)
     
-    return result    
\ No newline at end of file
+    return MongoJSONResponse(result)    
\ No newline at end of file
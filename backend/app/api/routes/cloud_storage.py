@@ -4,11 +4,19 @@ from app.models.user import UserInDB
 from app.db.mongodb import get_database
 from datetime import datetime
 from app.core.security import get_password_hash
-import cloudinary
-import cloudinary.uploader
 from app.core.config import settings
+from app.utils.storage import get_storage
 from app.api.deps import get_current_user
 from bson import ObjectId
+from app.utils.images import create_image_variants, variant_url
+from app.utils.serialization import MongoJSONResponse
+from app.utils.pagination import keyset_filter, next_cursor
+from app.db.cloud_jobs import folder_files_query, get_job, job_view, start_folder_deletion, storage_keys
+from app.db.cloud_usage import get_usage, record_deletes, record_upload, release_bytes, reserve_bytes, usage_stats
+from app.db.cloud_folders import (
+    DEFAULT_FOLDER, FOLDER_PATH_PROJECTION, count_folders, ensure_folder, folder_path, get_folder,
+    has_subfolders, list_folders, remove_folder
+)
 
 router = APIRouter()
 
@@ -26,8 +34,16 @@ async def upload_cloud_files(
         )
     
     db = await get_database()
+    user_id = str(current_user.id)
+    folder = folder_path(folder)
     
-    # Upload files to Cloudinary
+    # Count the whole request against the quota before storing anything;
+    # each stored file then settles its share of the reservation
+    reserved = sum(file.size or 0 for file in files)
+    await reserve_bytes(db, user_id, reserved, settings.CLOUD_STORAGE_QUOTA)
+    await ensure_folder(db, user_id, folder)
+    
+    # Upload files to storage
     uploaded_files = []
     
     try:
@@ -40,16 +56,24 @@ async def upload_cloud_files(
                 )
                 
             # Upload file
-            result = cloudinary.uploader.upload(
+            data = await file.read()
+            await file.seek(0)
+            cloud_folder = f"eventhub/cloud_storage/{current_user.id}/{folder}"
+            public_id = f"cloud_{datetime.now().timestamp()}"
+            result = await get_storage().upload(
                 file.file,
-                folder=f"eventhub/cloud_storage/{current_user.id}/{folder}",
-                public_id=f"cloud_{datetime.now().timestamp()}",
-                resource_type="auto"
+                folder=cloud_folder,
+                public_id=public_id,
+                resource_type="auto",
+                filename=file.filename
             )
             
+            # Thumbnail, card and full-size renditions for the file browser
+            variants = await create_image_variants(data, cloud_folder, public_id, result["url"])
+            
             # Store file information
             file_info = {
-                "url": result["secure_url"],
+                "url": result["url"],
                 "public_id": result["public_id"],
                 "resource_type": result["resource_type"],
                 "format": result["format"],
@@ -58,15 +82,19 @@ async def upload_cloud_files(
                 "size": result.get("bytes", 0),
                 "created_at": datetime.utcnow(),
                 "width": result.get("width", 0),
-                "height": result.get("height", 0)
+                "height": result.get("height", 0),
+                "thumbnail_url": variant_url(variants, "thumbnail", result["url"]),
+                "variants": variants
             }
             
             # Insert file info into database
             await db.cloud_storage.insert_one({
-                "user_id": str(current_user.id),
+                "user_id": user_id,
                 "file_info": file_info,
                 "created_at": datetime.utcnow()
             })
+            await record_upload(db, user_id, file_info, file.size or 0)
+            reserved -= file.size or 0
             
             uploaded_files.append(file_info)
         
@@ -77,36 +105,52 @@ async def upload_cloud_files(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error uploading files: {str(e)}"
         )
+    finally:
+        # Whatever wasn't stored goes back to the quota
+        await release_bytes(db, user_id, reserved)
 
 @router.get("/cloud/files", response_model=dict)
 async def get_cloud_files(
     folder: Optional[str] = None,
     limit: int = Query(50, gt=0, le=100),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """Get user's cloud storage files with optional folder filtering"""
+    """Get user's cloud storage files with optional folder filtering, newest first"""
     if current_user.role != "service_provider" and current_user.role != "admin" and current_user.role != "super_admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only service providers can access their cloud storage"
         )
     
+    try:
+        after = keyset_filter("created_at", cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
     db = await get_database()
+    user_id = str(current_user.id)
     
     # Base query
-    query = {"user_id": str(current_user.id)}
+    query = {"user_id": user_id}
     
-    # Add folder filter if provided
+    # Totals come from the maintained counters instead of counting the files
     if folder:
         query["file_info.folder"] = folder
-    
-    # Get total count for pagination
-    total_files = await db.cloud_storage.count_documents(query)
-    
-    # Get files with pagination
-    cursor = db.cloud_storage.find(query).sort("created_at", -1).skip(skip).limit(limit)
-    files = await cursor.to_list(length=limit)
+        folder_doc = await get_folder(db, user_id, folder)
+        total_files = folder_doc.get("files", 0) if folder_doc else 0
+    else:
+        total_files = (await get_usage(db, user_id)).get("files", 0)
+    
+    # Seek past the cursor on the (created_at, _id) index instead of skipping rows
+    page_query = {"$and": [query, after]} if after else query
+    files = await db.cloud_storage.find(page_query).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    following = next_cursor(files, "created_at", limit)
     
     # Format response
     file_list = []
@@ -119,12 +163,15 @@ async def get_cloud_files(
         "files": file_list,
         "total": total_files,
         "limit": limit,
-        "skip": skip
+        "next_cursor": following
     }
 
 @router.get("/cloud/folders", response_model=list)
-async def get_cloud_folders(current_user: UserInDB = Depends(get_current_user)):
-    """Get list of folders in user's cloud storage"""
+async def get_cloud_folders(
+    parent: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Get list of folders in user's cloud storage (only the subfolders of parent when given)"""
     if current_user.role != "service_provider" and current_user.role != "admin" and current_user.role != "super_admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -133,23 +180,29 @@ async def get_cloud_folders(current_user: UserInDB = Depends(get_current_user)):
     
     db = await get_database()
     
-    # Aggregate to get unique folders
-    pipeline = [
-        {"$match": {"user_id": str(current_user.id)}},
-        {"$group": {"_id": "$file_info.folder"}},
-        {"$project": {"folder": "$_id", "_id": 0}},
-        {"$sort": {"folder": 1}}
-    ]
+    # Folders are documents of their own, listed straight from their index
+    folders = await list_folders(db, str(current_user.id), parent, parent is not None, FOLDER_PATH_PROJECTION)
+    folders = [folder["path"] for folder in folders]
+    if parent is None and DEFAULT_FOLDER not in folders:
+        folders.append(DEFAULT_FOLDER)
     
-    cursor = db.cloud_storage.aggregate(pipeline)
-    result = await cursor.to_list(length=100)
+    return folders
+
+@router.get("/cloud/folders/details", response_model=list)
+async def get_cloud_folder_details(
+    parent: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Get folders with their parent, file count and size"""
+    if current_user.role != "service_provider" and current_user.role != "admin" and current_user.role != "super_admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only service providers can access their cloud storage"
+        )
     
-    # Extract folder names
-    folders = [doc.get("folder", "default") for doc in result]
-    if not folders or "default" not in folders:
-        folders.append("default")
+    db = await get_database()
     
-    return folders
+    return await list_folders(db, str(current_user.id), parent, parent is not None)
 
 @router.delete("/cloud/files/{file_id}", response_model=dict)
 async def delete_cloud_file(
@@ -177,23 +230,20 @@ async def delete_cloud_file(
             detail="File not found"
         )
     
-    # Delete from Cloudinary if public_id exists
-    try:
-        if "file_info" in file and "public_id" in file["file_info"]:
-            public_id = file["file_info"]["public_id"]
-            cloudinary.uploader.destroy(public_id)
-    except Exception as e:
-        # Log error but continue with database deletion
-        print(f"Error deleting from Cloudinary: {str(e)}")
+    # Delete the file and its variants from storage (errors are logged, the record goes regardless)
+    await get_storage().delete_many(storage_keys(file.get("file_info", {})))
     
     # Delete from database
-    await db.cloud_storage.delete_one({"_id": ObjectId(file_id)})
+    result = await db.cloud_storage.delete_one({"_id": ObjectId(file_id)})
+    if result.deleted_count:
+        await record_deletes(db, str(current_user.id), [file.get("file_info", {})])
     
     return {"message": "File deleted successfully"}
 
 @router.post("/cloud/create-folder", response_model=dict)
 async def create_cloud_folder(
     folder_name: str = Form(...),
+    parent: Optional[str] = Form(None),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Create a new folder in cloud storage"""
@@ -209,52 +259,26 @@ async def create_cloud_folder(
             detail="Folder name cannot be empty"
         )
     
-    folder_name = folder_name.strip()
-    
-    # Folder name validation
-    if len(folder_name) > 50:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Folder name too long (max 50 characters)"
-        )
-    
-    # Replace special characters that might cause issues
-    folder_name = folder_name.replace("/", "_").replace("\\", "_")
+    # Replace special characters that might cause issues; nesting goes through parent
+    folder_name = folder_name.strip().replace("/", "_")
     
-    # Insert dummy document to ensure folder is created
     db = await get_database()
     
-    # Check if folder already exists
-    existing_folder = await db.cloud_storage.find_one({
-        "user_id": str(current_user.id),
-        "file_info.folder": folder_name
-    })
+    if parent and not await get_folder(db, str(current_user.id), folder_path(parent)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Parent folder not found"
+        )
     
-    if existing_folder:
-        return {"message": "Folder already exists", "folder": folder_name}
-    
-    # Create folder entry (without an actual file)
-    folder_entry = {
-        "user_id": str(current_user.id),
-        "file_info": {
-            "url": None,
-            "public_id": None,
-            "resource_type": "folder",
-            "format": None,
-            "folder": folder_name,
-            "filename": ".folder",
-            "size": 0,
-            "created_at": datetime.utcnow()
-        },
-        "created_at": datetime.utcnow(),
-        "is_folder_marker": True
-    }
+    # Validates the name length and nesting depth
+    path = folder_path(folder_name, parent)
     
-    await db.cloud_storage.insert_one(folder_entry)
+    if not await ensure_folder(db, str(current_user.id), path):
+        return {"message": "Folder already exists", "folder": path}
     
-    return {"message": "Folder created successfully", "folder": folder_name}
+    return {"message": "Folder created successfully", "folder": path}
 
-@router.delete("/cloud/folders/{folder_name}", response_model=dict)
+@router.delete("/cloud/folders/{folder_name:path}", response_model=dict)
 async def delete_cloud_folder(
     folder_name: str,
     force: bool = Query(False),
@@ -269,12 +293,14 @@ async def delete_cloud_folder(
     
     db = await get_database()
     
+    if await has_subfolders(db, str(current_user.id), folder_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Folder has subfolders. Delete them first."
+        )
+    
     # Check if folder has files
-    files_count = await db.cloud_storage.count_documents({
-        "user_id": str(current_user.id),
-        "file_info.folder": folder_name,
-        "is_folder_marker": {"$ne": True}
-    })
+    files_count = await db.cloud_storage.count_documents(folder_files_query(str(current_user.id), folder_name))
     
     if files_count > 0 and not force:
         raise HTTPException(
@@ -282,38 +308,40 @@ async def delete_cloud_folder(
             detail=f"Folder has {files_count} files. Use force=true to delete anyway."
         )
     
-    # If force=true, delete all files in folder from Cloudinary
-    if force:
-        # Find all files in the folder
-        cursor = db.cloud_storage.find({
-            "user_id": str(current_user.id),
-            "file_info.folder": folder_name,
-            "is_folder_marker": {"$ne": True}
-        })
-        
-        files = await cursor.to_list(length=None)
-        
-        # Delete each file from Cloudinary
-        for file in files:
-            try:
-                if "file_info" in file and "public_id" in file["file_info"]:
-                    public_id = file["file_info"]["public_id"]
-                    cloudinary.uploader.destroy(public_id)
-            except Exception as e:
-                # Log error but continue with database deletion
-                print(f"Error deleting from Cloudinary: {str(e)}")
-    
-    # Delete folder and all its contents from database
-    result = await db.cloud_storage.delete_many({
-        "user_id": str(current_user.id),
-        "file_info.folder": folder_name
-    })
+    # If force=true, delete all files in folder from storage in a background job;
+    # the client polls /cloud/jobs/{id} instead of waiting on thousands of deletions
+    if files_count > 0:
+        job = await start_folder_deletion(db, str(current_user.id), folder_name, files_count)
+        return MongoJSONResponse({
+            "message": "Folder deletion started",
+            "job": job_view(job)
+        }, status_code=status.HTTP_202_ACCEPTED)
+    
+    # Empty folder: only its folder document is left
+    await remove_folder(db, str(current_user.id), folder_name)
     
     return {
         "message": "Folder deleted successfully", 
-        "deleted_files_count": result.deleted_count
+        "deleted_files_count": 0
     }
 
+@router.get("/cloud/jobs/{job_id}", response_model=dict)
+async def get_cloud_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Progress of a background cloud storage job (e.g. a folder deletion)"""
+    db = await get_database()
+    
+    job = await get_job(db, job_id, str(current_user.id))
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return MongoJSONResponse(job_view(job))
+
 @router.get("/cloud/stats", response_model=dict)
 async def get_cloud_storage_stats(current_user: UserInDB = Depends(get_current_user)):
     """Get statistics about the user's cloud storage usage"""
@@ -325,59 +353,14 @@ async def get_cloud_storage_stats(current_user: UserInDB = Depends(get_current_u
     
     db = await get_database()
     
-    # Get total file count
-    total_files = await db.cloud_storage.count_documents({
-        "user_id": str(current_user.id),
-        "is_folder_marker": {"$ne": True}
-    })
+    # Counters kept up to date on upload and delete, instead of aggregating every file
+    stats = usage_stats(
+        await get_usage(db, str(current_user.id)),
+        await count_folders(db, str(current_user.id))
+    )
+    stats["total_size_readable"] = format_size(stats["total_size"])
     
-    # Get total storage used
-    pipeline = [
-        {"$match": {
-            "user_id": str(current_user.id),
-            "is_folder_marker": {"$ne": True}
-        }},
-        {"$group": {
-            "_id": None,
-            "total_size": {"$sum": "$file_info.size"}
-        }}
-    ]
-    
-    result = await db.cloud_storage.aggregate(pipeline).to_list(length=1)
-    total_size = result[0].get("total_size", 0) if result else 0
-    
-    # Get folder count
-    pipeline = [
-        {"$match": {"user_id": str(current_user.id)}},
-        {"$group": {"_id": "$file_info.folder"}},
-        {"$count": "total_folders"}
-    ]
-    
-    result = await db.cloud_storage.aggregate(pipeline).to_list(length=1)
-    total_folders = result[0].get("total_folders", 0) if result else 0
-    
-    # Get file type distribution
-    pipeline = [
-        {"$match": {
-            "user_id": str(current_user.id),
-            "is_folder_marker": {"$ne": True}
-        }},
-        {"$group": {
-            "_id": "$file_info.format",
-            "count": {"$sum": 1}
-        }}
-    ]
-    
-    format_distribution = await db.cloud_storage.aggregate(pipeline).to_list(length=None)
-    formats = {doc["_id"]: doc["count"] for doc in format_distribution if doc["_id"]}
-    
-    return {
-        "total_files": total_files,
-        "total_size": total_size,
-        "total_size_readable": format_size(total_size),
-        "total_folders": total_folders,
-        "format_distribution": formats
-    }
+    return stats
 
 def format_size(size_bytes):
     """Format bytes to human readable format"""
@@ -1,25 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Query
-from fastapi.responses import FileResponse as FastAPIFileResponse
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, status, UploadFile, File, Form, Query
+from typing import List, Optional
 import os
-import shutil
-import uuid
+import time
 from datetime import datetime
 from app.models.user import UserInDB
-from app.models.file import FileInDB, FileResponse
+from app.models.file import FileInDB, FileResponse, UploadSessionCreate
 from app.api.deps import get_current_user
 from app.db.mongodb import get_database
+from app.db.projections import EXISTS_PROJECTION, USER_ACCOUNT_PROJECTION
+from app.utils.serialization import MongoJSONResponse
+from app.utils.file_store import (
+    UPLOAD_DIR, commit_staged, discard_file, file_sha256, object_path, release_object, session_path,
+    store_upload, truncate_file, upload_limit, write_chunk
+)
+from app.db.upload_sessions import (
+    UPLOAD_OFFSET_HEADER, UPLOAD_SESSION_TTL, advance_session, claim_session, release_session
+)
 from bson.objectid import ObjectId
 from jose import jwt
 from app.core.config import settings
+from app.core.security import create_download_signature, verify_download_signature
+from app.utils.file_response import RangeFileResponse
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.security.utils import get_authorization_scheme_param
 from app.schemas.auth import TokenPayload
 
 router = APIRouter()
 
-# Use an absolute path that works on both Windows and Unix
-UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../uploads"))
+# Fields exposed by FileResponse (the list route returns documents directly)
+FILE_RESPONSE_PROJECTION = {field: 1 for field in FileResponse.model_fields if field != "id"}
+# Fields a download needs
+FILE_DOWNLOAD_PROJECTION = {"file_path": 1, "original_filename": 1, "sha256": 1}
+
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 print(f"Upload directory set to: {UPLOAD_DIR}")  # Debug print
 
@@ -41,7 +53,7 @@ async def get_current_user_optional(token: str = Depends(oauth2_scheme_optional)
         token_data = TokenPayload(**payload)
         
         db = await get_database()
-        user = await db.users.find_one({"_id": ObjectId(token_data.sub)})
+        user = await db.users.find_one({"_id": ObjectId(token_data.sub)}, USER_ACCOUNT_PROJECTION)
         
         if not user:
             return None
@@ -65,52 +77,230 @@ def get_file_type(filename: str) -> str:
     else:
         return 'other'
 
+async def storage_used(db, user_id: str) -> int:
+    """Bytes counted against a user's quota: stored files plus space reserved by open resumable uploads"""
+    files = await db.files.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "bytes": {"$sum": "$file_size"}}}
+    ]).to_list(length=1)
+    sessions = await db.upload_sessions.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "bytes": {"$sum": "$size"}}}
+    ]).to_list(length=1)
+    return (files[0]["bytes"] if files else 0) + (sessions[0]["bytes"] if sessions else 0)
+
+async def record_file(db, user_id: str, original_filename: str, file_size: int, sha256: str, file_path: str) -> dict:
+    """Insert the files document for a stored blob, releasing the blob if that fails"""
+    file_data = {
+        "filename": sha256,
+        "original_filename": original_filename,
+        "file_type": get_file_type(original_filename),
+        "file_size": file_size,
+        "file_path": file_path,
+        "user_id": user_id,
+        "sha256": sha256,
+        "created_at": datetime.utcnow()
+    }
+    
+    try:
+        result = await db.files.insert_one(file_data)
+    except Exception:
+        await release_object(db, sha256)
+        raise
+    
+    # Return file data with ID
+    file_data["id"] = str(result.inserted_id)
+    del file_data["_id"]
+    return file_data
+
 @router.post("/files/upload", response_model=FileResponse)
 async def upload_file(
     file: UploadFile = File(...),
     current_user: UserInDB = Depends(get_current_user)
 ):
-    # Create user directory if it doesn't exist
-    user_dir = os.path.join(UPLOAD_DIR, str(current_user.id))
-    os.makedirs(user_dir, exist_ok=True)
-    
-    # Generate unique filename to avoid conflicts
-    file_ext = file.filename.split('.')[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = os.path.join(user_dir, unique_filename)
+    # What the user may still store, capped by the per-file maximum
+    db = await get_database()
+    max_bytes, quota_limited = upload_limit(
+        settings.MAX_UPLOAD_SIZE, settings.USER_STORAGE_QUOTA or None, await storage_used(db, str(current_user.id))
+    )
     
-    # Save file
+    # Stream to disk off the event loop, hashing on the way; identical content is stored once
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_size, sha256, file_path = await store_upload(db, file, max_bytes, quota_limited)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error saving file: {str(e)}"
         )
     
-    # Determine file type and size
-    file_type = get_file_type(file.filename)
-    file_size = os.path.getsize(file_path)
-    
     # Create file record in database
+    return await record_file(db, str(current_user.id), file.filename, file_size, sha256, file_path)
+
+# Resumable uploads: create a session, PATCH chunks at increasing offsets, then complete it
+def _session_status(session: dict) -> dict:
+    return {
+        "id": str(session["_id"]),
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": session["offset"],
+        "chunks": session.get("chunks", []),
+        "expires_at": session["expires_at"],
+        "completed": session["offset"] >= session["size"]
+    }
+
+@router.post("/files/upload-sessions", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    session_data: UploadSessionCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Start a resumable upload; the declared size is reserved against the user's quota"""
     db = await get_database()
-    file_data = {
-        "filename": unique_filename,
-        "original_filename": file.filename,
-        "file_type": file_type,
-        "file_size": file_size,
-        "file_path": file_path,
+    
+    max_bytes, quota_limited = upload_limit(
+        settings.MAX_RESUMABLE_UPLOAD_SIZE, settings.USER_STORAGE_QUOTA or None, await storage_used(db, str(current_user.id))
+    )
+    if session_data.size > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=(f"Upload exceeds your remaining storage quota ({max_bytes} bytes left)" if quota_limited
+                    else f"File exceeds the maximum upload size of {max_bytes} bytes")
+        )
+    
+    now = datetime.utcnow()
+    session_id = ObjectId()
+    session = {
+        "_id": session_id,
         "user_id": str(current_user.id),
-        "created_at": datetime.utcnow()
+        "filename": session_data.filename,
+        "size": session_data.size,
+        "offset": 0,
+        "chunks": [],
+        "path": session_path(str(session_id)),
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + UPLOAD_SESSION_TTL
     }
+    await db.upload_sessions.insert_one(session)
     
-    result = await db.files.insert_one(file_data)
+    return MongoJSONResponse(
+        _session_status(session),
+        status_code=status.HTTP_201_CREATED,
+        headers={UPLOAD_OFFSET_HEADER: "0"}
+    )
+
+@router.get("/files/upload-sessions/{session_id}", response_model=dict)
+async def get_upload_session(
+    session_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Where an upload stands, so a client can resume after a dropped connection"""
+    db = await get_database()
     
-    # Return file data with ID
-    file_data["id"] = str(result.inserted_id)
+    session = await db.upload_sessions.find_one({
+        "_id": ObjectId(session_id) if ObjectId.is_valid(session_id) else None,
+        "user_id": str(current_user.id),
+        "expires_at": {"$gt": datetime.utcnow()}
+    }, {"path": 0, "lock_token": 0})
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found or expired"
+        )
     
-    return file_data
+    return MongoJSONResponse(_session_status(session), headers={UPLOAD_OFFSET_HEADER: str(session["offset"])})
+
+@router.patch("/files/upload-sessions/{session_id}", response_model=dict)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias=UPLOAD_OFFSET_HEADER, ge=0),
+    chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256", description="Hex SHA-256 of this chunk"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Append the request body at Upload-Offset, verifying its checksum when one is sent"""
+    db = await get_database()
+    
+    session = await claim_session(db, session_id, str(current_user.id), upload_offset)
+    try:
+        # Written straight into the session's file as the body arrives
+        written, sha256 = await write_chunk(
+            session["path"], request.stream(), session["offset"], session["size"] - session["offset"]
+        )
+        if chunk_sha256 and chunk_sha256.lower() != sha256:
+            await truncate_file(session["path"], session["offset"])
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Chunk checksum mismatch, resend it from the same offset",
+                headers={UPLOAD_OFFSET_HEADER: str(session["offset"])}
+            )
+    except BaseException:
+        await release_session(db, session)
+        raise
+    
+    offset = await advance_session(db, session, written, sha256)
+    return MongoJSONResponse(
+        {"offset": offset, "size": session["size"], "completed": offset >= session["size"]},
+        headers={UPLOAD_OFFSET_HEADER: str(offset)}
+    )
+
+@router.post("/files/upload-sessions/{session_id}/complete", response_model=FileResponse)
+async def complete_upload_session(
+    session_id: str,
+    sha256: Optional[str] = Query(None, description="Expected SHA-256 of the whole file"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Turn a fully uploaded session into a stored file"""
+    db = await get_database()
+    
+    # Locking at offset == size both checks completeness and stops a second finalize
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found or expired"
+        )
+    current = await db.upload_sessions.find_one(
+        {"_id": ObjectId(session_id), "user_id": str(current_user.id)}, {"size": 1}
+    )
+    session = await claim_session(db, session_id, str(current_user.id), current["size"] if current else -1)
+    
+    try:
+        digest = await file_sha256(session["path"])
+        if sha256 and sha256.lower() != digest:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File checksum mismatch; check the chunk checksums in the session status"
+            )
+        # The session file is renamed into the content store, never copied
+        file_path = await commit_staged(db, session["path"], session["size"], digest)
+    except BaseException:
+        await release_session(db, session)
+        raise
+    
+    await db.upload_sessions.delete_one({"_id": session["_id"]})
+    return await record_file(db, str(current_user.id), session["filename"], session["size"], digest, file_path)
+
+@router.delete("/files/upload-sessions/{session_id}", response_model=dict)
+async def abort_upload_session(
+    session_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Abandon a resumable upload and free its reserved space"""
+    db = await get_database()
+    
+    session = await db.upload_sessions.find_one_and_delete({
+        "_id": ObjectId(session_id) if ObjectId.is_valid(session_id) else None,
+        "user_id": str(current_user.id)
+    }, {"path": 1})
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found or expired"
+        )
+    
+    await discard_file(session["path"])
+    return {"message": "Upload session aborted"}
 
 @router.get("/files", response_model=List[FileResponse])
 async def get_user_files(
@@ -126,8 +316,8 @@ async def get_user_files(
     if file_type and file_type != "all":
         query["file_type"] = file_type
     
-    # Get files and sort by latest first
-    cursor = db.files.find(query).sort("created_at", -1)
+    # Get files and sort by latest first, fetching only the FileResponse fields
+    cursor = db.files.find(query, FILE_RESPONSE_PROJECTION).sort("created_at", -1)
     files = await cursor.to_list(length=100)  # Limit to 100 files
     
     # Convert _id to string ID
@@ -135,41 +325,85 @@ async def get_user_files(
         file["id"] = str(file["_id"])
         del file["_id"]
     
-    return files
+    return MongoJSONResponse(files)
+
+@router.post("/files/{file_id}/signed-url", response_model=dict)
+async def create_signed_download_url(
+    file_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Issue an expiring download link that needs no token (for players, <a> tags and retries)"""
+    db = await get_database()
+    
+    if not ObjectId.is_valid(file_id) or not await db.files.find_one(
+        {"_id": ObjectId(file_id), "user_id": str(current_user.id)}, EXISTS_PROJECTION
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have permission to access it"
+        )
+    
+    expires = int(time.time()) + settings.SIGNED_URL_EXPIRE_SECONDS
+    signature = create_download_signature(file_id, expires)
+    return {
+        "url": f"{settings.API_V1_STR}/files/{file_id}/download?expires={expires}&signature={signature}",
+        "expires_at": datetime.utcfromtimestamp(expires)
+    }
 
 @router.get("/files/{file_id}/download")
 async def download_file(
     file_id: str,
+    request: Request,
     token: str = Query(None),  # Allow token as query parameter
+    expires: Optional[int] = Query(None, description="Expiry of a signed link (unix seconds)"),
+    signature: Optional[str] = Query(None, description="Signature of a signed link"),
     current_user: UserInDB = Depends(get_current_user_optional)  # Use our optional auth
 ):
     db = await get_database()
     
-    # If token is provided but no current_user, try to get user from token
-    if token and not current_user:
-        try:
-            # Validate token and get user
-            payload = jwt.decode(
-                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-            )
-            user_id = payload.get("sub")
-            if user_id:
-                user = await db.users.find_one({"_id": ObjectId(user_id)})
-                if user:
-                    current_user = UserInDB(**user)
-        except:
-            pass
-    
-    # Ensure we have a user now
-    if not current_user:
+    if not ObjectId.is_valid(file_id):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have permission to access it"
         )
     
+    if signature:
+        # Signed links authorize the file itself, so no token is decoded and no user is loaded
+        if expires is None or not verify_download_signature(file_id, expires, signature):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Download link is invalid or has expired"
+            )
+        query = {"_id": ObjectId(file_id)}
+        cache_control = f"private, max-age={max(expires - int(time.time()), 0)}"
+    else:
+        # If token is provided but no current_user, try to get user from token
+        if token and not current_user:
+            try:
+                # Validate token and get user
+                payload = jwt.decode(
+                    token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+                )
+                user_id = payload.get("sub")
+                if user_id:
+                    user = await db.users.find_one({"_id": ObjectId(user_id)}, USER_ACCOUNT_PROJECTION)
+                    if user:
+                        current_user = UserInDB(**user)
+            except:
+                pass
+        
+        # Ensure we have a user now
+        if not current_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authentication required",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        query = {"_id": ObjectId(file_id), "user_id": str(current_user.id)}
+        cache_control = "private, no-cache"
+    
     # Get file record
-    file = await db.files.find_one({"_id": ObjectId(file_id), "user_id": str(current_user.id)})
+    file = await db.files.find_one(query, FILE_DOWNLOAD_PROJECTION)
     
     if not file:
         raise HTTPException(
@@ -184,10 +418,13 @@ async def download_file(
             detail="File not found on server"
         )
     
-    return FastAPIFileResponse(
+    # Range, If-Range and conditional requests are answered from the file's stat and digest
+    return RangeFileResponse(
         file["file_path"],
+        request,
         filename=file["original_filename"],
-        media_type="application/octet-stream"
+        etag=f'"{file["sha256"]}"' if file.get("sha256") else None,
+        headers={"cache-control": cache_control}
     )
 
 @router.delete("/files/{file_id}", response_model=dict)
@@ -197,8 +434,8 @@ async def delete_file(
 ):
     db = await get_database()
     
-    # Get file record
-    file = await db.files.find_one({"_id": ObjectId(file_id), "user_id": str(current_user.id)})
+    # Remove the file record first, so the blob is released exactly once
+    file = await db.files.find_one_and_delete({"_id": ObjectId(file_id), "user_id": str(current_user.id)})
     
     if not file:
         raise HTTPException(
@@ -206,9 +443,11 @@ async def delete_file(
             detail="File not found or you don't have permission to delete it"
         )
     
-    # Delete file from filesystem
+    # Shared blobs are unlinked with their last reference; files from before deduplication own their path
     try:
-        if os.path.exists(file["file_path"]):
+        if file.get("sha256") and file["file_path"] == object_path(file["sha256"]):
+            await release_object(db, file["sha256"])
+        elif os.path.exists(file["file_path"]):
             os.remove(file["file_path"])
     except Exception as e:
         raise HTTPException(
@@ -216,8 +455,5 @@ async def delete_file(
             detail=f"Error deleting file: {str(e)}"
         )
     
-    # Delete file record from database
-    await db.files.delete_one({"_id": ObjectId(file_id)})
-    
     return {"message": "File deleted successfully"}
     return {"message": "File deleted successfully"}
\ No newline at end of file
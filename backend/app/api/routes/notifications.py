@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from app.models.notification import NotificationCreate, NotificationInDB
 from app.db.mongodb import get_database
+from app.utils.serialization import MongoJSONResponse
 from app.api.deps import get_current_user
 from app.models.user import UserInDB
 from bson.objectid import ObjectId
@@ -30,7 +31,7 @@ async def get_notifications(current_user: UserInDB = Depends(get_current_user)):
     # Sort by created_at (newest first)
     notifications.sort(key=lambda x: x.get("created_at", datetime.min), reverse=True)
     
-    return notifications
+    return MongoJSONResponse(notifications)
 
 @router.post("/notifications/{notification_id}/read", response_model=dict)
 async def mark_notification_as_read(
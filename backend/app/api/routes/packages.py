@@ -1,27 +1,21 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Query, Request
 from app.db.mongodb import get_database
+from app.db.projections import PROFILE_NAME_PROJECTION, USER_NAME_PROJECTION
 from bson import ObjectId
 from typing import List, Optional
 from datetime import datetime
+from app.utils.service_types import service_type_keys
+from app.utils.geo import parse_near, geo_near_stage, DEFAULT_RADIUS_KM
+from app.utils.package_combinations import generate_package_combinations
+from app.db.catalogue import catalogue
+from app.utils.serialization import MongoJSONResponse
+from app.utils.response_cache import response_cache, document_versions, package_tag, provider_tag
+from app.utils.images import ImageVariant, select_images, variant_url, with_image_variants
 
 router = APIRouter()
 
-@router.get("/packages/available", response_model=list)
-async def get_all_available_packages(
-    eventType: Optional[str] = None,
-    minPrice: Optional[int] = None,
-    maxPrice: Optional[int] = None,
-    crowdSize: Optional[int] = None,
-    serviceType: Optional[str] = None,
-    location: Optional[str] = None,
-    displayMode: Optional[str] = "individual"
-):
-    """Get all available packages with optional filtering"""
-    db = await get_database()
-    
-    # Log the received parameters
-    print(f"Received request with params: eventType={eventType}, minPrice={minPrice}, maxPrice={maxPrice}, crowdSize={crowdSize}, serviceType={serviceType}, location={location}, displayMode={displayMode}")
-    
+async def _find_available_packages(db, eventType, minPrice, maxPrice, crowdSize, serviceType, near_point, radiusKm):
+    """Query available packages straight from MongoDB (used until the catalogue snapshot is ready)"""
     # Base query
     query = {"status": "active"}
     
@@ -53,52 +47,125 @@ async def get_all_available_packages(
     # Only include packages from approved providers
     query["provider_id"] = {"$in": approved_provider_ids}
     
-    # If service type is provided, find matching providers first
-    service_provider_ids = None
+    # Service type is denormalized onto each package, so this is an exact index lookup
     if serviceType:
-        provider_profiles_cursor = db.service_provider_profiles.find(
-            {"service_types": {"$regex": serviceType, "$options": "i"}},
-            {"user_id": 1}
-        )
-        service_provider_ids = [p["user_id"] for p in await provider_profiles_cursor.to_list(length=None)]
-        
-        # Update query to only include packages from these providers
-        query["provider_id"] = {"$in": service_provider_ids}
+        query["serviceTypeKey"] = {"$in": service_type_keys(serviceType)}
     
-    # Get packages with the query
-    packages_cursor = db.provider_packages.find(query)
+    # Get packages with the query, ranked by distance for proximity searches
+    if near_point:
+        lat, lng = near_point
+        packages_cursor = db.provider_packages.aggregate([geo_near_stage(lat, lng, radiusKm, query)])
+    else:
+        packages_cursor = db.provider_packages.find(query)
     packages = await packages_cursor.to_list(length=None)
     
     # For each package, get provider info and format response
     result = []
-    
     for package in packages:
         # Convert ObjectId to string
         package["id"] = str(package.pop("_id"))
+        package = with_image_variants(package)
+        
+        # Report the $geoNear distance in kilometres
+        if "distance" in package:
+            package["distanceKm"] = round(package.pop("distance") / 1000, 2)
         
         # Get provider info
-        provider = await db.users.find_one({"_id": ObjectId(package["provider_id"])})
+        provider = await db.users.find_one({"_id": ObjectId(package["provider_id"])}, USER_NAME_PROJECTION)
         if provider:
-            provider_profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])})
+            provider_profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])}, PROFILE_NAME_PROJECTION)
             
-            # Get service type for this provider
-            service_type = ""
-            if provider_profile and provider_profile.get("service_types"):
-                service_type = provider_profile.get("service_types").split(',')[0] if ',' in provider_profile.get("service_types") else provider_profile.get("service_types")
+            # Service type is stored on the package itself
+            service_type = package.get("serviceType", "")
             
             provider_info = {
                 "id": str(provider["_id"]),
                 "name": provider.get("name", ""),
                 "role": provider.get("role", ""),
                 "businessName": provider_profile.get("business_name") if provider_profile else "",
-                "profileImage": provider_profile.get("profile_picture_url") if provider_profile else None,
+                "profileImage": variant_url(
+                    provider_profile.get("profile_picture_variants"), "thumbnail", provider_profile.get("profile_picture_url")
+                ) if provider_profile else None,
                 "serviceType": service_type
             }
             
             package["providerInfo"] = provider_info
             package["serviceType"] = service_type  # Make sure serviceType is set at the package level too
         
-        result.append(package)    
+        result.append(package)
+    
+    return result
+
+@router.get("/packages/available", response_model=list)
+async def get_all_available_packages(
+    eventType: Optional[str] = None,
+    minPrice: Optional[int] = None,
+    maxPrice: Optional[int] = None,
+    crowdSize: Optional[int] = None,
+    serviceType: Optional[str] = None,
+    location: Optional[str] = None,
+    displayMode: Optional[str] = "individual",
+    near: Optional[str] = None,
+    radiusKm: float = DEFAULT_RADIUS_KM,
+    maxServices: int = Query(2, ge=2, le=5),
+    topK: int = Query(20, ge=1, le=100),
+    sortBy: str = Query("price", pattern="^(price|rating)$"),
+    imageSize: Optional[ImageVariant] = Query(None, description="Return this rendition in images instead of the originals")
+):
+    """Get all available packages with optional filtering"""
+    db = await get_database()
+    
+    # Validate the proximity filter up front
+    near_point = None
+    if near:
+        try:
+            near_point = parse_near(near)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid near parameter: {str(e)}"
+            )
+        if radiusKm <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="radiusKm must be greater than 0"
+            )
+    
+    # Log the received parameters
+    print(f"Received request with params: eventType={eventType}, minPrice={minPrice}, maxPrice={maxPrice}, crowdSize={crowdSize}, serviceType={serviceType}, location={location}, displayMode={displayMode}")
+    
+    # Serve from the in-memory catalogue snapshot once it has loaded
+    snapshot = catalogue.snapshot
+    from_snapshot = catalogue.ready
+    if from_snapshot:
+        result = snapshot.find_packages(
+            event_type=eventType,
+            service_type_keys=service_type_keys(serviceType) if serviceType else None,
+            min_price=minPrice,
+            max_price=maxPrice,
+            crowd_size=crowdSize
+        )
+        
+        # Rank by distance using the geo index, keeping only packages that passed the filters
+        if near_point:
+            lat, lng = near_point
+            nearby = await db.provider_packages.aggregate([
+                geo_near_stage(lat, lng, radiusKm, {"status": "active"}),
+                {"$project": {"distance": 1}}
+            ]).to_list(length=None)
+            
+            matching = {package["id"]: package for package in result}
+            result = [
+                {**matching[str(doc["_id"])], "distanceKm": round(doc["distance"] / 1000, 2)}
+                for doc in nearby if str(doc["_id"]) in matching
+            ]
+    else:
+        result = await _find_available_packages(db, eventType, minPrice, maxPrice, crowdSize, serviceType, near_point, radiusKm)
+    
+    # Package cards ask for a smaller rendition (bundles pick theirs in generate_package_combinations)
+    if imageSize:
+        result = [select_images(package, imageSize) for package in result]
+    
     # If displayMode is grouped, create combined packages
     if displayMode == "grouped":
         print(f"Generating package combinations with max budget: {maxPrice}")
@@ -107,7 +174,35 @@ async def get_all_available_packages(
         # Set a reasonable default max budget if none provided
         actual_max_budget = maxPrice if maxPrice is not None else 500000
         
-        combined_packages = await generate_package_combinations(result, actual_max_budget, serviceType)
+        # Average provider ratings are only needed when ranking bundles by rating
+        ratings = None
+        if sortBy == "rating":
+            provider_ids = list({package["provider_id"] for package in result})
+            ratings_cursor = db.reviews.aggregate([
+                {"$match": {"serviceProviderId": {"$in": provider_ids}}},
+                {"$group": {"_id": "$serviceProviderId", "rating": {"$avg": "$rating"}}}
+            ])
+            ratings = {doc["_id"]: doc["rating"] for doc in await ratings_cursor.to_list(length=None)}
+        
+        # The snapshot's prebuilt columns cover the whole catalogue, so they only apply when
+        # every active filter is one the bundle search re-checks itself
+        columns = None
+        if from_snapshot and minPrice is None and not serviceType and not near_point:
+            columns = snapshot.columns
+        
+        combined_packages = generate_package_combinations(
+            result,
+            actual_max_budget,
+            serviceType,
+            top_k=topK,
+            max_services=maxServices,
+            sort_by=sortBy,
+            ratings=ratings,
+            crowd_size=crowdSize,
+            event_type=eventType,
+            columns=columns,
+            image_size=imageSize
+        )
         print(f"Number of combinations generated: {len(combined_packages) if combined_packages else 0}")
         
         if combined_packages:
@@ -117,107 +212,36 @@ async def get_all_available_packages(
         else:
             print("No valid combinations found, returning individual packages only")
     
-    return result
-    
-async def generate_package_combinations(packages, max_budget, service_filter=None):
-    """Generate combinations of packages that fit within the budget"""
-    print(f"Running generate_package_combinations with {len(packages)} packages, max_budget={max_budget}, service_filter={service_filter}")
-    
-    # Group packages by service type
-    service_packages = {}
-    for package in packages:
-        service_type = package.get("serviceType", "") or package.get("providerInfo", {}).get("serviceType", "")
-        if service_type:
-            if service_type not in service_packages:
-                service_packages[service_type] = []
-            service_packages[service_type].append(package)
+    return MongoJSONResponse(result)
     
-    # Log service types found
-    print(f"Found {len(service_packages)} unique service types: {list(service_packages.keys())}")
-    
-    # Get unique service types
-    service_types = list(service_packages.keys())
-    
-    # Generate combinations
-    combinations = []
-    
-    # If service filter is specified as a comma-separated list, split it
-    requested_services = []
-    if service_filter:
-        requested_services = service_filter.split(',')
-        print(f"Requested service types: {requested_services}")
-    
-    # Check if we have enough service types to make combinations
-    if len(service_types) < 2:
-        print("Not enough service types to generate combinations")
-        return []
-    
-    # Generate all possible combinations of 2 service types - limited to just pairs for simplicity
-    from itertools import combinations as combo_iter
-    for service_combo in combo_iter(service_types, 2):  # Just pairs to keep it simple
-        # Skip if requested services are specified and not all are in this combo
-        if requested_services and not all(s in service_combo for s in requested_services):
-            continue
-        
-        print(f"Trying combination of service types: {service_combo}")
-        
-        # Get all package combinations for these service types
-        packages_by_service = [service_packages[s] for s in service_combo]
-        
-        # Generate combinations of packages, one from each service type
-        from itertools import product
-        
-        # Limit the number of combinations to prevent excessive processing
-        max_packages_per_service = 3
-        limited_packages = [
-            service_pkgs[:max_packages_per_service] for service_pkgs in packages_by_service
-        ]
-        
-        combo_count = 0
-        for package_combo in product(*limited_packages):
-            # Skip combinations of packages from the same provider
-            provider_ids = [pkg.get("provider_id") for pkg in package_combo]
-            if len(set(provider_ids)) < len(provider_ids):
-                continue
-                
-            total_price = sum(pkg["price"] for pkg in package_combo)
-            
-            # Check if the combination fits the budget
-            if max_budget is None or total_price <= max_budget:
-                combo_count += 1
-                # Create a combined package
-                service_names = [s.capitalize() for s in service_combo]
-                combined_pkg = {
-                    "id": f"combo_{'_'.join([pkg['id'] for pkg in package_combo])}",
-                    "name": f"{' & '.join(service_names)} Package",
-                    "description": f"Combined package including {', '.join([pkg['name'] for pkg in package_combo])}",
-                    "price": total_price,
-                    "currency": package_combo[0]["currency"],
-                    "eventTypes": list(set([et for pkg in package_combo for et in pkg.get("eventTypes", [])])),
-                    "crowdSizeMin": max([pkg.get("crowdSizeMin", 0) for pkg in package_combo]),
-                    "crowdSizeMax": min([pkg.get("crowdSizeMax", 1000) for pkg in package_combo]),
-                    "images": [img for pkg in package_combo for img in pkg.get("images", [])[:1] if img],
-                    "combined": True,
-                    "packages": package_combo,
-                    "serviceTypes": service_names
-                }
-                combinations.append(combined_pkg)
-                
-                # Limit to at most 10 combinations per service pair
-                if combo_count >= 10:
-                    break
-    
-    # Sort combinations by price
-    combinations.sort(key=lambda x: x["price"])
-    print(f"Total combinations generated: {len(combinations)}")
-    
-    return combinations    
 @router.get("/packages/{package_id}", response_model=dict)
-async def get_package_by_id(package_id: str):
+async def get_package_by_id(package_id: str, request: Request):
     """Get a specific package by ID"""
+    # Active packages of approved providers are served from the catalogue snapshot
+    snapshot = catalogue.snapshot
+    package = snapshot.packages.get(package_id)
+    if package:
+        provider_id = package.get("provider_id")
+        tags = [package_tag(package_id), provider_tag(provider_id)]
+        etag = response_cache.etag(tags, document_versions([
+            package, snapshot.providers.get(provider_id, {}), snapshot.profiles.get(provider_id, {})
+        ]))
+        return response_cache.lookup(request, etag) or response_cache.store(request, etag, package, tags)
+    
     db = await get_database()
     
     try:
+        # Check validators against the package version before loading the full documents
+        package_version = await db.provider_packages.find_one(
+            {"_id": ObjectId(package_id)}, {"updated_at": 1, "provider_id": 1}
+        )
+        if package_version:
+            tags = [package_tag(package_id), provider_tag(package_version.get("provider_id"))]
+            etag = response_cache.etag(tags, document_versions([package_version]))
+            cached = response_cache.lookup(request, etag)
+            if cached:
+                return cached
+        
         # Find the package
         package = await db.provider_packages.find_one({"_id": ObjectId(package_id)})
         
@@ -228,26 +252,29 @@ async def get_package_by_id(package_id: str):
             )
         
         # Get provider details
-        provider = await db.users.find_one({"_id": ObjectId(package["provider_id"])})
+        provider = await db.users.find_one({"_id": ObjectId(package["provider_id"])}, USER_NAME_PROJECTION)
         if provider:
-            provider_profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])})
+            provider_profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])}, PROFILE_NAME_PROJECTION)
             
             provider_info = {
                 "id": str(provider["_id"]),
                 "name": provider.get("name", ""),
                 "role": provider.get("role", ""),
                 "businessName": provider_profile.get("business_name") if provider_profile else "",
-                "profileImage": provider_profile.get("profile_picture_url") if provider_profile else None,
+                "profileImage": variant_url(
+                    provider_profile.get("profile_picture_variants"), "thumbnail", provider_profile.get("profile_picture_url")
+                ) if provider_profile else None,
             }
             
             # Convert ObjectId to string
             package["id"] = str(package["_id"])
             del package["_id"]
+            package = with_image_variants(package)
             
             # Add provider info
             package["providerInfo"] = provider_info
             
-            return package
+            return response_cache.store(request, etag, package, tags)
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1,22 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form, Query
+from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form, Query, Request
 from app.models.user import UserInDB
 from app.db.mongodb import get_database
 from datetime import datetime
 from bson.objectid import ObjectId
 from typing import List, Optional
 from app.api.deps import get_current_admin_user, get_current_user  # Add get_current_user import
-import cloudinary
-import cloudinary.uploader
-from app.core.config import settings
+from app.utils.storage import get_storage
+from app.utils.response_cache import response_cache, document_versions, PROMOTIONS_TAG, PRIVATE_CACHE_CONTROL
 router = APIRouter()
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
-)
-
 @router.get("/admin/promotions", response_model=List[dict])
 async def get_all_promotions(
     skip: int = Query(0, ge=0),
@@ -83,12 +75,12 @@ async def create_promotion(
     if bannerImage:
         try:
             folder = f"eventhub/{'promotions' if type == 'promotion' else 'events'}"
-            result = cloudinary.uploader.upload(
+            result = await get_storage().upload(
                 bannerImage.file,
                 folder=folder,
                 public_id=f"{type}_{datetime.now().timestamp()}"
             )
-            promotion_data["bannerImage"] = result["secure_url"]
+            promotion_data["bannerImage"] = result["url"]
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -98,6 +90,9 @@ async def create_promotion(
     # Insert into database
     result = await db.promotions.insert_one(promotion_data)
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     # Return created promotion with id
     created_promotion = {**promotion_data, "id": str(result.inserted_id)}
     
@@ -157,12 +152,12 @@ async def update_promotion(
     if bannerImage:
         try:
             folder = f"eventhub/{'promotions' if type == 'promotion' else 'events'}"
-            result = cloudinary.uploader.upload(
+            result = await get_storage().upload(
                 bannerImage.file,
                 folder=folder,
                 public_id=f"{type}_{promotion_id}_{datetime.now().timestamp()}"
             )
-            update_data["bannerImage"] = result["secure_url"]
+            update_data["bannerImage"] = result["url"]
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -175,6 +170,9 @@ async def update_promotion(
         {"$set": update_data}
     )
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     # Get updated promotion
     updated_promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     
@@ -203,6 +201,9 @@ async def delete_promotion(
     # Delete from database
     await db.promotions.delete_one({"_id": ObjectId(promotion_id)})
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     return None
 
 @router.post("/admin/promotions/{promotion_id}/publish", response_model=dict)
@@ -232,6 +233,9 @@ async def publish_promotion(
         }}
     )
     
+    # Drop cached promotion listings
+    response_cache.invalidate(PROMOTIONS_TAG)
+    
     # Get updated promotion
     updated_promotion = await db.promotions.find_one({"_id": ObjectId(promotion_id)})
     
@@ -244,6 +248,7 @@ async def publish_promotion(
 
 @router.get("/promotions/active", response_model=List[dict])
 async def get_active_promotions(
+    request: Request,
     type: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user)
 ):
@@ -257,6 +262,14 @@ async def get_active_promotions(
     if type:
         query["type"] = type
     
+    # Check validators against the promotion versions before loading full documents
+    versions = await db.promotions.find(query, {"updated_at": 1, "created_at": 1}).to_list(length=100)
+    tags = [PROMOTIONS_TAG]
+    etag = response_cache.etag(tags, document_versions(versions, "updated_at", "created_at"))
+    cached = response_cache.lookup(request, etag, PRIVATE_CACHE_CONTROL)
+    if cached:
+        return cached
+    
     cursor = db.promotions.find(query)
     promotions = await cursor.to_list(length=100)
     
@@ -279,4 +292,4 @@ async def get_active_promotions(
         if "event_date" in promo and not "eventDate" in promo:
             promo["eventDate"] = promo["event_date"]
     
-    return promotions;
\ No newline at end of file
+    return response_cache.store(request, etag, promotions, tags, PRIVATE_CACHE_CONTROL)
\ No newline at end of file
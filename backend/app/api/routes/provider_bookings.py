@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from app.models.booking import BookingInDB, BookingUpdate
 from app.db.mongodb import get_database
+from app.db.booking_state import transition_booking
+from app.db.projections import BOOKING_DATES_PROJECTION, EXISTS_PROJECTION, USER_CONTACT_PROJECTION
+from app.utils.serialization import MongoJSONResponse
+from app.utils.booking_export import EXPORT_BATCH_SIZE, EXPORT_PROJECTION, booking_filters, check_export_format, export_response
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_filter, next_cursor
 from app.api.deps import get_current_user
 from app.models.user import UserInDB
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 import traceback  # Add this import!
 
 # Create the router with explicit tags
@@ -18,27 +23,66 @@ async def debug_provider_route():
     """Debug endpoint to check if provider routes are working"""
     return {"status": "success", "message": "Provider routes are working"}
 
+# Sort keys accepted by GET /provider/bookings (newest first by default)
+BOOKING_SORT_FIELDS = ("eventDate", "createdAt")
+
 @router.get("/provider/bookings", response_model=List[dict])
-async def get_provider_bookings(current_user: UserInDB = Depends(get_current_user)):
-    """Get all bookings for the current service provider"""
+async def get_provider_bookings(
+    sort: str = Query("eventDate", description="eventDate or createdAt"),
+    order: str = Query("desc", description="asc or desc"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Comma separated statuses"),
+    date_from: Optional[datetime] = Query(None, alias="dateFrom", description="Earliest event date"),
+    date_to: Optional[datetime] = Query(None, alias="dateTo", description="Latest event date"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Get a page of bookings for the current service provider"""
+    # Check if user is a service provider
+    if current_user.role != "service_provider":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only service providers can access their bookings"
+        )
+    
+    if sort not in BOOKING_SORT_FIELDS or order not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort must be one of {', '.join(BOOKING_SORT_FIELDS)} and order asc or desc"
+        )
+    
+    # Server-side filters, served by the (providerId, status, eventDate) index
+    query = booking_filters({"providerId": str(current_user.id)}, status_filter, date_from, date_to)
+    
+    # Keyset pagination on (sort field, _id): stable under inserts and no skip() cost
+    descending = order == "desc"
+    try:
+        after = keyset_filter(sort, cursor, descending)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    if after:
+        query = {"$and": [query, after]}
+    
     try:
-        print(f"Provider bookings requested by: {current_user.id} with role: {current_user.role}")
-        
-        # Check if user is a service provider
-        if current_user.role != "service_provider":
-            print(f"Access denied: User {current_user.id} has role {current_user.role}")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Only service providers can access their bookings"
-            )
-        
         db = await get_database()
         
-        # Get provider bookings
-        print(f"Looking for bookings with providerId: {str(current_user.id)}")
-        cursor = db.bookings.find({"providerId": str(current_user.id)})
-        bookings = await cursor.to_list(length=100)
-        print(f"Found {len(bookings)} bookings for provider {current_user.id}")
+        direction = -1 if descending else 1
+        cursor_docs = db.bookings.find(query).sort([(sort, direction), ("_id", direction)]).limit(limit + 1)
+        bookings = await cursor_docs.to_list(length=limit + 1)
+        following = next_cursor(bookings, sort, limit)
+        
+        # Fetch every customer on the page in one query
+        user_ids = {booking["userId"] for booking in bookings if ObjectId.is_valid(booking.get("userId") or "")}
+        customers = {}
+        if user_ids:
+            customers = {
+                str(user["_id"]): user for user in await db.users.find(
+                    {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}}, USER_CONTACT_PROJECTION
+                ).to_list(length=None)
+            }
         
         # Process bookings
         result = []
@@ -47,32 +91,22 @@ async def get_provider_bookings(current_user: UserInDB = Depends(get_current_use
             booking_dict["id"] = str(booking_dict["_id"])
             del booking_dict["_id"]
             
-            # Get user information
+            # Add customer information
             if "userId" in booking_dict:
-                try:
-                    # Handle possible invalid ObjectId format
-                    user_id = booking_dict["userId"]
-                    if ObjectId.is_valid(user_id):
-                        user = await db.users.find_one({"_id": ObjectId(user_id)})
-                        if user:
-                            booking_dict["customerName"] = user.get("name", "Unknown Customer")
-                            booking_dict["customerEmail"] = user.get("email", "")
-                            booking_dict["customerPhone"] = user.get("phone", "")
-                    else:
-                        print(f"Invalid ObjectId format for user: {user_id}")
-                        booking_dict["customerName"] = "Unknown Customer"
-                        booking_dict["customerEmail"] = ""
-                        booking_dict["customerPhone"] = ""
-                except Exception as e:
-                    print(f"Error processing user info: {str(e)}")
+                user = customers.get(booking_dict["userId"])
+                if user:
+                    booking_dict["customerName"] = user.get("name", "Unknown Customer")
+                    booking_dict["customerEmail"] = user.get("email", "")
+                    booking_dict["customerPhone"] = user.get("phone", "")
+                else:
                     booking_dict["customerName"] = "Unknown Customer"
                     booking_dict["customerEmail"] = ""
                     booking_dict["customerPhone"] = ""
             
             result.append(booking_dict)
         
-        print(f"Returning {len(result)} processed bookings")
-        return result if result else []
+        headers = {NEXT_CURSOR_HEADER: following} if following else None
+        return MongoJSONResponse(result, headers=headers)
         
     except Exception as e:
         # Log the detailed error
@@ -85,9 +119,34 @@ async def get_provider_bookings(current_user: UserInDB = Depends(get_current_use
             detail="An error occurred while retrieving bookings"
         )
 
+@router.get("/provider/bookings/export")
+async def export_provider_bookings(
+    export_format: str = Query("csv", alias="format", description="csv or parquet"),
+    status_filter: Optional[str] = Query(None, alias="status", description="Comma separated statuses"),
+    date_from: Optional[datetime] = Query(None, alias="dateFrom", description="Earliest event date"),
+    date_to: Optional[datetime] = Query(None, alias="dateTo", description="Latest event date"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Download the current provider's bookings, one row per payment"""
+    if current_user.role != "service_provider":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only service providers can export their bookings"
+        )
+    
+    check_export_format(export_format)
+    
+    db = await get_database()
+    
+    # Streamed straight from the cursor, so memory stays flat however many bookings there are
+    query = booking_filters({"providerId": str(current_user.id)}, status_filter, date_from, date_to)
+    cursor = db.bookings.find(query, EXPORT_PROJECTION).sort("eventDate", 1).batch_size(EXPORT_BATCH_SIZE)
+    return export_response(cursor, export_format, "bookings")
+
 @router.post("/provider/bookings/{booking_id}/cancel", response_model=dict)
 async def provider_cancel_booking(
     booking_id: str,
+    version: Optional[int] = Query(None, description="Expected booking version (optimistic concurrency)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Cancel a booking as a service provider"""
@@ -99,50 +158,10 @@ async def provider_cancel_booking(
     
     db = await get_database()
     
-    # Check if booking exists and belongs to this provider
-    booking = await db.bookings.find_one({
-        "_id": ObjectId(booking_id),
-        "providerId": str(current_user.id)
-    })
-    
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    # Check if booking can be cancelled (within 12 hours of creation)
-    booking_created = booking.get("createdAt", datetime.utcnow())
-    current_time = datetime.utcnow()
-    time_difference = (current_time - booking_created).total_seconds() / 3600
-    
-    if time_difference > 12:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Booking can only be cancelled within 12 hours of creation"
-        )
-    
-    # Check if booking status allows cancellation
-    if booking["status"] not in ["pending", "confirmed"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot cancel booking with status: {booking['status']}"
-        )
-    
-    # Update booking status
-    result = await db.bookings.update_one(
-        {"_id": ObjectId(booking_id)},
-        {"$set": {"status": "cancelled", "cancelledAt": datetime.utcnow()}}
+    # Cancel atomically if the booking is ours, cancellable and still within 12 hours of creation
+    updated_booking = await transition_booking(
+        db, booking_id, "cancel", {"providerId": str(current_user.id)}, expected_version=version
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to cancel booking"
-        )
-    
-    # Get updated booking
-    updated_booking = await db.bookings.find_one({"_id": ObjectId(booking_id)})
     updated_booking["id"] = str(updated_booking["_id"])
     del updated_booking["_id"]
     
@@ -151,6 +170,7 @@ async def provider_cancel_booking(
 @router.post("/provider/bookings/{booking_id}/mark-paid", response_model=dict)
 async def mark_booking_paid(
     booking_id: str,
+    version: Optional[int] = Query(None, description="Expected booking version (optimistic concurrency)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Mark a booking as fully paid"""
@@ -162,57 +182,10 @@ async def mark_booking_paid(
     
     db = await get_database()
     
-    # Check if booking exists and belongs to this provider
-    booking = await db.bookings.find_one({
-        "_id": ObjectId(booking_id),
-        "providerId": str(current_user.id)
-    })
-    
-    if not booking:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Booking not found"
-        )
-    
-    # Check if booking can be marked as paid
-    if booking["status"] not in ["pending", "confirmed"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot mark booking with status {booking['status']} as paid"
-        )
-    
-    # Create payment record for the remaining amount
-    remaining_amount = booking.get("remainingAmount", 0)
-    if remaining_amount > 0:
-        payment = {
-            "amount": remaining_amount,
-            "method": "marked_by_provider",
-            "date": datetime.utcnow(),
-            "status": "completed",
-            "type": "balance"
-        }
-        
-        # Update booking with new payment and status
-        result = await db.bookings.update_one(
-            {"_id": ObjectId(booking_id)},
-            {
-                "$push": {"payments": payment},
-                "$set": {
-                    "remainingAmount": 0,
-                    "status": "confirmed",
-                    "updatedAt": datetime.utcnow()
-                }
-            }
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to mark booking as paid"
-            )
-    
-    # Get updated booking
-    updated_booking = await db.bookings.find_one({"_id": ObjectId(booking_id)})
+    # Settle the remaining amount (read from the stored booking) in one conditional update
+    updated_booking = await transition_booking(
+        db, booking_id, "mark_paid", {"providerId": str(current_user.id)}, expected_version=version
+    )
     updated_booking["id"] = str(updated_booking["_id"])
     del updated_booking["_id"]
     
@@ -230,7 +203,7 @@ async def get_provider_booked_dates(provider_id: str):
             "_id": ObjectId(provider_id),
             "role": "service_provider",
             "approval_status": "approved"
-        })
+        }, EXISTS_PROJECTION)
         
         if not provider:
             raise HTTPException(
@@ -242,7 +215,7 @@ async def get_provider_booked_dates(provider_id: str):
         cursor = db.bookings.find({
             "providerId": provider_id,
             "status": {"$in": ["pending", "confirmed"]}
-        })
+        }, BOOKING_DATES_PROJECTION)
         bookings = await cursor.to_list(length=100)
         
         # Extract event dates
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from app.models.user import UserInDB
 from app.db.mongodb import get_database
+from app.db.projections import BOOKING_SUMMARY_PROJECTION, PACKAGE_NAME_PROJECTION, USER_CONTACT_PROJECTION
 from app.api.deps import get_current_user
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
@@ -54,7 +55,7 @@ async def get_provider_dashboard_stats(current_user: UserInDB = Depends(get_curr
         
         # Get recent bookings
         recent_bookings_cursor = db.bookings.find(
-            {"providerId": str(current_user.id)}
+            {"providerId": str(current_user.id)}, BOOKING_SUMMARY_PROJECTION
         ).sort("createdAt", -1).limit(5)
         
         recent_bookings = []
@@ -66,9 +67,9 @@ async def get_provider_dashboard_stats(current_user: UserInDB = Depends(get_curr
                     # Safely try to convert to ObjectId
                     user_id = booking["userId"]
                     if isinstance(user_id, str) and len(user_id) == 24:
-                        customer = await db.users.find_one({"_id": ObjectId(user_id)})
+                        customer = await db.users.find_one({"_id": ObjectId(user_id)}, USER_CONTACT_PROJECTION)
                     else:
-                        customer = await db.users.find_one({"id": user_id})
+                        customer = await db.users.find_one({"id": user_id}, USER_CONTACT_PROJECTION)
                 except (InvalidId, Exception) as e:
                     print(f"Error finding customer: {str(e)}")
             
@@ -79,7 +80,7 @@ async def get_provider_dashboard_stats(current_user: UserInDB = Depends(get_curr
                     # Safely try to convert to ObjectId
                     package_id = booking["packageId"]
                     if isinstance(package_id, str) and len(package_id) == 24:
-                        package = await db.provider_packages.find_one({"_id": ObjectId(package_id)})
+                        package = await db.provider_packages.find_one({"_id": ObjectId(package_id)}, PACKAGE_NAME_PROJECTION)
                         if package:
                             package_name = package.get("name", "Custom Package")
                 except (InvalidId, Exception) as e:
@@ -1,27 +1,48 @@
-from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form
+from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form, Query, Request
 from typing import List, Optional
 from app.models.user import ServiceProviderProfile, ServiceProviderCreate, UserInDB
 from app.db.mongodb import get_database
+from app.db.projections import (
+    BOOKING_DATES_PROJECTION,
+    BOOKING_SUMMARY_PROJECTION,
+    EXISTS_PROJECTION,
+    PACKAGE_NAME_PROJECTION,
+    PROFILE_CARD_PROJECTION,
+    PROFILE_PROJECTION,
+    USER_CONTACT_PROJECTION,
+    USER_PROJECTION
+)
+import asyncio
 from datetime import datetime
 from app.core.security import get_password_hash
-import cloudinary
-import cloudinary.uploader
-from app.core.config import settings
+from app.utils.storage import get_storage
 from app.api.deps import get_current_user
 from app.models.card import CardModel, PyObjectId
 from bson import ObjectId
 from app.models.package import PackageCreate, PackageUpdate, PackageInDB
-from typing import List
-
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
+from app.utils.service_types import service_type_keys, split_service_types, package_service_type_fields
+from app.utils.search import search_fields
+from app.utils.geo import geocode, parse_near, geo_near_stage, DEFAULT_RADIUS_KM
+from app.db.catalogue import catalogue
+from app.utils.serialization import MongoJSONResponse
+from app.utils.response_cache import (
+    response_cache, document_versions, provider_tag, gallery_tag, provider_packages_tag, package_tag
 )
+from app.utils.images import (
+    ImageVariant, create_image_variants, delete_image_variants, select_images, store_images, variant_url,
+    with_image_variants
+)
+from typing import List
 
 router = APIRouter()
 
+# Package images accepted by one batch upload
+MAX_PACKAGE_IMAGES_PER_BATCH = 50
+
+def gallery_images(gallery: dict) -> dict:
+    """The public part of a provider_galleries document"""
+    return {"images": gallery.get("images", []), "image_variants": gallery.get("image_variants")}
+
 @router.get("/providers/cards", response_model=list)
 async def get_provider_cards(current_user: UserInDB = Depends(get_current_user)):
     """Get service provider payment cards"""
@@ -224,7 +245,7 @@ async def register_service_provider(provider: ServiceProviderCreate):
     db = await get_database()
     
     # Check if email already exists
-    existing_user = await db.users.find_one({"email": provider.email})
+    existing_user = await db.users.find_one({"email": provider.email}, EXISTS_PROJECTION)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -232,7 +253,7 @@ async def register_service_provider(provider: ServiceProviderCreate):
         )
         
     # Check if username already exists
-    existing_username = await db.users.find_one({"username": provider.username})
+    existing_username = await db.users.find_one({"username": provider.username}, EXISTS_PROJECTION)
     if existing_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -245,6 +266,7 @@ async def register_service_provider(provider: ServiceProviderCreate):
     new_provider["password"] = hashed_password
     new_provider["created_at"] = datetime.utcnow()
     new_provider["updated_at"] = datetime.utcnow()
+    new_provider.update(search_fields("users", new_provider))
     
     # Insert service provider into database
     await db.users.insert_one(new_provider)
@@ -286,14 +308,14 @@ async def complete_service_provider_profile(
     db = await get_database()
     
     # Check if email exists and get user
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, EXISTS_PROJECTION)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Upload images to Cloudinary
+    # Upload images to storage
     nic_front_image_url = None
     nic_back_image_url = None
     profile_picture_url = None
@@ -301,37 +323,52 @@ async def complete_service_provider_profile(
     
     try:
         # Upload NIC front image
-        nic_front_result = cloudinary.uploader.upload(
+        nic_front_result = await get_storage().upload(
             nicFrontImage.file,
             folder="eventhub/nic_images",
             public_id=f"nic_front_{username}_{datetime.now().timestamp()}"
         )
-        nic_front_image_url = nic_front_result["secure_url"]
+        nic_front_image_url = nic_front_result["url"]
         
         # Upload NIC back image
-        nic_back_result = cloudinary.uploader.upload(
+        nic_back_result = await get_storage().upload(
             nicBackImage.file,
             folder="eventhub/nic_images",
             public_id=f"nic_back_{username}_{datetime.now().timestamp()}"
         )
-        nic_back_image_url = nic_back_result["secure_url"]
+        nic_back_image_url = nic_back_result["url"]
         
         # Upload profile picture
-        profile_picture_result = cloudinary.uploader.upload(
+        profile_picture_data = await profilePicture.read()
+        await profilePicture.seek(0)
+        profile_picture_id = f"profile_{username}_{datetime.now().timestamp()}"
+        profile_picture_result = await get_storage().upload(
             profilePicture.file,
             folder="eventhub/profile_pictures",
-            public_id=f"profile_{username}_{datetime.now().timestamp()}"
+            public_id=profile_picture_id
         )
-        profile_picture_url = profile_picture_result["secure_url"]
+        profile_picture_url = profile_picture_result["url"]
+        variant_jobs = [create_image_variants(
+            profile_picture_data, "eventhub/profile_pictures", profile_picture_id, profile_picture_url
+        )]
         
         # Upload cover photo if provided
         if coverPhoto:
-            cover_photo_result = cloudinary.uploader.upload(
+            cover_photo_data = await coverPhoto.read()
+            await coverPhoto.seek(0)
+            cover_photo_id = f"cover_{username}_{datetime.now().timestamp()}"
+            cover_photo_result = await get_storage().upload(
                 coverPhoto.file,
                 folder="eventhub/cover_photos",
-                public_id=f"cover_{username}_{datetime.now().timestamp()}"
+                public_id=cover_photo_id
             )
-            cover_photo_url = cover_photo_result["secure_url"]
+            cover_photo_url = cover_photo_result["url"]
+            variant_jobs.append(create_image_variants(
+                cover_photo_data, "eventhub/cover_photos", cover_photo_id, cover_photo_url
+            ))
+        
+        # Smaller renditions for the provider cards, rendered in parallel
+        picture_variants = await asyncio.gather(*variant_jobs)
     
     except Exception as e:
         raise HTTPException(
@@ -355,10 +392,14 @@ async def complete_service_provider_profile(
         "city": city,
         "province": province,
         "service_locations": serviceLocations,
+        "geo_point": geocode(city, province, serviceLocations),
         "service_types": serviceTypes,
+        "service_type_list": service_type_keys(serviceTypes),
         "covered_event_types": coveredEventTypes,
         "profile_picture_url": profile_picture_url,
+        "profile_picture_variants": picture_variants[0],
         "cover_photo_url": cover_photo_url,
+        "cover_photo_variants": picture_variants[1] if coverPhoto else None,
         "slogan": slogan,
         "bank_name": bankName,
         "branch_name": branchName,
@@ -368,6 +409,7 @@ async def complete_service_provider_profile(
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
+    profile_data.update(search_fields("service_provider_profiles", profile_data))
     
     # Insert profile data into a service_provider_profiles collection
     await db.service_provider_profiles.insert_one(profile_data)
@@ -394,18 +436,23 @@ async def upload_gallery_images(
     
     db = await get_database()
     
-    # Upload images to Cloudinary
+    # Upload images to storage
     image_urls = []
     
     try:
+        folder = f"eventhub/provider_gallery/{current_user.id}"
+        variant_jobs = []
         for image in images:
             # Upload image
-            result = cloudinary.uploader.upload(
-                image.file,
-                folder=f"eventhub/provider_gallery/{current_user.id}",
-                public_id=f"gallery_{datetime.now().timestamp()}"
-            )
-            image_urls.append(result["secure_url"])
+            data = await image.read()
+            await image.seek(0)
+            public_id = f"gallery_{datetime.now().timestamp()}"
+            result = await get_storage().upload(image.file, folder=folder, public_id=public_id)
+            image_urls.append(result["url"])
+            variant_jobs.append(create_image_variants(data, folder, public_id, result["url"]))
+        
+        # Thumbnail, card and full-size renditions, rendered in parallel
+        image_variants = await asyncio.gather(*variant_jobs)
         
         # Store image URLs in database
         provider_gallery = await db.provider_galleries.find_one({"provider_id": str(current_user.id)})
@@ -414,17 +461,23 @@ async def upload_gallery_images(
             # Add new images to existing gallery
             await db.provider_galleries.update_one(
                 {"provider_id": str(current_user.id)},
-                {"$push": {"images": {"$each": image_urls}}}
+                {
+                    "$push": {"images": {"$each": image_urls}, "image_variants": {"$each": image_variants}},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
             )
         else:
             # Create new gallery for provider
             await db.provider_galleries.insert_one({
                 "provider_id": str(current_user.id),
                 "images": image_urls,
+                "image_variants": image_variants,
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             })
         
+        response_cache.invalidate(gallery_tag(str(current_user.id)))
+        
         return {"imageUrls": image_urls}
     
     except Exception as e:
@@ -434,7 +487,10 @@ async def upload_gallery_images(
         )
 
 @router.get("/providers/gallery", response_model=dict)
-async def get_gallery_images(current_user: UserInDB = Depends(get_current_user)):
+async def get_gallery_images(
+    size: Optional[ImageVariant] = Query(None, description="Return this rendition in images instead of the originals"),
+    current_user: UserInDB = Depends(get_current_user)
+):
     # Check if user is a service provider
     if current_user.role != "service_provider" and current_user.role != "admin" and current_user.role != "super_admin":
         raise HTTPException(
@@ -448,9 +504,9 @@ async def get_gallery_images(current_user: UserInDB = Depends(get_current_user))
     provider_gallery = await db.provider_galleries.find_one({"provider_id": str(current_user.id)})
     
     if provider_gallery:
-        return {"images": provider_gallery.get("images", [])}
+        return select_images(with_image_variants(gallery_images(provider_gallery)), size)
     
-    return {"images": []}
+    return {"images": [], "imageVariants": []}
 
 @router.delete("/providers/gallery/image", response_model=dict)
 @router.delete("/providers/gallery/image", response_model=dict)
@@ -473,36 +529,25 @@ async def delete_gallery_image(
     
     db = await get_database()
     
-    # Remove image from gallery
-    result = await db.provider_galleries.update_one(
-        {"provider_id": str(current_user.id)},
-        {"$pull": {"images": imageUrl}}
+    # Remove image from gallery; only an image of the caller's own gallery matches
+    gallery = await db.provider_galleries.find_one_and_update(
+        {"provider_id": str(current_user.id), "images": imageUrl},
+        {"$pull": {"images": imageUrl, "image_variants": {"url": imageUrl}}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"image_variants": {"$elemMatch": {"url": imageUrl}}}
     )
     
-    if result.matched_count == 0:
-        # If no document was found, the gallery doesn't exist
+    if gallery is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Gallery not found"
+            detail="Image not found in gallery"
         )
     
-    # Try to delete from Cloudinary (extract public_id from URL)
-    try:
-        # Extract public ID from URL
-        url_parts = imageUrl.split('/')
-        if "upload" in url_parts:
-            upload_index = url_parts.index("upload")
-            if upload_index + 2 < len(url_parts):
-                # The format is typically: .../upload/v1234567890/folder/filename.ext
-                # We need to get the part after the version (folder/filename)
-                folder_and_file = '/'.join(url_parts[upload_index+2:])
-                # Remove extension
-                public_id = '.'.join(folder_and_file.split('.')[:-1])
-                # Try to delete from Cloudinary
-                cloudinary.uploader.destroy(public_id)
-    except Exception as e:
-        # Log error but don't fail the request if Cloudinary delete fails
-        print(f"Error deleting image from Cloudinary: {str(e)}")
+    response_cache.invalidate(gallery_tag(str(current_user.id)))
+    await delete_image_variants(gallery.get("image_variants", []))
+    
+    # Storage is only touched for an image that was in the gallery (the gallery only keeps the URL);
+    # failures are logged, not raised
+    await get_storage().delete_url(imageUrl)
     
     return {"message": "Image deleted successfully"}
 
@@ -559,8 +604,22 @@ async def update_provider_profile(
         )
     
     # Prepare update data
-    update_data = {k: v for k, v in profile_data.items() if k not in ["user_id", "created_at", "approval_status", "nic_number"]}
+    update_data = {k: v for k, v in profile_data.items() if k not in ["user_id", "created_at", "approval_status", "nic_number", "service_type_list", "geo_point"]}
     update_data["updated_at"] = datetime.utcnow()
+    update_data.update(search_fields("service_provider_profiles", update_data))
+    
+    # Keep the normalized service type array in sync with the display string
+    if "service_types" in update_data:
+        update_data["service_type_list"] = service_type_keys(update_data["service_types"])
+    
+    # Re-geocode when any of the location fields change
+    location_changed = any(field in update_data for field in ["city", "province", "service_locations"])
+    if location_changed:
+        update_data["geo_point"] = geocode(
+            update_data.get("city", existing_profile.get("city")),
+            update_data.get("province", existing_profile.get("province")),
+            update_data.get("service_locations", existing_profile.get("service_locations"))
+        )
     
     # Update profile
     result = await db.service_provider_profiles.update_one(
@@ -574,6 +633,23 @@ async def update_provider_profile(
             detail="No changes made to profile"
         )
     
+    # Propagate the primary service type and location to the provider's packages
+    package_fields = {}
+    if "service_types" in update_data:
+        package_fields.update(package_service_type_fields(update_data["service_types"]))
+    if location_changed:
+        package_fields["geo_point"] = update_data["geo_point"]
+    
+    if package_fields:
+        await db.provider_packages.update_many(
+            {"provider_id": str(current_user.id)},
+            {"$set": package_fields}
+        )
+    
+    # Make the change visible in the catalogue snapshot right away
+    await catalogue.refresh_provider(db, str(current_user.id))
+    response_cache.invalidate(provider_tag(str(current_user.id)), provider_packages_tag(str(current_user.id)))
+    
     # Get updated profile
     updated_profile = await db.service_provider_profiles.find_one({"user_id": str(current_user.id)})
     
@@ -795,7 +871,7 @@ async def get_provider_packages(current_user: UserInDB = Depends(get_current_use
             package["id"] = str(package["_id"])
             del package["_id"]
     
-    return packages
+    return MongoJSONResponse([with_image_variants(package) for package in packages])
 
 @router.post("/providers/packages", response_model=dict)
 async def create_provider_package(
@@ -815,12 +891,25 @@ async def create_provider_package(
     new_package = package_data.dict()
     new_package["provider_id"] = str(current_user.id)
     new_package["bookings"] = 0
+    
+    # Denormalize the provider's primary service type and location onto the package
+    provider_profile = await db.service_provider_profiles.find_one(
+        {"user_id": str(current_user.id)},
+        {"service_types": 1, "geo_point": 1}
+    )
+    new_package.update(package_service_type_fields(provider_profile.get("service_types") if provider_profile else None))
+    if provider_profile and provider_profile.get("geo_point"):
+        new_package["geo_point"] = provider_profile["geo_point"]
     new_package["created_at"] = datetime.utcnow()
     new_package["updated_at"] = datetime.utcnow()
     
     # Insert package
     result = await db.provider_packages.insert_one(new_package)
     
+    # Make the change visible in the catalogue snapshot right away
+    await catalogue.refresh_provider(db, str(current_user.id))
+    response_cache.invalidate(provider_packages_tag(str(current_user.id)))
+    
     # Get inserted package document
     inserted_package = await db.provider_packages.find_one({"_id": result.inserted_id})
     
@@ -860,7 +949,7 @@ async def get_provider_package(
     package["id"] = str(package["_id"])
     del package["_id"]
     
-    return package
+    return with_image_variants(package)
 
 @router.put("/providers/packages/{package_id}", response_model=dict)
 async def update_provider_package(
@@ -905,6 +994,10 @@ async def update_provider_package(
             detail="No changes made to package"
         )
     
+    # Make the change visible in the catalogue snapshot right away
+    await catalogue.refresh_provider(db, str(current_user.id))
+    response_cache.invalidate(provider_packages_tag(str(current_user.id)), package_tag(package_id))
+    
     # Get updated package
     updated_package = await db.provider_packages.find_one({"_id": ObjectId(package_id)})
     updated_package["id"] = str(updated_package["_id"])
@@ -941,6 +1034,10 @@ async def delete_provider_package(
     # Delete package
     await db.provider_packages.delete_one({"_id": ObjectId(package_id)})
     
+    # Make the change visible in the catalogue snapshot right away
+    await catalogue.refresh_provider(db, str(current_user.id))
+    response_cache.invalidate(provider_packages_tag(str(current_user.id)), package_tag(package_id))
+    
     return {"message": "Package deleted successfully"}
 
 @router.post("/providers/packages/{package_id}/images", response_model=dict)
@@ -971,25 +1068,29 @@ async def upload_package_images(
             detail="Package not found"
         )
     
-    # Upload images to Cloudinary
-    image_urls = []
-    
     try:
-        for image in images:
-            # Upload image
-            result = cloudinary.uploader.upload(
-                image.file,
-                folder=f"eventhub/package_images/{current_user.id}/{package_id}",
-                public_id=f"pkg_{datetime.now().timestamp()}"
-            )
-            image_urls.append(result["secure_url"])
+        # Originals with their thumbnail, card and full-size renditions, a few images at a time
+        stored = await store_images(
+            images,
+            f"eventhub/package_images/{current_user.id}/{package_id}",
+            "pkg"
+        )
+        image_urls = [url for url, _ in stored]
+        image_variants = [entry for _, entry in stored]
         
         # Update package with new images
         await db.provider_packages.update_one(
             {"_id": ObjectId(package_id)},
-            {"$push": {"images": {"$each": image_urls}}}
+            {
+                "$push": {"images": {"$each": image_urls}, "image_variants": {"$each": image_variants}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
         )
         
+        # Make the change visible in the catalogue snapshot right away
+        await catalogue.refresh_provider(db, str(current_user.id))
+        response_cache.invalidate(provider_packages_tag(str(current_user.id)), package_tag(package_id))
+        
         return {"imageUrls": image_urls}
     
     except Exception as e:
@@ -999,16 +1100,144 @@ async def upload_package_images(
         )
 
 
+@router.post("/providers/packages/{package_id}/images/batch", response_model=dict)
+async def upload_package_images_batch(
+    package_id: str,
+    images: List[UploadFile] = File(None),
+    order: List[str] = Form(None),
+    replace: bool = Form(False),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Add many images to a package at once, optionally reordering or replacing its current ones.
+
+    order lists current image URLs in their new order, ahead of the others;
+    with replace, current images missing from order are removed. New images
+    always go last.
+    """
+    if current_user.role != "service_provider" and current_user.role != "admin" and current_user.role != "super_admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only service providers can upload package images"
+        )
+    
+    images = images or []
+    order = order or []
+    if len(images) > MAX_PACKAGE_IMAGES_PER_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_PACKAGE_IMAGES_PER_BATCH} images can be uploaded at once"
+        )
+    
+    # Reject the whole batch before anything is uploaded
+    for image in images:
+        if not (image.content_type or "").startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Only images are supported. Got {image.content_type} for {image.filename}"
+            )
+    
+    db = await get_database()
+    
+    # Validate package exists and belongs to this provider
+    package = await db.provider_packages.find_one({
+        "_id": ObjectId(package_id),
+        "provider_id": str(current_user.id)
+    }, {"images": 1, "image_variants": 1})
+    
+    if not package:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Package not found"
+        )
+    
+    current_images = package.get("images") or []
+    unknown = [url for url in order if url not in current_images]
+    if unknown or len(set(order)) != len(order):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="order must list images of this package, each once"
+        )
+    kept = order + ([] if replace else [url for url in current_images if url not in order])
+    removed = [url for url in current_images if url not in kept]
+    
+    try:
+        stored = await store_images(
+            images,
+            f"eventhub/package_images/{current_user.id}/{package_id}",
+            "pkg"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error uploading images: {str(e)}"
+        )
+    image_urls = [url for url, _ in stored]
+    new_variants = [entry for _, entry in stored]
+    variants_by_url = {entry.get("url"): entry for entry in package.get("image_variants") or []}
+    
+    if kept == current_images:
+        # Plain append: one $push for all the new images
+        update = {"$push": {"images": {"$each": image_urls}, "image_variants": {"$each": new_variants}}}
+        guard = {}
+    else:
+        # Reordered or replaced: write the whole list, provided nobody changed it since it was read
+        update = {"$set": {
+            "images": kept + image_urls,
+            "image_variants": [variants_by_url[url] for url in kept if url in variants_by_url] + new_variants
+        }}
+        guard = {"images": current_images}
+    update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+    
+    result = await db.provider_packages.update_one({"_id": ObjectId(package_id), **guard}, update)
+    if not result.matched_count:
+        # Nothing points at the new uploads, so they go again
+        storage = get_storage()
+        await storage.delete_many([key for key in map(storage.public_id_from_url, image_urls) if key])
+        await delete_image_variants(new_variants)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The package images changed meanwhile, reload them and retry"
+        )
+    
+    # Removed images go from storage once the package no longer points at them (best effort)
+    storage = get_storage()
+    await storage.delete_many([key for key in map(storage.public_id_from_url, removed) if key])
+    await delete_image_variants([variants_by_url[url] for url in removed if url in variants_by_url])
+    
+    # Make the change visible in the catalogue snapshot right away
+    await catalogue.refresh_provider(db, str(current_user.id))
+    response_cache.invalidate(provider_packages_tag(str(current_user.id)), package_tag(package_id))
+    
+    return {"imageUrls": image_urls, "images": kept + image_urls}
+
 @router.get("/providers/approved", response_model=list)
 @router.get("/providers/approved", response_model=list)
 async def get_approved_service_providers(
     eventType: Optional[str] = None,
     services: Optional[str] = None,
-    location: Optional[str] = None
+    location: Optional[str] = None,
+    near: Optional[str] = None,
+    radiusKm: float = DEFAULT_RADIUS_KM
 ):
     """Get all approved service providers with optional filtering"""
     db = await get_database()
     
+    # Validate the proximity filter up front
+    near_point = None
+    if near:
+        try:
+            near_point = parse_near(near)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid near parameter: {str(e)}"
+            )
+        if radiusKm <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="radiusKm must be greater than 0"
+            )
+    
     # Base query - get all service providers that are approved
     query = {
         "role": "service_provider",
@@ -1020,8 +1249,7 @@ async def get_approved_service_providers(
         query["covered_event_types"] = {"$in": [eventType]}
     
     if services:
-        service_list = services.split(',')
-        query["service_types"] = {"$in": service_list}
+        query["service_type_list"] = {"$in": service_type_keys(services)}
     
     if location:
         # Search for location in any of the service_locations or city/province fields
@@ -1032,41 +1260,87 @@ async def get_approved_service_providers(
             {"province": {"$regex": location_terms, "$options": "i"}}
         ]
     
-    # Get providers with approval_status = approved
-    cursor = db.users.find({"role": "service_provider", "approval_status": "approved"})
-    providers = await cursor.to_list(length=100)
+    # Rank approved profiles by distance when a proximity search is requested
+    distances = {}
+    if near_point:
+        profile_query = {"approval_status": "approved"}
+        if services:
+            profile_query["service_type_list"] = query["service_type_list"]
+        
+        lat, lng = near_point
+        nearby_profiles = await db.service_provider_profiles.aggregate([
+            geo_near_stage(lat, lng, radiusKm, profile_query),
+            {"$project": {"user_id": 1, "distance": 1}},
+            {"$limit": 100}
+        ]).to_list(length=100)
+        
+        distances = {p["user_id"]: p["distance"] for p in nearby_profiles}
+    
+    if catalogue.ready:
+        # Approved providers and their profiles come from the in-memory catalogue
+        snapshot = catalogue.snapshot
+        providers = snapshot.approved_providers(
+            service_type_keys(services) if services else None,
+            provider_ids=list(distances) if near_point else None
+        )[:100]
+        profiles = snapshot.profiles
+    else:
+        # Get providers with approval_status = approved
+        users_query = {"role": "service_provider", "approval_status": "approved"}
+        
+        # Resolve the service type filter with an exact lookup on the multikey index
+        if services and not near_point:
+            matching_profiles = await db.service_provider_profiles.find(
+                {"service_type_list": query["service_type_list"]},
+                {"user_id": 1}
+            ).to_list(length=None)
+            users_query["_id"] = {"$in": [ObjectId(p["user_id"]) for p in matching_profiles if ObjectId.is_valid(p.get("user_id"))]}
+        
+        if near_point:
+            users_query["_id"] = {"$in": [ObjectId(user_id) for user_id in distances if ObjectId.is_valid(user_id)]}
+        
+        cursor = db.users.find(users_query, USER_PROJECTION)
+        providers = await cursor.to_list(length=100)
+        for provider in providers:
+            provider["id"] = str(provider.pop("_id"))
+        
+        # Keep the $geoNear ranking (nearest first)
+        if near_point:
+            providers.sort(key=lambda p: distances.get(p["id"], 0))
+        
+        # Fetch all the profiles in one query
+        profile_docs = await db.service_provider_profiles.find(
+            {"user_id": {"$in": [p["id"] for p in providers]}}, PROFILE_CARD_PROJECTION
+        ).to_list(length=None)
+        profiles = {p["user_id"]: p for p in profile_docs}
     
-    # For each provider, get their profile data and merge
+    # For each provider, merge in their profile data
     result = []
     for provider in providers:
-        provider_id = str(provider["_id"])
-        profile = await db.service_provider_profiles.find_one({"user_id": provider_id})
+        provider_id = provider["id"]
+        profile = profiles.get(provider_id)
         
         if profile:
-            # Convert ObjectId to string
-            if "_id" in provider:
-                provider["id"] = str(provider["_id"])
-                del provider["_id"]
-            
-            # Remove password
-            if "password" in provider:
-                del provider["password"]
-            
-            # Merge user data with profile data
-            provider_data = {**provider}
+            # Merge user data with profile data (without the password)
+            provider_data = {k: v for k, v in provider.items() if k != "password"}
             
             # Add profile data that we want to expose
+            # Card-sized renditions: an avatar thumbnail and a card-width cover
             if profile.get("profile_picture_url"):
-                provider_data["profileImage"] = profile["profile_picture_url"]
+                provider_data["profileImage"] = variant_url(
+                    profile.get("profile_picture_variants"), "thumbnail", profile["profile_picture_url"]
+                )
             
             if profile.get("cover_photo_url"):
-                provider_data["coverImage"] = profile["cover_photo_url"]
+                provider_data["coverImage"] = variant_url(
+                    profile.get("cover_photo_variants"), "card", profile["cover_photo_url"]
+                )
             
             if profile.get("service_locations"):
                 provider_data["serviceLocations"] = profile["service_locations"]
             
             if profile.get("service_types"):
-                provider_data["serviceType"] = profile["service_types"].split(',')
+                provider_data["serviceType"] = split_service_types(profile["service_types"])
             
             if profile.get("covered_event_types"):
                 provider_data["eventTypes"] = profile["covered_event_types"]
@@ -1084,6 +1358,10 @@ async def get_approved_service_providers(
             if location_parts:
                 provider_data["location"] = ", ".join(location_parts)
             
+            # Distance from the requested point, in kilometres
+            if provider_id in distances:
+                provider_data["distanceKm"] = round(distances[provider_id] / 1000, 2)
+            
             # Set as newcomer if created within last 30 days
             if "created_at" in provider:
                 from datetime import datetime, timedelta
@@ -1097,20 +1375,30 @@ async def get_approved_service_providers(
             
             result.append(provider_data)
     
-    return result;
+    return MongoJSONResponse(result)
 
 
 from bson.errors import InvalidId
 from bson import ObjectId
 
 @router.get("/providers/{provider_id}", response_model=dict)
-async def get_provider_by_id(provider_id: str):
+async def get_provider_by_id(provider_id: str, request: Request):
     """Get service provider details by ID"""
     db = await get_database()
     
     try:
+        # Check validators against the document versions before loading anything else
+        user_version = await db.users.find_one({"_id": ObjectId(provider_id)}, {"updated_at": 1})
+        profile_version = await db.service_provider_profiles.find_one({"user_id": provider_id}, {"updated_at": 1})
+        tags = [provider_tag(provider_id)]
+        etag = response_cache.etag(tags, document_versions([doc for doc in (user_version, profile_version) if doc]))
+        if user_version and profile_version:
+            cached = response_cache.lookup(request, etag)
+            if cached:
+                return cached
+        
         # Find the provider by ID
-        provider = await db.users.find_one({"_id": ObjectId(provider_id), "role": "service_provider"})
+        provider = await db.users.find_one({"_id": ObjectId(provider_id), "role": "service_provider"}, USER_PROJECTION)
         
         if not provider:
             raise HTTPException(
@@ -1126,7 +1414,7 @@ async def get_provider_by_id(provider_id: str):
             )
         
         # Get provider profile
-        profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])})
+        profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])}, PROFILE_PROJECTION)
         
         if not profile:
             raise HTTPException(
@@ -1148,16 +1436,20 @@ async def get_provider_by_id(provider_id: str):
         
         # Add profile data
         if profile.get("profile_picture_url"):
-            provider_data["profileImage"] = profile["profile_picture_url"]
+            provider_data["profileImage"] = variant_url(
+                profile.get("profile_picture_variants"), "card", profile["profile_picture_url"]
+            )
         
         if profile.get("cover_photo_url"):
-            provider_data["coverImage"] = profile["cover_photo_url"]
+            provider_data["coverImage"] = variant_url(
+                profile.get("cover_photo_variants"), "full", profile["cover_photo_url"]
+            )
         
         if profile.get("service_locations"):
             provider_data["serviceLocations"] = profile["service_locations"]
         
         if profile.get("service_types"):
-            provider_data["serviceType"] = profile["service_types"].split(',')
+            provider_data["serviceType"] = split_service_types(profile["service_types"])
         
         if profile.get("covered_event_types"):
             provider_data["eventTypes"] = profile["covered_event_types"]
@@ -1195,7 +1487,7 @@ async def get_provider_by_id(provider_id: str):
         provider_data["rating"] = 0  # Default to 0, would be calculated from reviews
         provider_data["reviewCount"] = 0  # Default to 0, would be calculated from reviews
         
-        return provider_data
+        return response_cache.store(request, etag, provider_data, tags)
     
     except (ValueError, InvalidId):
         raise HTTPException(
@@ -1205,13 +1497,17 @@ async def get_provider_by_id(provider_id: str):
 
 
 @router.get("/providers/{provider_id}/gallery", response_model=dict)
-async def get_provider_gallery(provider_id: str):
+async def get_provider_gallery(
+    provider_id: str,
+    request: Request,
+    size: Optional[ImageVariant] = Query(None, description="Return this rendition in images instead of the originals")
+):
     """Get service provider gallery images"""
     db = await get_database()
     
     try:
         # Find the provider by ID
-        provider = await db.users.find_one({"_id": ObjectId(provider_id), "role": "service_provider"})
+        provider = await db.users.find_one({"_id": ObjectId(provider_id), "role": "service_provider"}, {"_id": 1})
         
         if not provider:
             raise HTTPException(
@@ -1219,13 +1515,21 @@ async def get_provider_gallery(provider_id: str):
                 detail="Service provider not found"
             )
         
+        # Check validators against the gallery version before loading the image list
+        gallery_version = await db.provider_galleries.find_one({"provider_id": provider_id}, {"updated_at": 1})
+        tags = [gallery_tag(provider_id)]
+        etag = response_cache.etag(tags, document_versions([gallery_version] if gallery_version else []))
+        cached = response_cache.lookup(request, etag)
+        if cached:
+            return cached
+        
         # Get provider gallery
         gallery = await db.provider_galleries.find_one({"provider_id": str(provider["_id"])})
         
         if gallery:
-            return {"images": gallery.get("images", [])}
+            return response_cache.store(request, etag, select_images(with_image_variants(gallery_images(gallery)), size), tags)
         
-        return {"images": []}
+        return response_cache.store(request, etag, {"images": [], "imageVariants": []}, tags)
     
     except (ValueError, InvalidId):
         raise HTTPException(
@@ -1236,7 +1540,11 @@ async def get_provider_gallery(provider_id: str):
 
 @router.get("/providers/{provider_id}/packages", response_model=list)
 @router.get("/providers/{provider_id}/packages", response_model=list)
-async def get_provider_packages_by_id(provider_id: str):
+async def get_provider_packages_by_id(
+    provider_id: str,
+    request: Request,
+    imageSize: Optional[ImageVariant] = Query(None, description="Return this rendition in images instead of the originals")
+):
     """Get all packages for a specific service provider by ID"""
     db = await get_database()
     
@@ -1246,7 +1554,7 @@ async def get_provider_packages_by_id(provider_id: str):
             "_id": ObjectId(provider_id), 
             "role": "service_provider",
             "approval_status": "approved"
-        })
+        }, {"_id": 1})
         
         if not provider:
             raise HTTPException(
@@ -1254,6 +1562,16 @@ async def get_provider_packages_by_id(provider_id: str):
                 detail="Service provider not found or not approved"
             )
         
+        # Check validators against the package versions before loading full documents
+        package_versions = await db.provider_packages.find(
+            {"provider_id": provider_id}, {"updated_at": 1}
+        ).to_list(length=100)
+        tags = [provider_packages_tag(provider_id)]
+        etag = response_cache.etag(tags, document_versions(package_versions))
+        cached = response_cache.lookup(request, etag)
+        if cached:
+            return cached
+        
         # Get provider packages
         cursor = db.provider_packages.find({"provider_id": provider_id})
         packages = await cursor.to_list(length=100)
@@ -1280,9 +1598,9 @@ async def get_provider_packages_by_id(provider_id: str):
             if "eventTypes" in formatted_package and isinstance(formatted_package["eventTypes"], list):
                 formatted_package["eventType"] = formatted_package["eventTypes"][0] if formatted_package["eventTypes"] else ""
             
-            formatted_packages.append(formatted_package)
+            formatted_packages.append(select_images(with_image_variants(formatted_package), imageSize))
         
-        return formatted_packages
+        return response_cache.store(request, etag, formatted_packages, tags)
     
     except (ValueError, InvalidId):
         raise HTTPException(
@@ -1302,7 +1620,7 @@ async def get_provider_booked_dates(provider_id: str):
             "_id": ObjectId(provider_id),
             "role": "service_provider",
             "approval_status": "approved"
-        })
+        }, EXISTS_PROJECTION)
         
         if not provider:
             raise HTTPException(
@@ -1314,7 +1632,7 @@ async def get_provider_booked_dates(provider_id: str):
         cursor = db.bookings.find({
             "providerId": provider_id,
             "status": {"$in": ["pending", "confirmed"]}
-        })
+        }, BOOKING_DATES_PROJECTION)
         bookings = await cursor.to_list(length=100)
         
         # Extract event dates
@@ -1335,89 +1653,6 @@ async def get_provider_booked_dates(provider_id: str):
         )
 
 
-@router.get("/packages/available", response_model=list)
-async def get_all_available_packages(
-    eventType: Optional[str] = None,
-    minPrice: Optional[int] = None,
-    maxPrice: Optional[int] = None,
-    crowdSize: Optional[int] = None,
-    serviceType: Optional[str] = None,
-):
-    """Get all available packages with optional filtering"""
-    db = await get_database()
-    
-    # Base query
-    query = {"status": "active"}
-    
-    # Apply filters
-    if eventType:
-        query["eventTypes"] = {"$in": [eventType]}
-    
-    if minPrice is not None:
-        query["price"] = query.get("price", {})
-        query["price"]["$gte"] = minPrice
-    
-    if maxPrice is not None:
-        query["price"] = query.get("price", {})
-        query["price"]["$lte"] = maxPrice
-    
-    if crowdSize is not None:
-        query["$and"] = [
-            {"crowdSizeMin": {"$lte": crowdSize}},
-            {"crowdSizeMax": {"$gte": crowdSize}}
-        ]
-    
-    # Get approved service provider IDs for packages filtering
-    approved_providers_cursor = db.users.find(
-        {"role": "service_provider", "approval_status": "approved"},
-        {"_id": 1}
-    )
-    approved_provider_ids = [str(p["_id"]) for p in await approved_providers_cursor.to_list(length=None)]
-    
-    # Only include packages from approved providers
-    query["provider_id"] = {"$in": approved_provider_ids}
-    
-    # If service type is provided, find matching providers first
-    if serviceType:
-        provider_profiles_cursor = db.service_provider_profiles.find(
-            {"service_types": {"$regex": serviceType, "$options": "i"}},
-            {"user_id": 1}
-        )
-        matching_provider_ids = [p["user_id"] for p in await provider_profiles_cursor.to_list(length=None)]
-        
-        # Update query to only include packages from these providers
-        query["provider_id"] = {"$in": matching_provider_ids}
-    
-    # Get packages with the query
-    packages_cursor = db.provider_packages.find(query)
-    packages = await packages_cursor.to_list(length=None)
-    
-    # For each package, get provider info and format response
-    result = []
-    
-    for package in packages:
-        # Convert ObjectId to string
-        package["id"] = str(package.pop("_id"))
-        
-        # Get provider info
-        provider = await db.users.find_one({"_id": ObjectId(package["provider_id"])})
-        if provider:
-            provider_profile = await db.service_provider_profiles.find_one({"user_id": str(provider["_id"])})
-            
-            provider_info = {
-                "id": str(provider["_id"]),
-                "name": provider.get("name", ""),
-                "role": provider.get("role", ""),
-                "businessName": provider_profile.get("business_name") if provider_profile else "",
-                "profileImage": provider_profile.get("profile_picture_url") if provider_profile else None,
-            }
-            
-            package["providerInfo"] = provider_info
-        
-        result.append(package)
-    
-    return result
-
 @router.get("/dashboard-stats", response_model=dict)
 async def get_provider_dashboard_stats(current_user: UserInDB = Depends(get_current_user)):
     """Get provider dashboard statistics"""
@@ -1464,7 +1699,7 @@ async def get_provider_dashboard_stats(current_user: UserInDB = Depends(get_curr
         
         # Get recent bookings
         recent_bookings_cursor = db.bookings.find(
-            {"providerId": str(current_user.id)}
+            {"providerId": str(current_user.id)}, BOOKING_SUMMARY_PROJECTION
         ).sort("createdAt", -1).limit(5)
         
         recent_bookings = []
@@ -1472,12 +1707,12 @@ async def get_provider_dashboard_stats(current_user: UserInDB = Depends(get_curr
             # Get customer info
             customer = None
             if "userId" in booking:
-                customer = await db.users.find_one({"_id": ObjectId(booking["userId"])})
+                customer = await db.users.find_one({"_id": ObjectId(booking["userId"])}, USER_CONTACT_PROJECTION)
             
             # Get package info
             package_name = "Custom Package"
             if "packageId" in booking:
-                package = await db.provider_packages.find_one({"_id": ObjectId(booking["packageId"])})
+                package = await db.provider_packages.find_one({"_id": ObjectId(booking["packageId"])}, PACKAGE_NAME_PROJECTION)
                 if package:
                     package_name = package.get("name", "Custom Package")
             
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Body
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Request
 from typing import List, Optional
 from app.models.user import UserInDB
 from app.db.mongodb import get_database
+from app.db.analytics import record_review
+from app.db.projections import EXISTS_PROJECTION, USER_NAME_PROJECTION
 from app.api.deps import get_current_user
 from datetime import datetime
 from bson import ObjectId
 from app.models.review import ReviewCreate
+from app.utils.response_cache import response_cache, document_versions, reviews_tag
 
 router = APIRouter()
 
@@ -37,7 +40,7 @@ async def create_review(
     
     # Check if provider exists
     try:
-        provider = await db.users.find_one({"_id": ObjectId(serviceProviderId), "role": "service_provider"})
+        provider = await db.users.find_one({"_id": ObjectId(serviceProviderId), "role": "service_provider"}, EXISTS_PROJECTION)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -75,6 +78,8 @@ async def create_review(
     }
     
     result = await db.reviews.insert_one(new_review)
+    await record_review(db, rating, moment=new_review["date"])
+    response_cache.invalidate(reviews_tag(serviceProviderId))
     
     # Update the review with its ID
     new_review["id"] = str(result.inserted_id)
@@ -84,10 +89,20 @@ async def create_review(
     return new_review
 
 @router.get("/reviews/provider/{provider_id}", response_model=List[dict])
-async def get_provider_reviews(provider_id: str):
+async def get_provider_reviews(provider_id: str, request: Request):
     """Get all reviews for a specific service provider"""
     db = await get_database()
     
+    # Check validators against the review versions before loading full documents
+    versions = await db.reviews.find(
+        {"serviceProviderId": provider_id}, {"updated_at": 1, "date": 1}
+    ).to_list(length=100)
+    tags = [reviews_tag(provider_id)]
+    etag = response_cache.etag(tags, document_versions(versions, "updated_at", "date"))
+    cached = response_cache.lookup(request, etag)
+    if cached:
+        return cached
+    
     cursor = db.reviews.find({"serviceProviderId": provider_id})
     reviews = await cursor.to_list(length=100)
     
@@ -96,7 +111,7 @@ async def get_provider_reviews(provider_id: str):
         review["id"] = str(review["_id"])
         del review["_id"]
     
-    return reviews
+    return response_cache.store(request, etag, reviews, tags)
 
 @router.put("/reviews/{review_id}", status_code=status.HTTP_200_OK)
 async def update_review(
@@ -163,6 +178,9 @@ async def update_review(
             "updated_at": datetime.utcnow()
         }}
     )
+    response_cache.invalidate(reviews_tag(serviceProviderId))
+    if update_result.modified_count:
+        await record_review(db, rating, previous_rating=review.get("rating", 0), moment=review.get("date"))
     
     if update_result.modified_count == 0:
         raise HTTPException(
@@ -176,7 +194,7 @@ async def update_review(
     del updated_review["_id"]
     
     # Get provider name
-    provider = await db.users.find_one({"_id": ObjectId(updated_review["serviceProviderId"])})
+    provider = await db.users.find_one({"_id": ObjectId(updated_review["serviceProviderId"])}, USER_NAME_PROJECTION)
     if provider:
         updated_review["providerName"] = provider.get("name", "Unknown Provider")
     
@@ -230,8 +248,9 @@ async def reply_to_review(
     # Update the review with the response
     result = await db.reviews.update_one(
         {"_id": ObjectId(review_id)},
-        {"$set": {"response": response}}
+        {"$set": {"response": response, "updated_at": datetime.utcnow()}}
     )
+    response_cache.invalidate(reviews_tag(review["serviceProviderId"]))
     
     if result.modified_count == 0:
         raise HTTPException(
@@ -260,7 +279,7 @@ async def get_user_reviews(current_user: UserInDB = Depends(get_current_user)):
         del review["_id"]
         
         # Get provider name
-        provider = await db.users.find_one({"_id": ObjectId(review["serviceProviderId"])})
+        provider = await db.users.find_one({"_id": ObjectId(review["serviceProviderId"])}, USER_NAME_PROJECTION)
         if provider:
             review["providerName"] = provider.get("name", "Unknown Provider")
     
@@ -1,16 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form
 from datetime import datetime
-import cloudinary
-import cloudinary.uploader
-from app.core.config import settings
+from app.utils.storage import get_storage
 from typing import List
 from app.models.user import UserCreate, UserInDB, UserUpdate
 from app.core.security import get_password_hash
 from app.db.mongodb import get_database
+from app.db.projections import EXISTS_PROJECTION, USER_ACCOUNT_PROJECTION
 from bson.objectid import ObjectId
 from app.api.deps import get_current_user
 from app.schemas.auth import Token, TokenPayload
 from pydantic import EmailStr
+from app.db.catalogue import catalogue
+from app.utils.response_cache import response_cache, provider_tag
+from app.utils.search import search_fields
 
 router = APIRouter()
 
@@ -19,7 +21,7 @@ async def register_user(user: UserCreate):
     db = await get_database()
     
     # Check if email already exists
-    existing_user = await db.users.find_one({"email": user.email})
+    existing_user = await db.users.find_one({"email": user.email}, EXISTS_PROJECTION)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -27,7 +29,7 @@ async def register_user(user: UserCreate):
         )
         
     # Check if username already exists
-    existing_username = await db.users.find_one({"username": user.username})
+    existing_username = await db.users.find_one({"username": user.username}, EXISTS_PROJECTION)
     if existing_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,6 +40,8 @@ async def register_user(user: UserCreate):
     hashed_password = get_password_hash(user.password)
     new_user = user.dict()
     new_user["password"] = hashed_password
+    new_user["created_at"] = datetime.utcnow()
+    new_user.update(search_fields("users", new_user))
     
     # Insert user into database
     await db.users.insert_one(new_user)
@@ -64,6 +68,7 @@ async def update_user_info(
         )
     
     update_data["updated_at"] = datetime.utcnow()
+    update_data.update(search_fields("users", update_data))
     
     # Update user in database
     result = await db.users.update_one(
@@ -76,18 +81,16 @@ async def update_user_info(
             detail="User not found or no changes made"
         )
     
+    # Provider names are shown on catalogue packages
+    if current_user.role == "service_provider":
+        await catalogue.refresh_provider(db, str(current_user.id))
+        response_cache.invalidate(provider_tag(str(current_user.id)))
+    
     # Get updated user
-    updated_user = await db.users.find_one({"_id": current_user.id})
+    updated_user = await db.users.find_one({"_id": current_user.id}, USER_ACCOUNT_PROJECTION)
     
     return UserInDB(**updated_user)
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
-)
-
 @router.post("/users/update-profile-with-documents", response_model=UserInDB)
 async def update_user_profile_with_documents(
     username: str = Form(None),
@@ -109,7 +112,7 @@ async def update_user_profile_with_documents(
     # Add form fields if provided
     if username:
         # Check if username already exists for another user
-        existing_user = await db.users.find_one({"username": username, "_id": {"$ne": current_user.id}})
+        existing_user = await db.users.find_one({"username": username, "_id": {"$ne": current_user.id}}, EXISTS_PROJECTION)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -123,7 +126,7 @@ async def update_user_profile_with_documents(
         update_data["phone"] = phone
     if email:
         # Check if email already exists for another user
-        existing_user = await db.users.find_one({"email": email, "_id": {"$ne": current_user.id}})
+        existing_user = await db.users.find_one({"email": email, "_id": {"$ne": current_user.id}}, EXISTS_PROJECTION)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -139,30 +142,30 @@ async def update_user_profile_with_documents(
     try:
         # Upload profile image if provided
         if profile_image:
-            profile_result = cloudinary.uploader.upload(
+            profile_result = await get_storage().upload(
                 profile_image.file,
                 folder="eventhub/profile_images",
                 public_id=f"profile_{current_user.id}_{datetime.now().timestamp()}"
             )
-            update_data["profile_image"] = profile_result["secure_url"]
+            update_data["profile_image"] = profile_result["url"]
         
         # Upload NIC front image if provided
         if nic_front_image:
-            nic_front_result = cloudinary.uploader.upload(
+            nic_front_result = await get_storage().upload(
                 nic_front_image.file,
                 folder="eventhub/nic_images",
                 public_id=f"nic_front_{current_user.id}_{datetime.now().timestamp()}"
             )
-            update_data["nic_front_image"] = nic_front_result["secure_url"]
+            update_data["nic_front_image"] = nic_front_result["url"]
         
         # Upload NIC back image if provided
         if nic_back_image:
-            nic_back_result = cloudinary.uploader.upload(
+            nic_back_result = await get_storage().upload(
                 nic_back_image.file,
                 folder="eventhub/nic_images",
                 public_id=f"nic_back_{current_user.id}_{datetime.now().timestamp()}"
             )
-            update_data["nic_back_image"] = nic_back_result["secure_url"]
+            update_data["nic_back_image"] = nic_back_result["url"]
     
     except Exception as e:
         raise HTTPException(
@@ -172,6 +175,7 @@ async def update_user_profile_with_documents(
     
     # Add updated timestamp
     update_data["updated_at"] = datetime.utcnow()
+    update_data.update(search_fields("users", update_data))
     
     if not update_data:
         raise HTTPException(
@@ -191,14 +195,10 @@ async def update_user_profile_with_documents(
         )
     
     # Get updated user
-    updated_user = await db.users.find_one({"_id": current_user.id})
+    updated_user = await db.users.find_one({"_id": current_user.id}, USER_ACCOUNT_PROJECTION)
     
     # Convert _id to string
     updated_user["id"] = str(updated_user["_id"])
     del updated_user["_id"]
     
-    # Remove password hash
-    if "password" in updated_user:
-        del updated_user["password"]
-    
     return updated_user
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # MongoDB settings
@@ -16,10 +16,28 @@ class Settings(BaseSettings):
     # API settings
     API_V1_STR: str = "/api"
     
-    # Cloudinary settings
-    CLOUDINARY_CLOUD_NAME: str
-    CLOUDINARY_API_KEY: str
-    CLOUDINARY_API_SECRET: str
+    # Media storage backend: "cloudinary", "local" (served by the app) or "memory" (tests, benchmarks)
+    STORAGE_BACKEND: str = "cloudinary"
+    # Public URL the local backend's files are served under
+    LOCAL_STORAGE_URL: str = "http://localhost:8000/media"
+    
+    # Cloudinary settings (only needed by the cloudinary backend)
+    CLOUDINARY_CLOUD_NAME: Optional[str] = None
+    CLOUDINARY_API_KEY: Optional[str] = None
+    CLOUDINARY_API_SECRET: Optional[str] = None
+    
+    # Local file uploads (bytes); a quota of 0 disables the per-user limit
+    MAX_UPLOAD_SIZE: int = 100 * 1024 * 1024
+    USER_STORAGE_QUOTA: int = 1024 * 1024 * 1024
+    # Resumable uploads are meant for large media, so they get their own cap
+    MAX_RESUMABLE_UPLOAD_SIZE: int = 2 * 1024 * 1024 * 1024
+    # Per-user cloud storage quota (bytes, originals only); 0 disables it
+    CLOUD_STORAGE_QUOTA: int = 5 * 1024 * 1024 * 1024
+    # Image variants: output formats (skipped when Pillow can't write them) and worker processes (0 = one per CPU)
+    IMAGE_VARIANT_FORMATS: List[str] = ["webp", "avif"]
+    IMAGE_WORKERS: int = 0
+    # Lifetime of signed download links (seconds)
+    SIGNED_URL_EXPIRE_SECONDS: int = 3600
     
     # Email settings (new)
     SMTP_SERVER: str = "smtp.gmail.com"
@@ -1,3 +1,6 @@
+import hashlib
+import hmac
+import time
 from datetime import datetime, timedelta
 from typing import Any, Union
 from jose import jwt
@@ -23,4 +26,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def create_download_signature(file_id: str, expires: int) -> str:
+    """HMAC over the file id and expiry (unix seconds) authorizing a download without a login"""
+    message = f"download:{file_id}:{expires}".encode("utf-8")
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+def verify_download_signature(file_id: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(create_download_signature(file_id, expires), signature)
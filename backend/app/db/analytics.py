@@ -0,0 +1,245 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+# One document per UTC day: {"_id": "YYYY-MM-DD", "bookings": {...}, "providers": {...}, ...}
+ANALYTICS_COLLECTION = "analytics_daily"
+TOP_N = 10
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+# Days the nightly job re-derives from the source collections (covers missed nights)
+COMPACTION_LOOKBACK_DAYS = 7
+COMPACTION_HOUR_UTC = 2
+# Upper bound on the days backfilled when the analytics collection starts out empty
+BACKFILL_MAX_DAYS = 365
+
+
+def day_key(moment: Optional[datetime] = None) -> str:
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+def _field_key(value) -> str:
+    # Map keys can't contain "." or start with "$"
+    return str(value or "unknown").replace(".", "_").replace("$", "_")
+
+
+async def _increment(db, moment: Optional[datetime], counters: Dict[str, float]):
+    """Add counters to the day document for `moment` (created on first write)"""
+    counters = {field: value for field, value in counters.items() if value}
+    if not counters:
+        return
+    # Counters are best effort (the nightly compaction corrects them), so never fail the caller's write
+    try:
+        await db[ANALYTICS_COLLECTION].update_one({"_id": day_key(moment)}, {"$inc": counters}, upsert=True)
+    except Exception as e:
+        print(f"Error updating analytics counters: {str(e)}")
+
+
+async def record_booking_created(db, booking: dict):
+    amount = booking.get("totalAmount") or 0
+    provider = _field_key(booking.get("providerId"))
+    event_type = _field_key(booking.get("eventType"))
+    # The advance payment is taken together with the booking
+    payments = booking.get("payments") or []
+    await _increment(db, booking.get("createdAt"), {
+        "bookings.created": 1,
+        "bookings.gmv": amount,
+        "payments.count": len(payments),
+        "payments.amount": sum(payment.get("amount") or 0 for payment in payments),
+        f"providers.{provider}.bookings": 1,
+        f"providers.{provider}.gmv": amount,
+        f"event_types.{event_type}": 1
+    })
+
+
+async def record_booking_confirmed(db, count: int = 1, moment: Optional[datetime] = None):
+    await _increment(db, moment, {"bookings.confirmed": count})
+
+
+async def record_booking_cancelled(db, moment: Optional[datetime] = None):
+    await _increment(db, moment, {"bookings.cancelled": 1})
+
+
+async def record_payment(db, amount: float, moment: Optional[datetime] = None):
+    await _increment(db, moment, {"payments.count": 1, "payments.amount": amount or 0})
+
+
+async def record_review(db, rating: int, previous_rating: Optional[int] = None, moment: Optional[datetime] = None):
+    """Count a new review, or just the rating change of an edited one"""
+    if previous_rating is None:
+        await _increment(db, moment, {"reviews.created": 1, "reviews.rating_sum": rating})
+    else:
+        await _increment(db, moment, {"reviews.rating_sum": rating - previous_rating})
+
+
+def _day_range(day: str):
+    start = datetime.combine(date.fromisoformat(day), time.min)
+    return start, start + timedelta(days=1)
+
+
+async def compact_day(db, day: str) -> dict:
+    """Re-derive one day's counters from bookings and reviews and replace the incremental document.
+
+    Incremental counters can drift (failed writes, manual fixes, bookings edited
+    outside the API); this makes every compacted day exact. Each query is a
+    range scan over a single day.
+    """
+    start, end = _day_range(day)
+    in_day = {"$gte": start, "$lt": end}
+
+    created = await db.bookings.aggregate([
+        {"$match": {"createdAt": in_day}},
+        {"$group": {
+            "_id": {"provider": "$providerId", "event_type": "$eventType"},
+            "count": {"$sum": 1},
+            "gmv": {"$sum": {"$ifNull": ["$totalAmount", 0]}}
+        }}
+    ]).to_list(length=None)
+
+    providers: Dict[str, Dict[str, float]] = {}
+    event_types: Counter = Counter()
+    for group in created:
+        provider = providers.setdefault(_field_key(group["_id"].get("provider")), {"bookings": 0, "gmv": 0})
+        provider["bookings"] += group["count"]
+        provider["gmv"] += group["gmv"]
+        event_types[_field_key(group["_id"].get("event_type"))] += group["count"]
+
+    confirmed = await db.bookings.count_documents({"confirmedAt": in_day})
+    cancelled = await db.bookings.count_documents({"cancelledAt": in_day})
+
+    payments = await db.bookings.aggregate([
+        {"$match": {"payments.date": in_day}},
+        {"$unwind": "$payments"},
+        {"$match": {"payments.date": in_day}},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "amount": {"$sum": {"$ifNull": ["$payments.amount", 0]}}}}
+    ]).to_list(length=1)
+
+    reviews = await db.reviews.aggregate([
+        {"$match": {"date": in_day}},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "rating_sum": {"$sum": "$rating"}}}
+    ]).to_list(length=1)
+
+    document = {
+        "_id": day,
+        "bookings": {
+            "created": sum(group["count"] for group in created),
+            "gmv": sum(group["gmv"] for group in created),
+            "confirmed": confirmed,
+            "cancelled": cancelled
+        },
+        "payments": {
+            "count": payments[0]["count"] if payments else 0,
+            "amount": payments[0]["amount"] if payments else 0
+        },
+        "reviews": {
+            "created": reviews[0]["count"] if reviews else 0,
+            "rating_sum": reviews[0]["rating_sum"] if reviews else 0
+        },
+        "providers": providers,
+        "event_types": dict(event_types),
+        "compacted_at": datetime.utcnow()
+    }
+    await db[ANALYTICS_COLLECTION].replace_one({"_id": day}, document, upsert=True)
+    return document
+
+
+async def compact_recent_days(db, days: int = COMPACTION_LOOKBACK_DAYS, today: Optional[date] = None):
+    """Compact the last `days` complete days"""
+    today = today or datetime.utcnow().date()
+    for offset in range(days, 0, -1):
+        await compact_day(db, (today - timedelta(days=offset)).isoformat())
+
+
+async def backfill(db):
+    """Derive counters for historical days the first time analytics runs"""
+    if await db[ANALYTICS_COLLECTION].estimated_document_count():
+        return
+    first = await db.bookings.find({"createdAt": {"$type": "date"}}, {"createdAt": 1}).sort("createdAt", 1).limit(1).to_list(length=1)
+    if not first:
+        return
+    days = min((datetime.utcnow() - first[0]["createdAt"]).days + 1, BACKFILL_MAX_DAYS)
+    print(f"Backfilling {days} days of analytics")
+    await compact_recent_days(db, days)
+    # Today stays incremental until tonight's compaction
+    await compact_day(db, day_key())
+
+
+def seconds_until_hour(now: datetime, hour: int) -> float:
+    """Seconds until the next run of a nightly job scheduled at hour (UTC)"""
+    run_at = datetime.combine(now.date(), time(hour=hour))
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+async def run_compaction_job(db):
+    """Nightly loop re-deriving recent daily counters from the source collections"""
+    try:
+        await backfill(db)
+    except Exception as e:
+        print(f"Error backfilling analytics: {str(e)}")
+
+    while True:
+        await asyncio.sleep(seconds_until_hour(datetime.utcnow(), COMPACTION_HOUR_UTC))
+        try:
+            await compact_recent_days(db)
+            print("Compacted analytics counters")
+        except Exception as e:
+            print(f"Error in analytics compaction job: {str(e)}")
+
+
+def summarize(days: List[dict], start: date, end: date) -> dict:
+    """Fold daily documents into the KPIs served by GET /admin/analytics"""
+    by_day = {document["_id"]: document for document in days}
+    totals: Counter = Counter()
+    providers: Dict[str, Counter] = {}
+    event_types: Counter = Counter()
+    series = []
+
+    current = start
+    while current <= end:
+        document = by_day.get(current.isoformat(), {})
+        bookings = document.get("bookings", {})
+        for section in ("bookings", "payments", "reviews"):
+            for field, value in document.get(section, {}).items():
+                totals[f"{section}.{field}"] += value
+        for provider_id, counters in document.get("providers", {}).items():
+            providers.setdefault(provider_id, Counter()).update(counters)
+        event_types.update(document.get("event_types", {}))
+        series.append({
+            "date": current.isoformat(),
+            "bookings": bookings.get("created", 0),
+            "gmv": bookings.get("gmv", 0),
+            "confirmed": bookings.get("confirmed", 0),
+            "cancelled": bookings.get("cancelled", 0)
+        })
+        current += timedelta(days=1)
+
+    created = totals["bookings.created"]
+    reviews = totals["reviews.created"]
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "gmv": totals["bookings.gmv"],
+        "bookings": created,
+        "confirmed": totals["bookings.confirmed"],
+        "cancelled": totals["bookings.cancelled"],
+        "conversionRate": round(totals["bookings.confirmed"] / created, 4) if created else 0,
+        "cancellationRate": round(totals["bookings.cancelled"] / created, 4) if created else 0,
+        "payments": {"count": totals["payments.count"], "amount": totals["payments.amount"]},
+        "reviews": {
+            "count": reviews,
+            "averageRating": round(totals["reviews.rating_sum"] / reviews, 2) if reviews else 0
+        },
+        "bookingsPerDay": series,
+        "topProviders": [
+            {"providerId": provider_id, "bookings": counters.get("bookings", 0), "gmv": counters.get("gmv", 0)}
+            for provider_id, counters in sorted(
+                providers.items(), key=lambda item: (item[1].get("gmv", 0), item[1].get("bookings", 0)), reverse=True
+            )[:TOP_N]
+        ],
+        "topEventTypes": [
+            {"eventType": event_type, "bookings": count} for event_type, count in event_types.most_common(TOP_N)
+        ]
+    }
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from app.db.analytics import record_booking_confirmed
+from app.db.projections import PACKAGE_NAME_PROJECTION, include
+
+# Pending bookings the provider hasn't answered within this window are confirmed automatically
+AUTO_ACCEPT_AFTER = timedelta(hours=12)
+AUTO_ACCEPT_INTERVAL_SECONDS = 5 * 60
+# Bookings transitioned per update_many (bounds the size of each write and its notifications)
+AUTO_ACCEPT_BATCH_SIZE = 500
+
+AUTO_ACCEPT_PROJECTION = include("userId", "providerId", "packageId", "eventDate")
+
+
+async def _package_names(db, bookings: List[dict]) -> Dict[str, str]:
+    """Names of the packages referenced by a batch of bookings, in one query"""
+    package_ids = {b.get("packageId") for b in bookings if ObjectId.is_valid(b.get("packageId") or "")}
+    if not package_ids:
+        return {}
+    packages = await db.provider_packages.find(
+        {"_id": {"$in": [ObjectId(package_id) for package_id in package_ids]}}, PACKAGE_NAME_PROJECTION
+    ).to_list(length=None)
+    return {str(package["_id"]): package.get("name", "your service") for package in packages}
+
+
+def _auto_accept_notifications(booking: dict, package_name: str, now: datetime) -> List[dict]:
+    """Tell both sides that a booking was confirmed without a provider response"""
+    event_date = booking.get("eventDate")
+    when = f" on {event_date.strftime('%B %d, %Y')}" if isinstance(event_date, datetime) else ""
+    common = {
+        "type": "booking",
+        "reference_id": str(booking["_id"]),
+        "reference_type": "booking",
+        "is_read": False,
+        "created_at": now
+    }
+
+    notifications = []
+    if booking.get("userId"):
+        notifications.append({
+            **common,
+            "recipient_id": booking["userId"],
+            "title": "Booking Confirmed",
+            "message": f"Your booking for {package_name}{when} has been confirmed automatically"
+        })
+    if booking.get("providerId"):
+        notifications.append({
+            **common,
+            "recipient_id": booking["providerId"],
+            "title": "Booking Auto-Accepted",
+            "message": f"A booking for {package_name}{when} was accepted automatically after {int(AUTO_ACCEPT_AFTER.total_seconds() // 3600)} hours without a response"
+        })
+    return notifications
+
+
+async def auto_accept_pending_bookings(db, now: Optional[datetime] = None) -> int:
+    """Confirm pending bookings older than AUTO_ACCEPT_AFTER in batches; returns how many were confirmed.
+
+    Candidates come from the (status, createdAt) index oldest first. Each batch is
+    confirmed with an update_many that re-checks status, so a booking cancelled
+    or paid in the meantime is left alone and gets no notification.
+    """
+    now = now or datetime.utcnow()
+    # BSON dates keep milliseconds, so truncate to match the stored autoAcceptedAt exactly
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    cutoff = now - AUTO_ACCEPT_AFTER
+    confirmed = 0
+
+    while True:
+        batch = await db.bookings.find(
+            {"status": "pending", "createdAt": {"$lt": cutoff}}, AUTO_ACCEPT_PROJECTION
+        ).sort("createdAt", 1).limit(AUTO_ACCEPT_BATCH_SIZE).to_list(length=AUTO_ACCEPT_BATCH_SIZE)
+        if not batch:
+            break
+
+        ids = [booking["_id"] for booking in batch]
+        await db.bookings.update_many(
+            {"_id": {"$in": ids}, "status": "pending"},
+            {"$set": {"status": "confirmed", "autoAcceptedAt": now, "confirmedAt": now, "updatedAt": now}, "$inc": {"version": 1}}
+        )
+
+        # Only the bookings this run actually transitioned are notified
+        accepted = {
+            booking["_id"] for booking in await db.bookings.find(
+                {"_id": {"$in": ids}, "autoAcceptedAt": now}, {"_id": 1}
+            ).to_list(length=None)
+        }
+        accepted_bookings = [booking for booking in batch if booking["_id"] in accepted]
+
+        package_names = await _package_names(db, accepted_bookings)
+        notifications = [
+            notification
+            for booking in accepted_bookings
+            for notification in _auto_accept_notifications(
+                booking, package_names.get(booking.get("packageId"), "your service"), now
+            )
+        ]
+        if notifications:
+            await db.notifications.insert_many(notifications, ordered=False)
+        await record_booking_confirmed(db, len(accepted_bookings), now)
+
+        confirmed += len(accepted_bookings)
+        if len(batch) < AUTO_ACCEPT_BATCH_SIZE:
+            break
+
+    return confirmed
+
+
+async def run_auto_accept_job(db, interval_seconds: int = AUTO_ACCEPT_INTERVAL_SECONDS):
+    """Background loop confirming stale pending bookings every interval"""
+    while True:
+        try:
+            confirmed = await auto_accept_pending_bookings(db)
+            if confirmed:
+                print(f"Auto-accepted {confirmed} pending bookings")
+        except Exception as e:
+            print(f"Error in booking auto-accept job: {str(e)}")
+        await asyncio.sleep(interval_seconds)
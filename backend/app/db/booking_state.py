@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+
+from app.db.analytics import record_booking_cancelled, record_booking_confirmed, record_payment
+from app.db.projections import BOOKING_STATE_PROJECTION
+
+# Customers and providers may cancel within this window after the booking was made
+CANCEL_WINDOW = timedelta(hours=12)
+
+# Statuses each action may start from
+TRANSITIONS = {
+    "cancel": ("pending", "confirmed"),
+    "pay": ("pending", "confirmed"),
+    "mark_paid": ("pending", "confirmed"),
+}
+
+# Error details when a booking is in a status the action can't start from
+STATUS_ERRORS = {
+    "cancel": "Cannot cancel booking with status: {status}",
+    "pay": "Cannot make payment for booking with status: {status}",
+    "mark_paid": "Cannot mark booking with status {status} as paid",
+}
+
+
+def _bump_version() -> dict:
+    # Bookings created before versioning count as version 0
+    return {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+
+
+def _version_filter(expected_version: Optional[int]) -> dict:
+    if expected_version is None:
+        return {}
+    if expected_version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": expected_version}
+
+
+def _confirmed_at(now: datetime, becomes_confirmed) -> dict:
+    # Stamped only when this transition is the one that confirms the booking
+    return {"$cond": [{"$and": [becomes_confirmed, {"$ne": ["$status", "confirmed"]}]}, now, "$confirmedAt"]}
+
+
+def _cancel(now: datetime, params: dict) -> list:
+    return [{"$set": {"status": "cancelled", "cancelledAt": now, "updatedAt": now, "version": _bump_version()}}]
+
+
+def _pay(now: datetime, params: dict) -> list:
+    # remainingAmount is recomputed from the stored value, never from an earlier read
+    payment = {
+        "amount": params["amount"],
+        "method": params["method"],
+        "date": now,
+        "status": "completed",
+        "type": "balance"
+    }
+    return [
+        {"$set": {
+            "remainingAmount": {"$subtract": [{"$ifNull": ["$remainingAmount", 0]}, {"$literal": payment["amount"]}]},
+            "payments": {"$concatArrays": [{"$ifNull": ["$payments", []]}, [{"$literal": payment}]]}
+        }},
+        {"$set": {
+            "status": {"$cond": [{"$lte": ["$remainingAmount", 0]}, "confirmed", "$status"]},
+            "confirmedAt": _confirmed_at(now, {"$lte": ["$remainingAmount", 0]}),
+            "remainingAmount": {"$max": ["$remainingAmount", 0]},
+            "updatedAt": now,
+            "version": _bump_version()
+        }}
+    ]
+
+
+def _mark_paid(now: datetime, params: dict) -> list:
+    # Settle whatever is still owed with a provider-recorded payment; fully paid bookings only get a version bump
+    outstanding = {"$gt": [{"$ifNull": ["$remainingAmount", 0]}, 0]}
+    payment = {
+        "amount": "$remainingAmount",
+        "method": {"$literal": "marked_by_provider"},
+        "date": now,
+        "status": {"$literal": "completed"},
+        "type": {"$literal": "balance"}
+    }
+    return [
+        {"$set": {
+            "payments": {"$cond": [
+                outstanding,
+                {"$concatArrays": [{"$ifNull": ["$payments", []]}, [payment]]},
+                "$payments"
+            ]},
+            "status": {"$cond": [outstanding, "confirmed", "$status"]},
+            "confirmedAt": _confirmed_at(now, outstanding),
+            "updatedAt": {"$cond": [outstanding, now, "$updatedAt"]}
+        }},
+        {"$set": {"remainingAmount": {"$cond": [outstanding, 0, "$remainingAmount"]}, "version": _bump_version()}}
+    ]
+
+
+UPDATES = {
+    "cancel": _cancel,
+    "pay": _pay,
+    "mark_paid": _mark_paid,
+}
+
+
+async def transition_booking(
+    db,
+    booking_id: str,
+    action: str,
+    owner: Dict[str, str],
+    expected_version: Optional[int] = None,
+    **params
+) -> dict:
+    """Apply a status transition atomically and return the updated booking.
+
+    The allowed source statuses, the cancellation window and (when given) the
+    client's expected version are all part of the find_one_and_update filter,
+    and the update is a pipeline computed from the stored document. Concurrent
+    transitions therefore can't interleave: at most one of them matches. The
+    booking is only read again when nothing matched, to report why.
+    `owner` scopes the booking to the caller, e.g. {"userId": ...}.
+    """
+    if not ObjectId.is_valid(booking_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found"
+        )
+
+    now = datetime.utcnow()
+    # BSON dates keep milliseconds, so truncate to compare with the stored timestamps exactly
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    query = {
+        "_id": ObjectId(booking_id),
+        **owner,
+        "status": {"$in": list(TRANSITIONS[action])},
+        **_version_filter(expected_version)
+    }
+    if action == "cancel":
+        # Bookings without createdAt predate the field and were always cancellable
+        query["$or"] = [{"createdAt": {"$gte": now - CANCEL_WINDOW}}, {"createdAt": {"$exists": False}}]
+
+    booking = await db.bookings.find_one_and_update(
+        query, UPDATES[action](now, params), return_document=ReturnDocument.AFTER
+    )
+    if booking:
+        await _record_transition(db, booking, action, now)
+        return booking
+
+    await _raise_rejection(db, booking_id, action, owner, now)
+
+
+async def _record_transition(db, booking: dict, action: str, now: datetime):
+    """Update the daily analytics counters for a transition that was applied"""
+    if action == "cancel":
+        await record_booking_cancelled(db, now)
+        return
+    payments = booking.get("payments") or []
+    if payments and payments[-1].get("date") == now:
+        await record_payment(db, payments[-1].get("amount"), now)
+    if booking.get("confirmedAt") == now:
+        await record_booking_confirmed(db, 1, now)
+
+
+async def _raise_rejection(db, booking_id: str, action: str, owner: Dict[str, str], now: datetime):
+    """Explain why a transition matched no booking"""
+    booking = await db.bookings.find_one({"_id": ObjectId(booking_id), **owner}, BOOKING_STATE_PROJECTION)
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found"
+        )
+
+    created_at = booking.get("createdAt")
+    if action == "cancel" and created_at and now - created_at > CANCEL_WINDOW:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Booking can only be cancelled within 12 hours of creation"
+        )
+
+    if booking.get("status") not in TRANSITIONS[action]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=STATUS_ERRORS[action].format(status=booking.get("status"))
+        )
+
+    # Either the client's version is stale or another transition won the race
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Booking was modified concurrently (current version {booking.get('version', 0)}), please reload and retry"
+    )
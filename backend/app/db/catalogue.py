@@ -0,0 +1,521 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.db.projections import PROFILE_PROJECTION, USER_PROJECTION
+from app.utils.catalogue_arrays import PackageColumns
+from app.utils.images import variant_url, with_image_variants
+from app.utils.service_types import normalize_service_type
+
+WATCHED_COLLECTIONS = ["users", "service_provider_profiles", "provider_packages"]
+# Width of the price buckets used by the secondary price index (LKR)
+PRICE_BUCKET_SIZE = 10000
+# Polling fallback for standalone mongod (no change streams)
+POLL_INTERVAL_SECONDS = 15
+FULL_REBUILD_INTERVAL = timedelta(minutes=5)
+# Seconds to wait before reopening a change stream after a transient error
+WATCH_RETRY_SECONDS = 5
+# How long the server waits for more events, which bounds the latency of batching them
+WATCH_MAX_AWAIT_MS = 200
+WATCH_MAX_BATCH = 1000
+# Error code MongoDB returns when change streams are not supported (standalone server)
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+APPROVED_PROVIDER_QUERY = {"role": "service_provider", "approval_status": "approved"}
+
+
+def _with_id(document: dict) -> dict:
+    """Copy a MongoDB document, replacing _id with its string id"""
+    document = dict(document)
+    document["id"] = str(document.pop("_id"))
+    return document
+
+
+def _is_approved_provider(user: Optional[dict]) -> bool:
+    return bool(user) and user.get("role") == "service_provider" and user.get("approval_status") == "approved"
+
+
+def _is_active_package(package: Optional[dict]) -> bool:
+    return bool(package) and package.get("status") == "active"
+
+
+def package_view(package: dict, provider: dict, profile: Optional[dict]) -> dict:
+    """Package as served by the public catalogue endpoints, with providerInfo attached"""
+    service_type = package.get("serviceType", "")
+    view = with_image_variants(package)
+    view["providerInfo"] = {
+        "id": provider["id"],
+        "name": provider.get("name", ""),
+        "role": provider.get("role", ""),
+        "businessName": profile.get("business_name") if profile else "",
+        "profileImage": variant_url(
+            profile.get("profile_picture_variants"), "thumbnail", profile.get("profile_picture_url")
+        ) if profile else None,
+        "serviceType": service_type
+    }
+    view["serviceType"] = service_type
+    return view
+
+
+def price_bucket(price) -> int:
+    return int((price or 0) // PRICE_BUCKET_SIZE)
+
+
+def _package_index_keys(view: dict) -> Dict[str, List]:
+    """Secondary index keys of a package view"""
+    service_type = view.get("serviceTypeKey") or normalize_service_type(view.get("serviceType", "") or "")
+    return {
+        "event_type": list(view.get("eventTypes", []) or []),
+        "service_type": [service_type] if service_type else [],
+        "price_bucket": [price_bucket(view.get("price"))],
+        "provider": [view.get("provider_id")]
+    }
+
+
+def _patch_index(index: Dict, removed: Dict, added: Dict) -> Dict:
+    """Copy-on-write update of a key -> frozenset(ids) index"""
+    if not removed and not added:
+        return index
+
+    patched = dict(index)
+    for key in set(removed) | set(added):
+        ids = (set(index.get(key, ())) - removed.get(key, set())) | added.get(key, set())
+        if ids:
+            patched[key] = frozenset(ids)
+        else:
+            patched.pop(key, None)
+    return patched
+
+
+class CatalogueSnapshot:
+    """Immutable, read-optimized view of the public catalogue.
+
+    Holds approved providers (keyed by user id), their profiles, and the active
+    packages of approved providers already shaped for the API, plus secondary
+    indexes by event type, service type, price bucket and provider. A snapshot is
+    never modified after it is published: updates build a new snapshot that
+    shares unchanged entries with the previous one, so a request that grabs
+    `catalogue.snapshot` once sees a consistent catalogue throughout.
+
+    Documents inside a snapshot are shared between requests and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, dict],
+        profiles: Dict[str, dict],
+        packages: Dict[str, dict],
+        indexes: Dict[str, Dict],
+        providers_by_service_type: Dict[str, FrozenSet[str]],
+        version: int = 0
+    ):
+        self.providers = providers
+        self.profiles = profiles
+        self.packages = packages
+        self.indexes = indexes
+        self.providers_by_service_type = providers_by_service_type
+        self.version = version
+        self.built_at = datetime.utcnow()
+        self._columns: Optional[PackageColumns] = None
+        self._package_list: Optional[List[dict]] = None
+
+    @classmethod
+    def empty(cls) -> "CatalogueSnapshot":
+        return cls({}, {}, {}, {name: {} for name in ("event_type", "service_type", "price_bucket", "provider")}, {})
+
+    def with_changes(
+        self,
+        providers: Dict[str, Optional[dict]],
+        profiles: Dict[str, Optional[dict]],
+        packages: Dict[str, Optional[dict]]
+    ) -> "CatalogueSnapshot":
+        """Build the next snapshot; a None value removes the entry"""
+        new_providers = dict(self.providers) if providers else self.providers
+        for provider_id, provider in providers.items():
+            if provider is None:
+                new_providers.pop(provider_id, None)
+            else:
+                new_providers[provider_id] = provider
+
+        new_profiles = dict(self.profiles) if profiles else self.profiles
+        removed_types: Dict[str, Set[str]] = {}
+        added_types: Dict[str, Set[str]] = {}
+        for user_id, profile in profiles.items():
+            old = self.profiles.get(user_id)
+            for key in (old or {}).get("service_type_list", []) or []:
+                removed_types.setdefault(key, set()).add(user_id)
+            if profile is None:
+                new_profiles.pop(user_id, None)
+                continue
+            new_profiles[user_id] = profile
+            for key in profile.get("service_type_list", []) or []:
+                added_types.setdefault(key, set()).add(user_id)
+
+        new_packages = dict(self.packages) if packages else self.packages
+        removed: Dict[str, Dict] = {name: {} for name in self.indexes}
+        added: Dict[str, Dict] = {name: {} for name in self.indexes}
+        for package_id, view in packages.items():
+            old = self.packages.get(package_id)
+            if old is not None:
+                for name, keys in _package_index_keys(old).items():
+                    for key in keys:
+                        removed[name].setdefault(key, set()).add(package_id)
+            if view is None:
+                new_packages.pop(package_id, None)
+                continue
+            new_packages[package_id] = view
+            for name, keys in _package_index_keys(view).items():
+                for key in keys:
+                    added[name].setdefault(key, set()).add(package_id)
+
+        return CatalogueSnapshot(
+            new_providers,
+            new_profiles,
+            new_packages,
+            {name: _patch_index(index, removed[name], added[name]) for name, index in self.indexes.items()},
+            _patch_index(self.providers_by_service_type, removed_types, added_types),
+            version=self.version + 1
+        )
+
+    @property
+    def package_list(self) -> List[dict]:
+        """All package views in a stable (creation) order"""
+        if self._package_list is None:
+            self._package_list = [self.packages[package_id] for package_id in sorted(self.packages)]
+        return self._package_list
+
+    @property
+    def columns(self) -> PackageColumns:
+        """Columnar view of every package, built once per snapshot for bundle search"""
+        if self._columns is None:
+            self._columns = PackageColumns(self.package_list)
+        return self._columns
+
+    def _lookup(self, index: str, keys: Iterable) -> Set[str]:
+        ids: Set[str] = set()
+        for key in keys:
+            ids |= self.indexes[index].get(key, frozenset())
+        return ids
+
+    def find_packages(
+        self,
+        event_type: Optional[str] = None,
+        service_type_keys: Optional[List[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        crowd_size: Optional[int] = None
+    ) -> List[dict]:
+        """Packages matching the /packages/available filters, narrowed through the secondary indexes"""
+        candidates: Optional[Set[str]] = None
+
+        def narrow(ids: Set[str]):
+            nonlocal candidates
+            candidates = ids if candidates is None else candidates & ids
+
+        if event_type:
+            narrow(self._lookup("event_type", [event_type]))
+        if service_type_keys:
+            narrow(self._lookup("service_type", service_type_keys))
+        if min_price is not None or max_price is not None:
+            low = price_bucket(min_price) if min_price is not None else None
+            high = price_bucket(max_price) if max_price is not None else None
+            narrow(self._lookup("price_bucket", [
+                bucket for bucket in self.indexes["price_bucket"]
+                if (low is None or bucket >= low) and (high is None or bucket <= high)
+            ]))
+
+        if candidates is None:
+            packages = self.package_list
+        else:
+            packages = [self.packages[package_id] for package_id in sorted(candidates)]
+
+        # Exact checks for the range filters the buckets only approximate
+        result = []
+        for package in packages:
+            price = package.get("price", 0)
+            if min_price is not None and price < min_price:
+                continue
+            if max_price is not None and price > max_price:
+                continue
+            if crowd_size is not None and not (
+                package.get("crowdSizeMin", 0) <= crowd_size <= package.get("crowdSizeMax", crowd_size)
+            ):
+                continue
+            result.append(package)
+
+        return result
+
+    def approved_providers(self, service_type_keys: Optional[List[str]] = None,
+                           provider_ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """Approved providers that have a profile, optionally filtered by service type or id"""
+        if provider_ids is not None:
+            ids = [provider_id for provider_id in provider_ids if provider_id in self.providers]
+        else:
+            ids = sorted(self.providers)
+
+        if service_type_keys:
+            matching = set()
+            for key in service_type_keys:
+                matching |= self.providers_by_service_type.get(key, frozenset())
+            ids = [provider_id for provider_id in ids if provider_id in matching]
+
+        return [self.providers[provider_id] for provider_id in ids if provider_id in self.profiles]
+
+
+class Catalogue:
+    """Keeps an in-process CatalogueSnapshot in sync with MongoDB.
+
+    The refresher follows a change stream on the catalogue collections and
+    publishes a new snapshot per batch of events. On a standalone mongod (no
+    change streams) it polls for recently updated documents instead, with a
+    periodic full rebuild to pick up deletes and writes that don't bump
+    updated_at; write routes call refresh_provider so their own changes show up
+    immediately.
+    """
+
+    def __init__(self):
+        self.snapshot = CatalogueSnapshot.empty()
+        self.ready = False
+        self.mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        # Source documents, owned by the refresher (guarded by _lock)
+        self._providers: Dict[str, dict] = {}
+        self._profiles: Dict[str, dict] = {}
+        self._profile_owner: Dict[str, str] = {}
+        self._packages: Dict[str, dict] = {}
+        self._packages_by_provider: Dict[str, Set[str]] = {}
+
+    async def start(self, db):
+        """Load the catalogue and start following changes in the background"""
+        try:
+            await self.rebuild(db)
+        except PyMongoError as e:
+            print(f"Error loading catalogue snapshot: {str(e)}")
+        self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def rebuild(self, db):
+        """Reload every catalogue document and publish a fresh snapshot"""
+        providers = await db.users.find(APPROVED_PROVIDER_QUERY, USER_PROJECTION).to_list(length=None)
+        profiles = await db.service_provider_profiles.find({}, PROFILE_PROJECTION).to_list(length=None)
+        packages = await db.provider_packages.find({"status": "active"}).to_list(length=None)
+
+        async with self._lock:
+            self._providers = {}
+            self._profiles = {}
+            self._profile_owner = {}
+            self._packages = {}
+            self._packages_by_provider = {}
+            self.snapshot = CatalogueSnapshot.empty()
+
+            self._apply(
+                {str(user["_id"]): user for user in providers},
+                {str(profile["_id"]): profile for profile in profiles},
+                {str(package["_id"]): package for package in packages}
+            )
+            self.ready = True
+
+        print(f"Catalogue snapshot v{self.snapshot.version}: {len(self.snapshot.providers)} providers, {len(self.snapshot.packages)} packages")
+
+    async def refresh_provider(self, db, provider_id: str):
+        """Re-read one provider, their profile and their packages (used after local writes)"""
+        await self.refresh_providers(db, [provider_id])
+
+    async def refresh_providers(self, db, provider_ids: List[str]):
+        """Re-read several providers with one query per collection and publish a single snapshot"""
+        provider_ids = [provider_id for provider_id in dict.fromkeys(provider_ids) if ObjectId.is_valid(provider_id)]
+        if self.mode == "change_stream" or not provider_ids:
+            return
+
+        users = {
+            str(user["_id"]): user for user in await db.users.find(
+                {"_id": {"$in": [ObjectId(provider_id) for provider_id in provider_ids]}}, USER_PROJECTION
+            ).to_list(length=None)
+        }
+        profiles = await db.service_provider_profiles.find(
+            {"user_id": {"$in": provider_ids}}, PROFILE_PROJECTION
+        ).to_list(length=None)
+        packages = await db.provider_packages.find({"provider_id": {"$in": provider_ids}}).to_list(length=None)
+
+        async with self._lock:
+            known = set().union(*(self._packages_by_provider.get(provider_id, ()) for provider_id in provider_ids))
+            package_changes = {str(package["_id"]): package for package in packages}
+            package_changes.update({package_id: None for package_id in known - set(package_changes)})
+
+            profile_changes = {str(profile["_id"]): profile for profile in profiles}
+            self._apply(
+                {provider_id: users.get(provider_id) for provider_id in provider_ids},
+                profile_changes,
+                package_changes
+            )
+
+    def _apply(self, users: Dict[str, Optional[dict]], profiles: Dict[str, Optional[dict]],
+               packages: Dict[str, Optional[dict]]):
+        """Fold changed source documents (None = deleted) into a new published snapshot"""
+        touched_providers: Set[str] = set()
+        touched_packages: Set[str] = set()
+
+        for user_id, user in users.items():
+            if _is_approved_provider(user):
+                self._providers[user_id] = _with_id(user)
+            else:
+                self._providers.pop(user_id, None)
+            touched_providers.add(user_id)
+
+        profile_changes: Dict[str, Optional[dict]] = {}
+        for profile_id, profile in profiles.items():
+            user_id = profile.get("user_id") if profile else self._profile_owner.pop(profile_id, None)
+            if not user_id:
+                continue
+            if profile is None:
+                self._profiles.pop(user_id, None)
+                profile_changes[user_id] = None
+            else:
+                self._profile_owner[profile_id] = user_id
+                self._profiles[user_id] = _with_id(profile)
+                profile_changes[user_id] = self._profiles[user_id]
+            touched_providers.add(user_id)
+
+        for package_id, package in packages.items():
+            old = self._packages.pop(package_id, None)
+            if old is not None:
+                self._packages_by_provider.get(old.get("provider_id"), set()).discard(package_id)
+            if _is_active_package(package):
+                package = _with_id(package)
+                self._packages[package_id] = package
+                self._packages_by_provider.setdefault(package.get("provider_id"), set()).add(package_id)
+            touched_packages.add(package_id)
+
+        # Provider or profile changes alter every view of that provider's packages
+        for provider_id in touched_providers:
+            touched_packages |= self._packages_by_provider.get(provider_id, set())
+
+        package_views: Dict[str, Optional[dict]] = {}
+        for package_id in touched_packages:
+            package = self._packages.get(package_id)
+            provider = self._providers.get(package.get("provider_id")) if package else None
+            package_views[package_id] = (
+                package_view(package, provider, self._profiles.get(provider["id"])) if provider else None
+            )
+
+        provider_changes = {provider_id: self._providers.get(provider_id) for provider_id in touched_providers}
+        self.snapshot = self.snapshot.with_changes(provider_changes, profile_changes, package_views)
+
+    async def _run(self, db):
+        """Follow change streams, falling back to polling when the server doesn't support them"""
+        try:
+            await self._watch(db)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_UNSUPPORTED and "replica set" not in str(e):
+                print(f"Catalogue change stream failed: {str(e)}")
+            print("Change streams unavailable, polling the catalogue instead")
+        await self._poll(db)
+
+    async def _watch(self, db):
+        pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+        resume_token = None
+
+        while True:
+            try:
+                async with db.watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                    max_await_time_ms=WATCH_MAX_AWAIT_MS
+                ) as stream:
+                    if self.mode != "change_stream":
+                        # Reload once the stream is open so nothing written in between is missed
+                        await self.rebuild(db)
+                        self.mode = "change_stream"
+
+                    while stream.alive:
+                        change = await stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is None:
+                            continue
+
+                        # Collect the rest of the burst and publish one snapshot for the whole batch
+                        batch = [change]
+                        while len(batch) < WATCH_MAX_BATCH:
+                            change = await stream.try_next()
+                            if change is None:
+                                break
+                            batch.append(change)
+
+                        async with self._lock:
+                            self._apply_changes(batch)
+                        resume_token = stream.resume_token
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_UNSUPPORTED or "replica set" in str(e) or self.mode != "change_stream":
+                    self.mode = None
+                    raise
+                print(f"Catalogue change stream interrupted, resuming: {str(e)}")
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+            except PyMongoError as e:
+                print(f"Catalogue change stream interrupted, resuming: {str(e)}")
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+    def _apply_changes(self, changes: List[dict]):
+        """Translate change stream events into source document changes"""
+        users: Dict[str, Optional[dict]] = {}
+        profiles: Dict[str, Optional[dict]] = {}
+        packages: Dict[str, Optional[dict]] = {}
+        targets = {"users": users, "service_provider_profiles": profiles, "provider_packages": packages}
+
+        for change in changes:
+            target = targets.get(change.get("ns", {}).get("coll"))
+            if target is None or "documentKey" not in change:
+                continue
+            document = change.get("fullDocument")
+            if document is not None and target is users:
+                document = {k: v for k, v in document.items() if k not in USER_PROJECTION}
+            elif document is not None and target is profiles:
+                document = {k: v for k, v in document.items() if k not in PROFILE_PROJECTION}
+            target[str(change["documentKey"]["_id"])] = document
+
+        self._apply(users, profiles, packages)
+
+    async def _poll(self, db):
+        self.mode = "polling"
+        last_rebuild = datetime.utcnow()
+        since = datetime.utcnow()
+
+        while True:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            started = datetime.utcnow()
+            try:
+                if started - last_rebuild >= FULL_REBUILD_INTERVAL or not self.ready:
+                    await self.rebuild(db)
+                    last_rebuild = started
+                else:
+                    # Overlap the window slightly so writes racing the previous poll aren't lost
+                    changed = {"updated_at": {"$gte": since - timedelta(seconds=POLL_INTERVAL_SECONDS)}}
+                    users = await db.users.find({**changed, "role": "service_provider"}, USER_PROJECTION).to_list(length=None)
+                    profiles = await db.service_provider_profiles.find(changed, PROFILE_PROJECTION).to_list(length=None)
+                    packages = await db.provider_packages.find(changed).to_list(length=None)
+
+                    if users or profiles or packages:
+                        async with self._lock:
+                            self._apply(
+                                {str(user["_id"]): user for user in users},
+                                {str(profile["_id"]): profile for profile in profiles},
+                                {str(package["_id"]): package for package in packages}
+                            )
+                since = started
+            except PyMongoError as e:
+                print(f"Error refreshing catalogue snapshot: {str(e)}")
+
+
+# Process-wide catalogue shared by the read endpoints
+catalogue = Catalogue()
@@ -0,0 +1,162 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# One document per folder: {"user_id", "path": "a/b", "name": "b", "parent": "a", "files", "bytes"}
+# files and bytes count the folder's own files, not those of its subfolders
+FOLDERS_COLLECTION = "cloud_folders"
+DEFAULT_FOLDER = "default"
+MAX_FOLDER_NAME_LENGTH = 50
+MAX_FOLDER_DEPTH = 5
+REBUILD_BATCH_SIZE = 500
+
+FOLDER_VIEW_PROJECTION = {"_id": 0, "path": 1, "name": 1, "parent": 1, "files": 1, "bytes": 1, "created_at": 1}
+# Listing only the paths is answered from the index alone
+FOLDER_PATH_PROJECTION = {"_id": 0, "path": 1}
+
+
+def folder_path(folder: Optional[str], parent: Optional[str] = None) -> str:
+    """Normalized "parent/child" path of a folder, rejecting names that are too long or too deep"""
+    segments = [
+        segment.strip().replace("\\", "_")
+        for segment in f"{parent or ''}/{folder or ''}".split("/")
+    ]
+    segments = [segment for segment in segments if segment]
+    if not segments:
+        return DEFAULT_FOLDER
+    if any(len(segment) > MAX_FOLDER_NAME_LENGTH for segment in segments):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Folder name too long (max {MAX_FOLDER_NAME_LENGTH} characters)"
+        )
+    if len(segments) > MAX_FOLDER_DEPTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Folders can be nested at most {MAX_FOLDER_DEPTH} levels deep"
+        )
+    return "/".join(segments)
+
+
+def parent_path(path: str) -> Optional[str]:
+    return path.rsplit("/", 1)[0] if "/" in path else None
+
+
+def ancestor_paths(path: str) -> List[str]:
+    """The path and every folder above it, outermost first"""
+    segments = path.split("/")
+    return ["/".join(segments[:depth]) for depth in range(1, len(segments) + 1)]
+
+
+def _new_folder(path: str, now: datetime) -> dict:
+    return {"name": path.rsplit("/", 1)[-1], "parent": parent_path(path), "created_at": now}
+
+
+async def ensure_folder(db, user_id: str, path: str) -> bool:
+    """Create a folder and any missing parents; True when the folder itself is new"""
+    now = datetime.utcnow()
+    created = False
+    for current in ancestor_paths(path):
+        try:
+            result = await db[FOLDERS_COLLECTION].update_one(
+                {"user_id": user_id, "path": current},
+                {"$setOnInsert": {**_new_folder(current, now), "files": 0, "bytes": 0, "updated_at": now}},
+                upsert=True
+            )
+            created = result.upserted_id is not None
+        except DuplicateKeyError:
+            # Created by a concurrent request
+            created = False
+    return created
+
+
+async def count_folder_files(db, user_id: str, deltas: Dict[str, Sequence[int]]):
+    """Apply (files, bytes) changes to folders"""
+    now = datetime.utcnow()
+    for path, (files, size) in deltas.items():
+        await db[FOLDERS_COLLECTION].update_one(
+            {"user_id": user_id, "path": path},
+            {"$inc": {"files": files, "bytes": size}, "$set": {"updated_at": now}}
+        )
+
+
+async def get_folder(db, user_id: str, path: str) -> Optional[dict]:
+    return await db[FOLDERS_COLLECTION].find_one({"user_id": user_id, "path": path}, FOLDER_VIEW_PROJECTION)
+
+
+async def list_folders(db, user_id: str, parent: Optional[str] = None, children_only: bool = False,
+                       projection: dict = FOLDER_VIEW_PROJECTION) -> List[dict]:
+    """A user's folders sorted by path: all of them, or the direct children of parent"""
+    query = {"user_id": user_id}
+    if children_only:
+        query["parent"] = parent
+    return await db[FOLDERS_COLLECTION].find(query, projection).sort("path", ASCENDING).to_list(length=None)
+
+
+async def has_subfolders(db, user_id: str, path: str) -> bool:
+    return await db[FOLDERS_COLLECTION].find_one({"user_id": user_id, "parent": path}, {"_id": 1}) is not None
+
+
+async def count_folders(db, user_id: str) -> int:
+    return await db[FOLDERS_COLLECTION].count_documents({"user_id": user_id})
+
+
+async def remove_folder(db, user_id: str, path: str) -> bool:
+    """Delete an empty folder (folders with subfolders are kept)"""
+    if await has_subfolders(db, user_id, path):
+        return False
+    result = await db[FOLDERS_COLLECTION].delete_one({"user_id": user_id, "path": path, "files": {"$lte": 0}})
+    return result.deleted_count > 0
+
+
+async def rebuild_folders(db, user_ids: Optional[List[str]] = None) -> int:
+    """Recreate folders and their counters from cloud_storage; returns how many folders were written.
+
+    Folder placeholders ("is_folder_marker" documents) become empty folders, and
+    folders without any file left keep existing with zero counters.
+    """
+    match = {"user_id": {"$in": user_ids}} if user_ids is not None else {}
+    rows = await db.cloud_storage.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "folder": "$file_info.folder"},
+            "files": {"$sum": {"$cond": [{"$eq": ["$is_folder_marker", True]}, 0, 1]}},
+            "bytes": {"$sum": {"$cond": [
+                {"$eq": ["$is_folder_marker", True]}, 0, {"$ifNull": ["$file_info.size", 0]}
+            ]}}
+        }}
+    ], allowDiskUse=True).to_list(length=None)
+
+    now = datetime.utcnow()
+    counters: Dict[Tuple[str, str], List[int]] = {}
+    for row in rows:
+        user_id = row["_id"]["user_id"]
+        # Stored paths are kept as they are so they keep matching file_info.folder
+        path = row["_id"].get("folder") or DEFAULT_FOLDER
+        for current in ancestor_paths(path):
+            counters.setdefault((user_id, current), [0, 0])
+        counters[(user_id, path)][0] += row["files"]
+        counters[(user_id, path)][1] += row["bytes"]
+
+    requests = [
+        UpdateOne(
+            {"user_id": user_id, "path": path},
+            {
+                "$set": {"files": files, "bytes": size, "updated_at": now, "rebuilt_at": now},
+                "$setOnInsert": _new_folder(path, now)
+            },
+            upsert=True
+        )
+        for (user_id, path), (files, size) in counters.items()
+    ]
+    for start in range(0, len(requests), REBUILD_BATCH_SIZE):
+        await db[FOLDERS_COLLECTION].bulk_write(requests[start:start + REBUILD_BATCH_SIZE], ordered=False)
+
+    # Folders whose files are all gone
+    emptied = {**match, "rebuilt_at": {"$ne": now}}
+    await db[FOLDERS_COLLECTION].update_many(
+        emptied, {"$set": {"files": 0, "bytes": 0, "updated_at": now, "rebuilt_at": now}}
+    )
+    return len(requests)
@@ -0,0 +1,192 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.db.cloud_folders import remove_folder
+from app.db.cloud_usage import reconcile_usage, record_deletes
+from app.utils.storage import get_storage
+
+CLOUD_JOBS_COLLECTION = "cloud_jobs"
+# Files whose storage objects and records are deleted together (one Cloudinary delete_resources call)
+DELETE_BATCH_SIZE = 100
+# Batches in flight at once; each holds one storage call and one delete_many
+DELETE_CONCURRENCY = 4
+# Failed storage keys kept on the job for manual cleanup
+MAX_REPORTED_FAILURES = 100
+
+ACTIVE_STATUSES = ["queued", "running"]
+# A running job without progress for this long was left behind by a stopped process
+STALE_JOB_AFTER = timedelta(minutes=5)
+# Storage keys, plus what the usage counters need to uncount the file
+FILE_KEYS_PROJECTION = {
+    "file_info.public_id": 1,
+    "file_info.variants.public_ids": 1,
+    "file_info.size": 1,
+    "file_info.format": 1,
+    "file_info.folder": 1
+}
+
+# Keep references to running jobs so they aren't garbage collected mid-way
+_running: Set[asyncio.Task] = set()
+
+
+def folder_files_query(user_id: str, folder: str) -> dict:
+    return {"user_id": user_id, "file_info.folder": folder}
+
+
+def storage_keys(file_info: dict) -> List[str]:
+    """Storage keys of a cloud file: the original plus its image variants"""
+    keys = [file_info["public_id"]] if file_info.get("public_id") else []
+    return keys + (file_info.get("variants") or {}).get("public_ids", [])
+
+
+def job_view(job: dict) -> dict:
+    view = {k: v for k, v in job.items() if k not in ("_id", "request_token")}
+    view["id"] = str(job["_id"])
+    return view
+
+
+async def start_folder_deletion(db, user_id: str, folder: str, total: int) -> dict:
+    """Queue deletion of a folder's files, or return the job already deleting it"""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    job = await db[CLOUD_JOBS_COLLECTION].find_one_and_update(
+        {"user_id": user_id, "type": "delete_folder", "folder": folder, "status": {"$in": ACTIVE_STATUSES}},
+        {"$setOnInsert": {
+            "user_id": user_id,
+            "type": "delete_folder",
+            "folder": folder,
+            "status": "queued",
+            "total": total,
+            "deleted_files": 0,
+            "failed_objects": 0,
+            "failed_keys": [],
+            "request_token": token,
+            "created_at": now,
+            "updated_at": now
+        }},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if job.get("request_token") == token:
+        _spawn(db, job["_id"])
+    return job
+
+
+def _spawn(db, job_id: ObjectId):
+    task = asyncio.create_task(run_folder_deletion(db, job_id))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def _delete_batch(db, job_id: ObjectId, user_id: str, files: List[dict]):
+    """Delete one batch of files from storage, then their records, then report progress"""
+    keys = [key for file in files for key in storage_keys(file.get("file_info", {}))]
+    failed = await get_storage().delete_many(keys) if keys else []
+
+    # Records go even when their objects could not be deleted (as before); the keys are kept on the job
+    result = await db.cloud_storage.delete_many({"_id": {"$in": [file["_id"] for file in files]}})
+    if result.deleted_count == len(files):
+        await record_deletes(db, user_id, [file.get("file_info", {}) for file in files])
+    else:
+        # Some files were deleted meanwhile by another request, which uncounted them itself
+        await reconcile_usage(db, [user_id])
+    update = {
+        "$inc": {"deleted_files": result.deleted_count, "failed_objects": len(failed)},
+        "$set": {"updated_at": datetime.utcnow()}
+    }
+    if failed:
+        update["$push"] = {"failed_keys": {"$each": failed, "$slice": MAX_REPORTED_FAILURES}}
+    await db[CLOUD_JOBS_COLLECTION].update_one({"_id": job_id}, update)
+
+
+async def run_folder_deletion(db, job_id: ObjectId):
+    """Delete every file of a folder in batches, streaming their ids from the cursor.
+
+    Up to DELETE_CONCURRENCY batches run at once: each sends the storage keys to
+    the backend in one call (Cloudinary's batched delete_resources on the
+    threadpool) and removes the records with one delete_many. Re-running a job
+    is safe, so jobs interrupted by a restart are simply resumed.
+    """
+    # Claiming the queued job makes sure only one process runs it
+    job = await db[CLOUD_JOBS_COLLECTION].find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        return
+
+    semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+    # Every batch is kept (not only the unfinished ones) so that its exception is collected below
+    tasks: List[asyncio.Task] = []
+
+    async def _bounded(files: List[dict]):
+        try:
+            await _delete_batch(db, job_id, job["user_id"], files)
+        finally:
+            semaphore.release()
+
+    try:
+        cursor = db.cloud_storage.find(
+            folder_files_query(job["user_id"], job["folder"]), FILE_KEYS_PROJECTION
+        ).batch_size(DELETE_BATCH_SIZE)
+
+        batch = []
+        async for file in cursor:
+            batch.append(file)
+            if len(batch) < DELETE_BATCH_SIZE:
+                continue
+            # Stop reading ahead while enough batches are in flight
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(_bounded(batch)))
+            batch = []
+        if batch:
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(_bounded(batch)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(tasks)} batches failed, first error: {errors[0]}")
+
+        # The folder itself goes once it is empty (files uploaded meanwhile keep it alive)
+        if not await db.cloud_storage.find_one(folder_files_query(job["user_id"], job["folder"]), {"_id": 1}):
+            await remove_folder(db, job["user_id"], job["folder"])
+
+        await db[CLOUD_JOBS_COLLECTION].update_one(
+            {"_id": job_id},
+            {"$set": {"status": "completed", "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        print(f"Error in folder deletion job {job_id}: {str(e)}")
+        for task in tasks:
+            task.cancel()
+        await db[CLOUD_JOBS_COLLECTION].update_one(
+            {"_id": job_id},
+            {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+        )
+
+
+async def resume_cloud_jobs(db) -> int:
+    """Restart the jobs a stopped process left behind; returns how many"""
+    await db[CLOUD_JOBS_COLLECTION].update_many(
+        {"status": "running", "updated_at": {"$lt": datetime.utcnow() - STALE_JOB_AFTER}},
+        {"$set": {"status": "queued"}}
+    )
+    jobs = await db[CLOUD_JOBS_COLLECTION].find({"status": "queued"}, {"_id": 1}).to_list(length=None)
+    for job in jobs:
+        _spawn(db, job["_id"])
+    return len(jobs)
+
+
+async def get_job(db, job_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+    if not ObjectId.is_valid(job_id):
+        return None
+    query = {"_id": ObjectId(job_id)}
+    if user_id is not None:
+        query["user_id"] = user_id
+    return await db[CLOUD_JOBS_COLLECTION].find_one(query)
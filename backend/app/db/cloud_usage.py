@@ -0,0 +1,193 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+
+from app.db.analytics import seconds_until_hour
+from app.db.cloud_folders import count_folder_files, rebuild_folders
+
+# One document per user: {"_id": user_id, "bytes", "files", "reserved", "formats": {<format>: files}}
+# (per-folder counters live on the folders, see cloud_folders.py)
+USAGE_COLLECTION = "cloud_usage"
+# Bytes reserved by uploads still in progress are dropped after this long (process stopped mid-upload)
+STALE_RESERVATION_AFTER = timedelta(hours=1)
+RECONCILE_HOUR_UTC = 3
+RECONCILE_BATCH_SIZE = 500
+
+
+def field_key(value) -> str:
+    """Reversible escape for values used as field names ("." and "$" aren't allowed)"""
+    return str(value if value is not None else "").replace("%", "%25").replace(".", "%2E").replace("$", "%24") or "%00"
+
+
+def from_field_key(key: str) -> str:
+    if key == "%00":
+        return ""
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def _format_key(file_info: dict) -> str:
+    return field_key(file_info.get("format") or "unknown")
+
+
+async def get_usage(db, user_id: str) -> dict:
+    return await db[USAGE_COLLECTION].find_one({"_id": user_id}) or {"_id": user_id, "bytes": 0, "files": 0, "reserved": 0}
+
+
+async def reserve_bytes(db, user_id: str, size: int, quota: Optional[int]):
+    """Count an upload against the quota before it is stored, failing with 413 when it doesn't fit.
+
+    The check and the reservation are one conditional update, so concurrent
+    uploads can't overshoot the quota together.
+    """
+    await db[USAGE_COLLECTION].update_one(
+        {"_id": user_id},
+        {"$setOnInsert": {"bytes": 0, "files": 0, "reserved": 0, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
+    query = {"_id": user_id}
+    if quota:
+        query["$expr"] = {"$lte": [{"$add": ["$bytes", "$reserved"]}, quota - size]}
+    result = await db[USAGE_COLLECTION].update_one(
+        query, {"$inc": {"reserved": size}, "$set": {"updated_at": datetime.utcnow()}}
+    )
+    if not result.matched_count:
+        usage = await get_usage(db, user_id)
+        left = max(quota - usage.get("bytes", 0) - usage.get("reserved", 0), 0)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload exceeds your remaining cloud storage ({left} bytes left)"
+        )
+
+
+async def release_bytes(db, user_id: str, size: int):
+    """Give back a reservation whose upload didn't happen"""
+    if size:
+        await db[USAGE_COLLECTION].update_one({"_id": user_id}, {"$inc": {"reserved": -size}})
+
+
+async def record_upload(db, user_id: str, file_info: dict, reserved: int = 0):
+    """Count a stored file, settling the bytes reserved for it"""
+    size = file_info.get("size") or 0
+    await db[USAGE_COLLECTION].update_one(
+        {"_id": user_id},
+        {
+            "$inc": {
+                "bytes": size,
+                "reserved": -reserved,
+                "files": 1,
+                f"formats.{_format_key(file_info)}": 1
+            },
+            "$set": {"updated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+    await count_folder_files(db, user_id, {file_info["folder"]: (1, size)})
+
+
+async def record_deletes(db, user_id: str, file_infos: Iterable[dict]):
+    """Uncount deleted files with a single $inc"""
+    counters: Dict[str, int] = defaultdict(int)
+    folders: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for file_info in file_infos:
+        size = file_info.get("size") or 0
+        counters["bytes"] -= size
+        counters["files"] -= 1
+        counters[f"formats.{_format_key(file_info)}"] -= 1
+        folders[file_info.get("folder")][0] -= 1
+        folders[file_info.get("folder")][1] -= size
+    if counters:
+        await db[USAGE_COLLECTION].update_one(
+            {"_id": user_id}, {"$inc": dict(counters), "$set": {"updated_at": datetime.utcnow()}}
+        )
+        await count_folder_files(db, user_id, folders)
+
+
+def usage_stats(usage: dict, total_folders: int) -> dict:
+    """Totals served by GET /cloud/stats"""
+    return {
+        "total_files": usage.get("files", 0),
+        "total_size": usage.get("bytes", 0),
+        "total_folders": total_folders,
+        "format_distribution": {
+            from_field_key(fmt): count for fmt, count in (usage.get("formats") or {}).items() if count > 0
+        }
+    }
+
+
+async def reconcile_usage(db, user_ids: Optional[List[str]] = None) -> int:
+    """Rebuild usage documents and folder counters from cloud_storage; returns how many users were written.
+
+    Counters are recomputed by one $group over the raw collection (or the given
+    users), so drift from failed or racing $inc updates is corrected. Reservations
+    of uploads in progress are kept unless they are stale.
+    """
+    match = {"user_id": {"$in": user_ids}} if user_ids is not None else {}
+    rows = await db.cloud_storage.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "format": "$file_info.format"},
+            "files": {"$sum": 1},
+            "bytes": {"$sum": {"$ifNull": ["$file_info.size", 0]}}
+        }}
+    ], allowDiskUse=True).to_list(length=None)
+
+    now = datetime.utcnow()
+    documents: Dict[str, dict] = {}
+    for row in rows:
+        key = row["_id"]
+        usage = documents.setdefault(key["user_id"], {
+            "bytes": 0, "files": 0, "formats": {}, "updated_at": now, "reconciled_at": now
+        })
+        usage["bytes"] += row["bytes"]
+        usage["files"] += row["files"]
+        fmt = field_key(key.get("format") or "unknown")
+        usage["formats"][fmt] = usage["formats"].get(fmt, 0) + row["files"]
+
+    # Before updated_at is refreshed below
+    stale = {"reserved": {"$ne": 0}, "updated_at": {"$lt": now - STALE_RESERVATION_AFTER}}
+    if user_ids is not None:
+        stale["_id"] = {"$in": user_ids}
+    await db[USAGE_COLLECTION].update_many(stale, {"$set": {"reserved": 0}})
+
+    requests = [
+        UpdateOne(
+            {"_id": user_id},
+            {"$set": document, "$setOnInsert": {"reserved": 0, "created_at": now}},
+            upsert=True
+        )
+        for user_id, document in documents.items()
+    ]
+    for start in range(0, len(requests), RECONCILE_BATCH_SIZE):
+        await db[USAGE_COLLECTION].bulk_write(requests[start:start + RECONCILE_BATCH_SIZE], ordered=False)
+
+    # Users without any cloud file left
+    emptied = {"_id": {"$nin": list(documents)}}
+    if user_ids is not None:
+        emptied["_id"]["$in"] = user_ids
+    await db[USAGE_COLLECTION].update_many(emptied, {"$set": {
+        "bytes": 0, "files": 0, "formats": {}, "updated_at": now, "reconciled_at": now
+    }})
+
+    await rebuild_folders(db, user_ids)
+    return len(documents)
+
+
+async def run_usage_reconciliation(db):
+    """Nightly loop rebuilding the usage counters; also seeds them the first time"""
+    try:
+        if not await db[USAGE_COLLECTION].estimated_document_count():
+            await reconcile_usage(db)
+    except Exception as e:
+        print(f"Error seeding cloud storage usage: {str(e)}")
+
+    while True:
+        await asyncio.sleep(seconds_until_hour(datetime.utcnow(), RECONCILE_HOUR_UTC))
+        try:
+            count = await reconcile_usage(db)
+            print(f"Reconciled cloud storage usage for {count} users")
+        except Exception as e:
+            print(f"Error in cloud storage usage reconciliation: {str(e)}")
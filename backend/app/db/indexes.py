@@ -0,0 +1,139 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+
+from app.utils.search import SEARCH_FIELDS, search_key
+
+
+async def ensure_indexes(db):
+    """Create the indexes the API relies on (no-op when they already exist)"""
+    # Multikey index for exact service type lookups on provider profiles
+    await db.service_provider_profiles.create_index(
+        [("service_type_list", ASCENDING)],
+        name="service_type_list_1"
+    )
+
+    # Catalogue lookups on the denormalized package service type
+    await db.provider_packages.create_index(
+        [("serviceTypeKey", ASCENDING), ("status", ASCENDING)],
+        name="serviceTypeKey_1_status_1"
+    )
+
+    # Proximity search ($geoNear) over geocoded provider locations
+    await db.service_provider_profiles.create_index(
+        [("geo_point", GEOSPHERE)],
+        name="geo_point_2dsphere"
+    )
+    await db.provider_packages.create_index(
+        [("geo_point", GEOSPHERE)],
+        name="geo_point_2dsphere"
+    )
+
+    # Auto-accept job scans pending bookings oldest first
+    await db.bookings.create_index(
+        [("status", ASCENDING), ("createdAt", ASCENDING)],
+        name="status_1_createdAt_1"
+    )
+
+    # A customer's bookings, newest first
+    await db.bookings.create_index(
+        [("userId", ASCENDING), ("createdAt", DESCENDING)],
+        name="userId_1_createdAt_-1"
+    )
+
+    # Provider booking lists: filter by status, page by event date or creation time
+    await db.bookings.create_index(
+        [("providerId", ASCENDING), ("status", ASCENDING), ("eventDate", ASCENDING)],
+        name="providerId_1_status_1_eventDate_1"
+    )
+    await db.bookings.create_index(
+        [("providerId", ASCENDING), ("createdAt", DESCENDING)],
+        name="providerId_1_createdAt_-1"
+    )
+
+    # Nightly analytics compaction reads one day of each booking and review timestamp
+    await db.bookings.create_index(
+        [("createdAt", ASCENDING)],
+        name="createdAt_1"
+    )
+    await db.bookings.create_index(
+        [("confirmedAt", ASCENDING)],
+        name="confirmedAt_1",
+        sparse=True
+    )
+    await db.bookings.create_index(
+        [("cancelledAt", ASCENDING)],
+        name="cancelledAt_1",
+        sparse=True
+    )
+    await db.bookings.create_index(
+        [("payments.date", ASCENDING)],
+        name="payments.date_1"
+    )
+    await db.reviews.create_index(
+        [("date", ASCENDING)],
+        name="date_1"
+    )
+
+    # Admin lists: newest first within a role or approval status, seeking by (created_at, _id)
+    await db.users.create_index(
+        [("role", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="role_1_created_at_-1__id_-1"
+    )
+    await db.service_provider_profiles.create_index(
+        [("approval_status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="approval_status_1_created_at_-1__id_-1"
+    )
+    await db.promotions.create_index(
+        [("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="created_at_-1__id_-1"
+    )
+
+    # Admin prefix search on the lowercased copies of the searchable fields
+    for collection_name, fields in SEARCH_FIELDS.items():
+        for field in fields:
+            await db[collection_name].create_index(
+                [(search_key(field), ASCENDING)],
+                name=f"{search_key(field)}_1",
+                sparse=True
+            )
+
+    # A user's files newest first; also serves the storage quota sum
+    await db.files.create_index(
+        [("user_id", ASCENDING), ("created_at", DESCENDING)],
+        name="user_id_1_created_at_-1"
+    )
+
+    # Resumable uploads: per-user quota reservations and the expiry sweep
+    await db.upload_sessions.create_index([("user_id", ASCENDING)], name="user_id_1")
+    await db.upload_sessions.create_index([("expires_at", ASCENDING)], name="expires_at_1")
+
+    # Cloud storage files: folder-filtered listing newest first by (created_at, _id) and the folder deletion job's cursor
+    await db.cloud_storage.create_index(
+        [("user_id", ASCENDING), ("file_info.folder", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="user_id_1_file_info.folder_1_created_at_-1__id_-1"
+    )
+    # The unfiltered listing across a user's folders
+    await db.cloud_storage.create_index(
+        [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="user_id_1_created_at_-1__id_-1"
+    )
+    # Superseded by the folder index above, which has them as a prefix
+    existing = await db.cloud_storage.index_information()
+    for name in ("user_id_1_file_info.folder_1", "user_id_1_file_info.folder_1_created_at_-1"):
+        if name in existing:
+            await db.cloud_storage.drop_index(name)
+    # Cloud folders: one per path, and a parent's subfolders in path order
+    await db.cloud_folders.create_index(
+        [("user_id", ASCENDING), ("path", ASCENDING)],
+        name="user_id_1_path_1",
+        unique=True
+    )
+    await db.cloud_folders.create_index(
+        [("user_id", ASCENDING), ("parent", ASCENDING), ("path", ASCENDING)],
+        name="user_id_1_parent_1_path_1"
+    )
+    # Finding the active job for a folder, and the jobs to resume at startup
+    await db.cloud_jobs.create_index(
+        [("user_id", ASCENDING), ("folder", ASCENDING), ("status", ASCENDING)],
+        name="user_id_1_folder_1_status_1"
+    )
+    await db.cloud_jobs.create_index([("status", ASCENDING)], name="status_1")
@@ -0,0 +1,157 @@
+from datetime import datetime
+from pymongo import UpdateOne, UpdateMany
+from app.utils.service_types import service_type_keys, package_service_type_fields
+from app.utils.geo import geocode
+from app.utils.search import SEARCH_FIELDS, search_fields, search_key
+from app.db.cloud_folders import FOLDERS_COLLECTION, rebuild_folders
+
+
+async def backfill_service_type_list(db, batch_size: int = 500):
+    """Populate service_type_list on profiles and serviceType on their packages"""
+    cursor = db.service_provider_profiles.find(
+        {"service_type_list": {"$exists": False}},
+        {"user_id": 1, "service_types": 1}
+    ).batch_size(batch_size)
+
+    profile_updates = []
+    package_updates = []
+    migrated = 0
+
+    async for profile in cursor:
+        service_types = profile.get("service_types")
+        profile_updates.append(UpdateOne(
+            {"_id": profile["_id"]},
+            {"$set": {"service_type_list": service_type_keys(service_types)}}
+        ))
+        package_updates.append(UpdateMany(
+            {"provider_id": profile.get("user_id")},
+            {"$set": package_service_type_fields(service_types)}
+        ))
+
+        if len(profile_updates) >= batch_size:
+            await db.service_provider_profiles.bulk_write(profile_updates, ordered=False)
+            await db.provider_packages.bulk_write(package_updates, ordered=False)
+            migrated += len(profile_updates)
+            profile_updates = []
+            package_updates = []
+
+    if profile_updates:
+        await db.service_provider_profiles.bulk_write(profile_updates, ordered=False)
+        await db.provider_packages.bulk_write(package_updates, ordered=False)
+        migrated += len(profile_updates)
+
+    if migrated:
+        print(f"Backfilled service_type_list for {migrated} provider profiles")
+
+
+async def backfill_geo_points(db, batch_size: int = 500):
+    """Geocode provider profiles from the offline gazetteer and copy the point to their packages"""
+    cursor = db.service_provider_profiles.find(
+        {"geo_point": {"$exists": False}},
+        {"user_id": 1, "city": 1, "province": 1, "service_locations": 1}
+    ).batch_size(batch_size)
+
+    profile_updates = []
+    package_updates = []
+    migrated = 0
+
+    async for profile in cursor:
+        geo_point = geocode(profile.get("city"), profile.get("province"), profile.get("service_locations"))
+        profile_updates.append(UpdateOne(
+            {"_id": profile["_id"]},
+            {"$set": {"geo_point": geo_point}}
+        ))
+        if geo_point:
+            package_updates.append(UpdateMany(
+                {"provider_id": profile.get("user_id")},
+                {"$set": {"geo_point": geo_point}}
+            ))
+
+        if len(profile_updates) >= batch_size:
+            await db.service_provider_profiles.bulk_write(profile_updates, ordered=False)
+            if package_updates:
+                await db.provider_packages.bulk_write(package_updates, ordered=False)
+            migrated += len(profile_updates)
+            profile_updates = []
+            package_updates = []
+
+    if profile_updates:
+        await db.service_provider_profiles.bulk_write(profile_updates, ordered=False)
+        if package_updates:
+            await db.provider_packages.bulk_write(package_updates, ordered=False)
+        migrated += len(profile_updates)
+
+    if migrated:
+        print(f"Geocoded {migrated} provider profiles")
+
+
+async def backfill_confirmed_at(db):
+    """Stamp confirmedAt on bookings auto-accepted before the field existed"""
+    result = await db.bookings.update_many(
+        {"autoAcceptedAt": {"$exists": True}, "confirmedAt": {"$exists": False}},
+        [{"$set": {"confirmedAt": "$autoAcceptedAt"}}]
+    )
+    if result.modified_count:
+        print(f"Backfilled confirmedAt for {result.modified_count} bookings")
+
+
+async def backfill_admin_list_fields(db, batch_size: int = 500):
+    """Give admin-listed documents a datetime created_at and the lowercased search fields"""
+    for collection_name, fields in SEARCH_FIELDS.items():
+        collection = db[collection_name]
+        cursor = collection.find(
+            {"$or": [{"created_at": {"$not": {"$type": "date"}}}] + [
+                {field: {"$type": "string"}, search_key(field): {"$exists": False}} for field in fields
+            ]},
+            {"created_at": 1, **{field: 1 for field in fields}}
+        ).batch_size(batch_size)
+
+        updates = []
+        migrated = 0
+
+        async for document in cursor:
+            update = search_fields(collection_name, document)
+            created_at = document.get("created_at")
+            if isinstance(created_at, str):
+                # Promotions used to store ISO strings, which don't order against datetimes
+                try:
+                    update["created_at"] = datetime.fromisoformat(created_at)
+                except ValueError:
+                    update["created_at"] = document["_id"].generation_time.replace(tzinfo=None)
+            elif not isinstance(created_at, datetime):
+                # Users registered without a timestamp; the ObjectId records when they were inserted
+                update["created_at"] = document["_id"].generation_time.replace(tzinfo=None)
+            updates.append(UpdateOne({"_id": document["_id"]}, {"$set": update}))
+
+            if len(updates) >= batch_size:
+                await collection.bulk_write(updates, ordered=False)
+                migrated += len(updates)
+                updates = []
+
+        if updates:
+            await collection.bulk_write(updates, ordered=False)
+            migrated += len(updates)
+
+        if migrated:
+            print(f"Backfilled created_at and search fields for {migrated} {collection_name}")
+
+
+async def migrate_cloud_folders(db):
+    """Create cloud_folders from the folders files live in, replacing the placeholder documents"""
+    has_markers = await db.cloud_storage.find_one({"is_folder_marker": True}, {"_id": 1})
+    if not has_markers and await db[FOLDERS_COLLECTION].estimated_document_count():
+        return
+
+    created = await rebuild_folders(db)
+    result = await db.cloud_storage.delete_many({"is_folder_marker": True})
+    if created or result.deleted_count:
+        print(f"Migrated {created} cloud folders, removed {result.deleted_count} folder placeholders")
+
+
+async def run_migrations(db):
+    """Run idempotent data migrations on startup"""
+    await backfill_service_type_list(db)
+    await backfill_geo_points(db)
+    await backfill_confirmed_at(db)
+    await backfill_admin_list_fields(db)
+    await migrate_cloud_folders(db)
@@ -0,0 +1,69 @@
+# Declared projections for the routes' read paths. Each read names the fields it
+# needs (or the sensitive fields it must not see) so less BSON crosses the wire and
+# gets decoded. Password hashes, NIC images and bank details are only fetched by
+# the routes that use them: login, the owner's own profile and the admin review pages.
+from typing import Dict
+
+# Sensitive fields per collection
+USER_SECRET_FIELDS = ("password", "nic_front_image", "nic_back_image")
+PROFILE_SECRET_FIELDS = (
+    "nic_front_image_url",
+    "nic_back_image_url",
+    "bank_name",
+    "branch_name",
+    "account_number",
+    "account_owner_name"
+)
+
+
+def include(*fields: str) -> Dict[str, int]:
+    """Projection returning only the given fields (plus _id)"""
+    return {field: 1 for field in fields}
+
+
+def exclude(*fields: str) -> Dict[str, int]:
+    """Projection returning everything but the given fields"""
+    return {field: 0 for field in fields}
+
+
+# users
+# A user's own account (or an admin's view of it): everything but the password hash
+USER_ACCOUNT_PROJECTION = exclude("password")
+# Other users as seen by the public catalogue and provider pages
+USER_PROJECTION = exclude(*USER_SECRET_FIELDS)
+# Just enough to put a name next to a booking, review or conversation
+USER_NAME_PROJECTION = include("name", "username", "role", "profile_image", "business_name")
+# Customer details shown to the provider of a booking (and used for emails)
+USER_CONTACT_PROJECTION = include("name", "email", "phone")
+
+# service_provider_profiles
+PROFILE_PROJECTION = exclude(*PROFILE_SECRET_FIELDS)
+PROFILE_NAME_PROJECTION = include(
+    "user_id", "provider_name", "business_name", "profile_picture_url", "profile_picture_variants"
+)
+# Fields merged into the provider cards of the public listing
+PROFILE_CARD_PROJECTION = include(
+    "user_id",
+    "profile_picture_url",
+    "profile_picture_variants",
+    "cover_photo_url",
+    "cover_photo_variants",
+    "service_locations",
+    "service_types",
+    "covered_event_types",
+    "slogan",
+    "city",
+    "province"
+)
+
+# provider_packages
+PACKAGE_NAME_PROJECTION = include("name", "provider_id")
+
+# bookings: the fields status transitions are validated against
+BOOKING_STATE_PROJECTION = include("status", "version", "createdAt", "remainingAmount", "totalAmount", "userId", "providerId")
+# Rows of the provider dashboards' recent bookings
+BOOKING_SUMMARY_PROJECTION = include("userId", "packageId", "eventDate", "createdAt", "status")
+BOOKING_DATES_PROJECTION = include("eventDate")
+
+# Documents only checked for existence or ownership
+EXISTS_PROJECTION = include("_id")
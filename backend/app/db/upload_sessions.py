@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+
+from app.utils.file_store import discard_file
+
+# Sessions without a chunk for this long are abandoned and swept
+UPLOAD_SESSION_TTL = timedelta(hours=24)
+# A chunk being written holds the session this long at most (covers a crashed writer)
+CHUNK_LOCK_TTL = timedelta(minutes=10)
+SWEEP_INTERVAL_SECONDS = 10 * 60
+SWEEP_BATCH_SIZE = 500
+
+UPLOAD_OFFSET_HEADER = "Upload-Offset"
+
+
+def _not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Upload session not found or expired"
+    )
+
+
+async def claim_session(db, session_id: str, user_id: str, offset: int) -> dict:
+    """Lock a session for one writer, provided the client's offset matches the stored one.
+
+    The offset check and the lock are a single find_one_and_update, so two
+    concurrent PATCHes for the same range can't both write.
+    """
+    if not ObjectId.is_valid(session_id):
+        raise _not_found()
+
+    now = datetime.utcnow()
+    session = await db.upload_sessions.find_one_and_update(
+        {
+            "_id": ObjectId(session_id),
+            "user_id": user_id,
+            "offset": offset,
+            "expires_at": {"$gt": now},
+            "$or": [{"lock_until": {"$exists": False}}, {"lock_until": {"$lt": now}}]
+        },
+        {"$set": {
+            "lock_token": uuid.uuid4().hex,
+            "lock_until": now + CHUNK_LOCK_TTL,
+            # Keep the sweeper away while the chunk is written
+            "expires_at": now + UPLOAD_SESSION_TTL
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if session:
+        return session
+
+    # Explain the rejection; clients resume from the offset in the header
+    current = await db.upload_sessions.find_one(
+        {"_id": ObjectId(session_id), "user_id": user_id, "expires_at": {"$gt": now}},
+        {"offset": 1, "lock_until": 1}
+    )
+    if not current:
+        raise _not_found()
+    if current["offset"] != offset:
+        detail = f"Offset mismatch: the upload is at byte {current['offset']}"
+    else:
+        detail = "Another chunk for this upload is still being written"
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=detail,
+        headers={UPLOAD_OFFSET_HEADER: str(current["offset"])}
+    )
+
+
+async def advance_session(db, session: dict, written: int, sha256: str) -> int:
+    """Record a written chunk and release the lock; returns the new offset"""
+    now = datetime.utcnow()
+    updated = await db.upload_sessions.find_one_and_update(
+        {"_id": session["_id"], "lock_token": session["lock_token"]},
+        {
+            "$inc": {"offset": written},
+            "$push": {"chunks": {"offset": session["offset"], "length": written, "sha256": sha256}},
+            "$set": {"updated_at": now, "expires_at": now + UPLOAD_SESSION_TTL},
+            "$unset": {"lock_token": "", "lock_until": ""}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        # The lock expired mid-chunk and the session was swept or taken over
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session changed while the chunk was written, check its offset and retry"
+        )
+    return updated["offset"]
+
+
+async def release_session(db, session: dict):
+    await db.upload_sessions.update_one(
+        {"_id": session["_id"], "lock_token": session["lock_token"]},
+        {"$unset": {"lock_token": "", "lock_until": ""}}
+    )
+
+
+async def expire_upload_sessions(db, now: Optional[datetime] = None) -> int:
+    """Delete abandoned sessions and their partial files; returns how many were removed"""
+    now = now or datetime.utcnow()
+    removed = 0
+
+    while True:
+        expired = await db.upload_sessions.find(
+            {"expires_at": {"$lt": now}}, {"path": 1}
+        ).limit(SWEEP_BATCH_SIZE).to_list(length=SWEEP_BATCH_SIZE)
+        if not expired:
+            break
+
+        # Delete the session before its file, and only if no chunk revived it in the meantime
+        for session in expired:
+            result = await db.upload_sessions.delete_one({"_id": session["_id"], "expires_at": {"$lt": now}})
+            if result.deleted_count:
+                await discard_file(session["path"])
+                removed += 1
+        if len(expired) < SWEEP_BATCH_SIZE:
+            break
+
+    return removed
+
+
+async def run_upload_sweeper(db, interval_seconds: int = SWEEP_INTERVAL_SECONDS):
+    """Background loop expiring abandoned resumable uploads"""
+    while True:
+        try:
+            removed = await expire_upload_sessions(db)
+            if removed:
+                print(f"Expired {removed} abandoned upload sessions")
+        except Exception as e:
+            print(f"Error in upload session sweeper: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -11,6 +11,7 @@ class FileBase(BaseModel):
     file_size: int
     file_path: str
     user_id: str
+    sha256: Optional[str] = None
     
     model_config = {
         "populate_by_name": True,
@@ -34,4 +35,8 @@ class FileResponse(FileBase):
     
     model_config = {
         "populate_by_name": True
-    }
\ No newline at end of file
+    }
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1)
+    size: int = Field(..., gt=0)
@@ -68,6 +68,8 @@ class PackageUpdate(BaseModel):
 class PackageInDB(PackageBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     provider_id: str
+    serviceType: str = ""
+    serviceTypeKey: Optional[str] = None
     bookings: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
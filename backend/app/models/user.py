@@ -121,6 +121,7 @@ class ServiceProviderProfile(BaseModel):
     province: str
     service_locations: List[str]
     service_types: str
+    service_type_list: List[str] = []
     covered_event_types: List[str]
     profile_picture_url: str
     cover_photo_url: Optional[str] = None
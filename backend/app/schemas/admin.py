@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
 
 class SuperAdminCreate(BaseModel):
     name: str
@@ -11,4 +11,24 @@ class SuperAdminCheck(BaseModel):
     exists: bool
 
 class ServiceProviderApprovalAction(BaseModel):
-    reason: Optional[str] = None
\ No newline at end of file
+    reason: Optional[str] = None
+
+# Largest number of applications decided in one bulk request
+MAX_BULK_DECISIONS = 1000
+
+class BulkApprovalRequest(BaseModel):
+    profile_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_DECISIONS)
+
+class BulkRejectionRequest(BulkApprovalRequest):
+    reason: Optional[str] = None
+
+class BulkDecisionItem(BaseModel):
+    profile_id: str
+    status: str  # approved, rejected, skipped or failed
+    detail: Optional[str] = None
+
+class BulkDecisionResult(BaseModel):
+    processed: int
+    failed: int
+    skipped: int
+    results: List[BulkDecisionItem]
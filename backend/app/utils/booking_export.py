@@ -0,0 +1,224 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Rows buffered before a CSV chunk is flushed to the client
+CSV_CHUNK_ROWS = 1000
+# Rows per Parquet row group (each is encoded and sent as soon as it fills)
+PARQUET_ROW_GROUP_ROWS = 10000
+# Documents Motor fetches per getMore while exporting
+EXPORT_BATCH_SIZE = 1000
+
+# Booking columns, followed by one set of payment columns per flattened payment
+BOOKING_COLUMNS = [
+    ("bookingId", "string"),
+    ("status", "string"),
+    ("eventDate", "timestamp"),
+    ("eventType", "string"),
+    ("eventLocation", "string"),
+    ("crowdSize", "int"),
+    ("fullName", "string"),
+    ("email", "string"),
+    ("phone", "string"),
+    ("userId", "string"),
+    ("providerId", "string"),
+    ("packageId", "string"),
+    ("totalAmount", "float"),
+    ("remainingAmount", "float"),
+    ("createdAt", "timestamp"),
+]
+PAYMENT_COLUMNS = [
+    ("paymentIndex", "int"),
+    ("paymentAmount", "float"),
+    ("paymentMethod", "string"),
+    ("paymentType", "string"),
+    ("paymentStatus", "string"),
+    ("paymentDate", "timestamp"),
+]
+EXPORT_COLUMNS = BOOKING_COLUMNS + PAYMENT_COLUMNS
+EXPORT_PROJECTION = {
+    **{name: 1 for name, _ in BOOKING_COLUMNS if name != "bookingId"},
+    "payments": 1
+}
+
+# Spreadsheets evaluate cells starting with these as formulas; customer-entered strings are defused with a '
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+CSV_COLUMN_IS_STRING = [kind == "string" for _, kind in EXPORT_COLUMNS]
+
+CSV_MEDIA_TYPE = "text/csv"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def booking_filters(query: dict, status_filter: Optional[str], date_from: Optional[datetime],
+                    date_to: Optional[datetime]) -> dict:
+    """Add the status list and event date range filters shared by the list and export routes"""
+    if status_filter:
+        query["status"] = {"$in": [value.strip() for value in status_filter.split(",") if value.strip()]}
+    if date_from or date_to:
+        query["eventDate"] = {}
+        if date_from:
+            query["eventDate"]["$gte"] = date_from
+        if date_to:
+            query["eventDate"]["$lte"] = date_to
+    return query
+
+
+def check_export_format(export_format: str):
+    """Reject unknown formats, and Parquet when pyarrow isn't installed"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of {', '.join(EXPORT_FORMATS)}"
+        )
+    if export_format == "parquet" and pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parquet export is not available on this server (pyarrow is not installed)"
+        )
+
+
+def flatten_booking(booking: dict) -> Iterator[list]:
+    """One row per payment (or a single row with empty payment columns), in EXPORT_COLUMNS order"""
+    base = [str(booking["_id"])] + [booking.get(name) for name, _ in BOOKING_COLUMNS[1:]]
+    payments = booking.get("payments") or []
+    if not payments:
+        yield base + [None] * len(PAYMENT_COLUMNS)
+        return
+    for index, payment in enumerate(payments):
+        yield base + [
+            index,
+            payment.get("amount"),
+            payment.get("method"),
+            payment.get("type"),
+            payment.get("status"),
+            payment.get("date")
+        ]
+
+
+def _csv_value(value, is_string: bool = False):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if is_string and isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def csv_chunks(cursor, chunk_rows: int = CSV_CHUNK_ROWS) -> AsyncIterator[bytes]:
+    """Stream a Motor cursor of bookings as CSV, holding at most chunk_rows rows in memory"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    rows = 0
+
+    async for booking in cursor:
+        for row in flatten_booking(booking):
+            writer.writerow([_csv_value(value, is_string) for value, is_string in zip(row, CSV_COLUMN_IS_STRING)])
+            rows += 1
+        if rows >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting what ParquetWriter emits until it is drained"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema():
+    types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64(), "timestamp": pa.timestamp("ms")}
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+
+
+def _coerce(value, kind: str):
+    # Legacy documents store some numbers as strings; anything unparseable becomes null
+    if value is None:
+        return None
+    try:
+        if kind == "string":
+            return str(value)
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        return value if isinstance(value, datetime) else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _record_batch(schema, rows: List[list]):
+    columns = [
+        pa.array([_coerce(row[i], kind) for row in rows], type=schema.field(i).type)
+        for i, (_, kind) in enumerate(EXPORT_COLUMNS)
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+async def parquet_chunks(cursor, row_group_rows: int = PARQUET_ROW_GROUP_ROWS) -> AsyncIterator[bytes]:
+    """Stream a Motor cursor of bookings as Parquet, one row group at a time"""
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    rows: List[list] = []
+
+    async for booking in cursor:
+        rows.extend(flatten_booking(booking))
+        if len(rows) >= row_group_rows:
+            writer.write_table(_record_batch(schema, rows))
+            rows = []
+            yield sink.drain()
+
+    if rows:
+        writer.write_table(_record_batch(schema, rows))
+    writer.close()
+    yield sink.drain()
+
+
+def export_response(cursor, export_format: str, filename_prefix: str) -> StreamingResponse:
+    """Stream a bookings cursor as a CSV or Parquet attachment"""
+    filename = f"{filename_prefix}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    if export_format == "parquet":
+        chunks, media_type = parquet_chunks(cursor), PARQUET_MEDIA_TYPE
+    else:
+        chunks, media_type = csv_chunks(cursor), CSV_MEDIA_TYPE
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
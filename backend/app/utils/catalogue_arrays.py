@@ -0,0 +1,255 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.utils.service_types import normalize_service_type
+
+# Bits per word of the packed event-type masks
+MASK_WORD_BITS = 64
+# Upper bound on cells evaluated per broadcast slab (keeps peak memory flat)
+BLOCK_ELEMENTS = 1 << 20
+
+
+class PackageColumns:
+    """Columnar (NumPy) view of a list of package dicts.
+
+    Holds price, crowd size bounds, provider codes, service type codes and packed
+    event-type bitmasks so bundle feasibility can be evaluated with broadcasting
+    instead of one tuple at a time.
+    """
+
+    def __init__(self, packages: Sequence[dict]):
+        self.packages: List[dict] = list(packages)
+        n = len(self.packages)
+
+        self.price = np.fromiter((p.get("price", 0) or 0 for p in self.packages), dtype=np.float64, count=n)
+        self.crowd_min = np.fromiter((p.get("crowdSizeMin", 0) or 0 for p in self.packages), dtype=np.int64, count=n)
+        self.crowd_max = np.fromiter((p.get("crowdSizeMax", 1000) or 0 for p in self.packages), dtype=np.int64, count=n)
+
+        # Dense integer codes for providers and service types
+        self.provider_index: Dict[str, int] = {}
+        self.provider_code = np.fromiter(
+            (self.provider_index.setdefault(p.get("provider_id"), len(self.provider_index)) for p in self.packages),
+            dtype=np.int64, count=n
+        )
+
+        self.service_keys: List[str] = []
+        self.service_names: Dict[str, str] = {}
+        service_index: Dict[str, int] = {}
+        service_codes = np.full(n, -1, dtype=np.int64)
+        for i, package in enumerate(self.packages):
+            service_type = package.get("serviceType", "") or package.get("providerInfo", {}).get("serviceType", "")
+            if not service_type:
+                continue
+            key = normalize_service_type(service_type)
+            if key not in service_index:
+                service_index[key] = len(self.service_keys)
+                self.service_keys.append(key)
+                self.service_names[key] = service_type
+            service_codes[i] = service_index[key]
+        self.service_code = service_codes
+
+        # Event types packed into uint64 words, one bit per distinct event type
+        self.event_index: Dict[str, int] = {}
+        rows, bits = [], []
+        for i, package in enumerate(self.packages):
+            for event_type in package.get("eventTypes", []) or []:
+                rows.append(i)
+                bits.append(self.event_index.setdefault(event_type, len(self.event_index)))
+        self.mask_words = max(1, -(-len(self.event_index) // MASK_WORD_BITS))
+        self.event_mask = np.zeros((n, self.mask_words), dtype=np.uint64)
+        if bits:
+            bits = np.asarray(bits, dtype=np.uint64)
+            np.bitwise_or.at(
+                self.event_mask,
+                (np.asarray(rows), (bits // MASK_WORD_BITS).astype(np.intp)),
+                np.uint64(1) << (bits % np.uint64(MASK_WORD_BITS))
+            )
+        self._rows: Optional[tuple] = None
+
+    def rows(self) -> tuple:
+        """Plain-Python (provider, price, crowd min, crowd max, event bits) lists, built once.
+
+        For checks on one bundle at a time (the heap search), where indexing
+        NumPy arrays element by element costs more than the check itself.
+        """
+        if self._rows is None:
+            event_bits = [
+                sum(int(word) << (MASK_WORD_BITS * position) for position, word in enumerate(row))
+                for row in self.event_mask.tolist()
+            ]
+            self._rows = (
+                self.provider_code.tolist(), self.price.tolist(),
+                self.crowd_min.tolist(), self.crowd_max.tolist(), event_bits
+            )
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self.packages)
+
+    def mask_for(self, event_types: Iterable[str]) -> np.ndarray:
+        """Packed bitmask for a set of event types (unknown types are ignored)"""
+        mask = np.zeros(self.mask_words, dtype=np.uint64)
+        for event_type in event_types:
+            bit = self.event_index.get(event_type)
+            if bit is not None:
+                mask[bit // MASK_WORD_BITS] |= np.uint64(1) << np.uint64(bit % MASK_WORD_BITS)
+        return mask
+
+    def fits(self, crowd_size: Optional[int] = None, event_type: Optional[str] = None,
+             max_price: Optional[float] = None) -> np.ndarray:
+        """Boolean mask of packages satisfying per-package constraints"""
+        keep = self.service_code >= 0
+        if crowd_size is not None:
+            keep &= (self.crowd_min <= crowd_size) & (self.crowd_max >= crowd_size)
+        if event_type:
+            if event_type in self.event_index:
+                keep &= ((self.event_mask & self.mask_for([event_type])) != 0).any(axis=1)
+            else:
+                keep &= False
+        if max_price is not None:
+            keep &= self.price <= max_price
+        return keep
+
+    def event_types_of(self, mask: np.ndarray) -> List[str]:
+        """Decode a packed bitmask back into event type names"""
+        return [
+            event_type for event_type, bit in self.event_index.items()
+            if int(mask[bit // MASK_WORD_BITS]) >> (bit % MASK_WORD_BITS) & 1
+        ]
+
+
+def feasible_grid(columns: PackageColumns, axes: Sequence[np.ndarray], max_budget: Optional[float]) -> np.ndarray:
+    """Evaluate bundle feasibility for every combination of the given index arrays.
+
+    Returns a boolean array of shape (len(axes[0]), ..., len(axes[-1])) covering
+    distinct providers, budget, crowd size intersection and event type overlap.
+    """
+    dims = len(axes)
+
+    def expand(values: np.ndarray, axis: int) -> np.ndarray:
+        shape = [1] * dims
+        shape[axis] = len(values)
+        return values.reshape(shape + list(values.shape[1:]))
+
+    providers = [expand(columns.provider_code[idx], axis) for axis, idx in enumerate(axes)]
+    feasible = np.ones(tuple(len(idx) for idx in axes), dtype=bool)
+    for i in range(dims):
+        for j in range(i + 1, dims):
+            feasible &= providers[i] != providers[j]
+
+    if max_budget is not None:
+        total = sum(expand(columns.price[idx], axis) for axis, idx in enumerate(axes))
+        feasible &= total <= max_budget
+
+    crowd_min = expand(columns.crowd_min[axes[0]], 0)
+    crowd_max = expand(columns.crowd_max[axes[0]], 0)
+    for axis in range(1, dims):
+        crowd_min = np.maximum(crowd_min, expand(columns.crowd_min[axes[axis]], axis))
+        crowd_max = np.minimum(crowd_max, expand(columns.crowd_max[axes[axis]], axis))
+    feasible &= crowd_min <= crowd_max
+
+    shared = expand(columns.event_mask[axes[0]], 0)
+    for axis in range(1, dims):
+        shared = shared & expand(columns.event_mask[axes[axis]], axis)
+    feasible &= (shared != 0).any(axis=-1)
+
+    return feasible
+
+
+def _ordered_type_grid(columns: PackageColumns, axes: Sequence[np.ndarray]) -> np.ndarray:
+    """Cells whose service type codes strictly increase along the axes (one cell per unordered bundle)"""
+    dims = len(axes)
+    codes = []
+    for axis, idx in enumerate(axes):
+        shape = [1] * dims
+        shape[axis] = len(idx)
+        codes.append(columns.service_code[idx].reshape(shape))
+
+    ordered = np.ones(tuple(len(idx) for idx in axes), dtype=bool)
+    for axis in range(1, dims):
+        ordered &= codes[axis - 1] < codes[axis]
+    return ordered
+
+
+def top_k_bundles(columns: PackageColumns, scores: np.ndarray, candidates: np.ndarray, size: int, k: int,
+                  max_budget: Optional[float], required: Optional[np.ndarray] = None,
+                  required_count: int = 0, max_cells: Optional[int] = None) -> Optional[List[tuple]]:
+    """Exact top-K feasible bundles of `size` packages with distinct service types.
+
+    `candidates` must be sorted by score. Every bundle drawn from a growing prefix
+    of the candidates is scored in one broadcast (evaluated in slabs to bound
+    memory), and the prefix stops growing once no bundle using a later candidate
+    could beat the K-th best found so far. `required` is a boolean mask over the
+    catalogue marking packages of the `required_count` service types every bundle
+    must include.
+    Returns (score, package indices) tuples, best first, or None when finishing
+    would score more than `max_cells` cells or need trailing axes larger than
+    BLOCK_ELEMENTS (sparse feasibility keeps the prefix growing); callers then
+    fall back to the heap search.
+    """
+    if required_count > size or len(candidates) < size:
+        return []
+
+    sorted_scores = scores[candidates]
+    floor = float(sorted_scores[0])
+    prefix = max(4 * k, 64)
+    cells = 0
+
+    while True:
+        limit = min(prefix, len(candidates))
+        if limit ** (size - 1) > BLOCK_ELEMENTS:
+            return None
+        axes = [candidates[:limit]] * size
+        axis_scores = sorted_scores[:limit]
+        slab = max(1, BLOCK_ELEMENTS // limit ** (size - 1))
+
+        # Score of the trailing axes, shared by every slab
+        rest = np.zeros([limit] * (size - 1), dtype=np.float64)
+        for axis in range(size - 1):
+            shape = [1] * (size - 1)
+            shape[axis] = limit
+            rest = rest + axis_scores.reshape(shape)
+
+        bundles: List[tuple] = []
+        for start in range(0, limit, slab):
+            stop = min(start + slab, limit)
+
+            # Nothing in this or later slabs can beat the K bundles already held
+            if len(bundles) >= k and axis_scores[start] + (size - 1) * floor > bundles[k - 1][0]:
+                break
+
+            cells += (stop - start) * limit ** (size - 1)
+            if max_cells is not None and cells > max_cells:
+                return None
+
+            slab_axes = [axes[0][start:stop]] + axes[1:]
+            feasible = _ordered_type_grid(columns, slab_axes) & feasible_grid(columns, slab_axes, max_budget)
+            if required is not None and required_count:
+                hits = sum(
+                    required[idx].reshape([len(idx) if a == axis else 1 for a in range(size)]).astype(np.int64)
+                    for axis, idx in enumerate(slab_axes)
+                )
+                feasible &= hits == required_count
+
+            head = axis_scores[start:stop].reshape([stop - start] + [1] * (size - 1))
+            total = np.where(feasible, head + rest, np.inf).ravel()
+
+            take = min(k, int(np.count_nonzero(feasible)))
+            if not take:
+                continue
+            best = np.argpartition(total, take - 1)[:take] if take < total.size else np.flatnonzero(np.isfinite(total))
+            for flat in best:
+                position = np.unravel_index(int(flat), feasible.shape)
+                bundles.append((float(total[flat]), tuple(int(slab_axes[axis][i]) for axis, i in enumerate(position))))
+            bundles.sort(key=lambda item: item[0])
+            del bundles[k:]
+
+        if limit == len(candidates):
+            return bundles
+
+        # Any bundle using a candidate past the prefix scores at least this much
+        if len(bundles) == k and bundles[-1][0] <= sorted_scores[limit] + (size - 1) * floor:
+            return bundles
+
+        prefix *= 4
@@ -0,0 +1,248 @@
+import os
+import stat
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+# Bytes read per step when the server can't send the file itself
+READ_CHUNK_SIZE = 256 * 1024
+# More ranges than this in one request is treated as abuse and answered with the whole file
+MAX_RANGES = 16
+# Ranges closer than this are merged rather than sent as separate parts
+RANGE_MERGE_GAP = 80
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Inclusive (start, end) byte ranges from a Range header, sorted and coalesced.
+
+    Returns None when the header should be ignored (malformed, not bytes, or too
+    many ranges) and [] when it is well-formed but no range overlaps the file.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else max(size - 1, start)
+                if end < start:
+                    return None
+            else:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length == 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + RANGE_MERGE_GAP:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _http_date(timestamp: float) -> str:
+    return format_datetime(datetime.fromtimestamp(timestamp, tz=timezone.utc), usegmt=True)
+
+
+def _not_modified_since(header: Optional[str], mtime: float) -> bool:
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return _opaque_tag(etag) in [_opaque_tag(candidate) for candidate in header.split(",")]
+
+
+def _read_at(fd: int, length: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, length, offset)
+    # Windows has no pread; each response owns its descriptor, so seeking is safe
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, length)
+
+
+class RangeFileResponse(Response):
+    """File download honoring Range/If-Range, ETag/Last-Modified and multipart/byteranges.
+
+    When the server offers the ASGI zero-copy extension the kernel copies file
+    bytes straight to the socket (sendfile); otherwise ranges are read on the
+    threadpool, one chunk at a time, without loading the file into memory.
+    """
+
+    def __init__(self, path: str, request: Request, filename: str, media_type: str = "application/octet-stream",
+                 etag: Optional[str] = None, headers: Optional[dict] = None):
+        self.path = path
+        self.request = request
+        self.filename = filename
+        self.media_type = media_type
+        self.etag = etag
+        self.extra_headers = headers or {}
+        self.background = None
+        self.status_code = 200
+        self.parts: List[Tuple[int, int]] = []
+        self.boundary: Optional[str] = None
+        self.raw_headers = []
+
+    def _prepare(self, size: int, mtime: float):
+        request_headers = self.request.headers
+        etag = self.etag or f'"{size:x}-{int(mtime * 1000):x}"'
+        last_modified = _http_date(mtime)
+        disposition = f"attachment; filename*=utf-8''{quote(self.filename)}"
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": last_modified,
+            "content-disposition": disposition,
+            **self.extra_headers
+        }
+
+        # Conditional GET: If-None-Match wins over If-Modified-Since when both are sent
+        if_none_match = request_headers.get("if-none-match")
+        if _etag_matches(if_none_match, etag) or (
+            if_none_match is None and _not_modified_since(request_headers.get("if-modified-since"), mtime)
+        ):
+            self.status_code = 304
+            return headers
+
+        # Ranges only apply while the client's copy is current (If-Range takes an ETag or a date)
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and if_range:
+            if if_range.startswith('"') or if_range.startswith("W/"):
+                # Strong comparison: a weak validator never matches
+                if if_range.startswith("W/") or if_range != etag:
+                    range_header = None
+            elif if_range != last_modified:
+                range_header = None
+
+        ranges = parse_range_header(range_header, size) if range_header else None
+        if ranges == []:
+            self.status_code = 416
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+            return headers
+
+        if not ranges:
+            self.parts = [(0, size - 1)] if size else []
+            headers["content-type"] = self.media_type
+            headers["content-length"] = str(size)
+            return headers
+
+        self.status_code = 206
+        self.parts = ranges
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            headers["content-type"] = self.media_type
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+            return headers
+
+        self.boundary = uuid.uuid4().hex
+        headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+        headers["content-length"] = str(sum(
+            len(self._part_header(start, end, size)) + end - start + 1 for start, end in ranges
+        ) + len(self._closing()))
+        return headers
+
+    def _part_header(self, start: int, end: int, size: int) -> bytes:
+        return (
+            f"\r\n--{self.boundary}\r\n"
+            f"Content-Type: {self.media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+
+    async def _send_range(self, send, fd: int, start: int, end: int, zero_copy: bool, more_body: bool):
+        count = end - start + 1
+        if zero_copy:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": fd,
+                "offset": start,
+                "count": count,
+                "more_body": more_body
+            })
+            return
+
+        offset = start
+        while offset <= end:
+            chunk = await run_in_threadpool(_read_at, fd, min(READ_CHUNK_SIZE, end - offset + 1), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body or offset <= end})
+
+    async def __call__(self, scope, receive, send):
+        try:
+            file_stat = await run_in_threadpool(os.stat, self.path)
+        except FileNotFoundError:
+            await Response("File not found on server", status_code=404)(scope, receive, send)
+            return
+        if not stat.S_ISREG(file_stat.st_mode):
+            await Response("File not found on server", status_code=404)(scope, receive, send)
+            return
+
+        headers = self._prepare(file_stat.st_size, file_stat.st_mtime)
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()]
+        })
+        if self.status_code in (304, 416) or not self.parts or scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            if self.boundary is None:
+                start, end = self.parts[0]
+                await self._send_range(send, fd, start, end, zero_copy, more_body=False)
+                return
+
+            for start, end in self.parts:
+                header = self._part_header(start, end, file_stat.st_size)
+                await send({"type": "http.response.body", "body": header, "more_body": True})
+                await self._send_range(send, fd, start, end, zero_copy, more_body=True)
+            await send({"type": "http.response.body", "body": self._closing(), "more_body": False})
+        finally:
+            os.close(fd)
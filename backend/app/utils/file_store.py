@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+# Use an absolute path that works on both Windows and Unix
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../uploads"))
+# Content-addressed blobs, stored once however many files reference them
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, "objects")
+# Uploads land here until their digest is known (same filesystem, so moving them is a rename)
+INCOMING_DIR = os.path.join(OBJECTS_DIR, "incoming")
+
+# One document per blob: {"_id": sha256, "refcount": n, "size": bytes, "path": ...}
+OBJECTS_COLLECTION = "file_objects"
+
+# Bytes read from the upload and written to disk per step
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Attempts to reference a blob that another request is deleting at that moment
+CLAIM_RETRIES = 20
+CLAIM_RETRY_SECONDS = 0.05
+
+
+def _size_error(limit: int, quota_limited: bool) -> HTTPException:
+    if quota_limited:
+        detail = f"Upload exceeds your remaining storage quota ({limit} bytes left)"
+    else:
+        detail = f"File exceeds the maximum upload size of {limit} bytes"
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+def temp_path(destination: str) -> str:
+    """Hidden sibling of destination, so the final rename stays on one filesystem"""
+    directory, name = os.path.split(destination)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex}.part")
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(
+    upload: UploadFile,
+    destination: str,
+    max_bytes: int,
+    quota_limited: bool = False,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Tuple[int, str]:
+    """Stream an upload to destination and return (size, sha256 hex digest).
+
+    Chunks are written on the threadpool so the event loop never blocks on disk, and
+    size and digest are computed in the same pass. The data goes to a temporary
+    sibling that is renamed over destination only once complete, so readers never
+    see a partial file. Exceeding max_bytes aborts with 413 and removes the
+    temporary file. quota_limited only selects the error message.
+    """
+    # Starlette already knows the size of the spooled upload; reject before copying a byte
+    if upload.size is not None and upload.size > max_bytes:
+        raise _size_error(max_bytes, quota_limited)
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    partial = temp_path(destination)
+    digest = hashlib.sha256()
+    size = 0
+
+    handle = await run_in_threadpool(open, partial, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise _size_error(max_bytes, quota_limited)
+            digest.update(chunk)
+            await run_in_threadpool(handle.write, chunk)
+
+        await run_in_threadpool(handle.flush)
+        await run_in_threadpool(os.fsync, handle.fileno())
+        await run_in_threadpool(handle.close)
+        await run_in_threadpool(os.replace, partial, destination)
+    except BaseException:
+        handle.close()
+        await run_in_threadpool(_discard, partial)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def upload_limit(max_upload_size: int, quota: Optional[int], used: int) -> Tuple[int, bool]:
+    """Largest upload allowed right now, and whether the quota (not the size cap) is what limits it"""
+    if quota is None:
+        return max_upload_size, False
+    remaining = max(quota - used, 0)
+    if remaining < max_upload_size:
+        return remaining, True
+    return max_upload_size, False
+
+
+def object_path(sha256: str) -> str:
+    """Sharded blob location: objects/ab/cd/<sha256>"""
+    return os.path.join(OBJECTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def _place(staged: str, destination: str):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(staged, destination)
+
+
+async def _reference(db, sha256: str, size: int) -> Optional[dict]:
+    """Add a reference to a blob, creating its document; returns the document as it was before"""
+    for _ in range(CLAIM_RETRIES):
+        try:
+            return await db[OBJECTS_COLLECTION].find_one_and_update(
+                {"_id": sha256, "deleting": {"$exists": False}},
+                {
+                    "$inc": {"refcount": 1},
+                    "$setOnInsert": {"size": size, "path": object_path(sha256), "created_at": datetime.utcnow()}
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # The blob is being deleted; its document disappears once the file is gone
+            await asyncio.sleep(CLAIM_RETRY_SECONDS)
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="File storage is busy, please retry the upload"
+    )
+
+
+async def commit_staged(db, staged: str, size: int, sha256: str) -> str:
+    """Reference a fully written file under incoming/ as a blob; returns the blob path.
+
+    Identical content is kept once. The first reference moves the staged file into
+    place; later ones discard their copy and only increment the blob's refcount.
+    """
+    destination = object_path(sha256)
+    try:
+        previous = await _reference(db, sha256, size)
+        # Also re-place the blob if the first uploader hasn't finished moving it yet (same bytes, atomic rename)
+        if previous is None or not await run_in_threadpool(os.path.exists, destination):
+            await run_in_threadpool(_place, staged, destination)
+    finally:
+        await run_in_threadpool(_discard, staged)
+    return destination
+
+
+async def store_upload(db, upload: UploadFile, max_bytes: int, quota_limited: bool = False) -> Tuple[int, str, str]:
+    """Stream an upload into the content-addressed store; returns (size, sha256, blob path)"""
+    staged = os.path.join(INCOMING_DIR, uuid.uuid4().hex)
+    size, sha256 = await save_upload(upload, staged, max_bytes, quota_limited)
+    return size, sha256, await commit_staged(db, staged, size, sha256)
+
+
+def session_path(session_id: str) -> str:
+    """Where a resumable upload accumulates its chunks until it is finalized"""
+    return os.path.join(INCOMING_DIR, f"session-{session_id}")
+
+
+def _write_at(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:
+            # Windows has no pwrite; the session lock guarantees a single writer
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+def _open_for_chunk(path: str) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return os.open(path, os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+
+
+async def write_chunk(path: str, chunks: AsyncIterator[bytes], offset: int, max_bytes: int) -> Tuple[int, str]:
+    """Write a request body into path at offset; returns (bytes written, sha256 of those bytes).
+
+    Fails with 413 past max_bytes and then truncates the file back to offset, so a
+    rejected chunk leaves the upload exactly where it was.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    fd = await run_in_threadpool(_open_for_chunk, path)
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if written + len(chunk) > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Chunk exceeds the {max_bytes} bytes remaining in this upload"
+                )
+            digest.update(chunk)
+            await run_in_threadpool(_write_at, fd, chunk, offset + written)
+            written += len(chunk)
+        await run_in_threadpool(os.fsync, fd)
+    except BaseException:
+        await run_in_threadpool(os.ftruncate, fd, offset)
+        raise
+    finally:
+        os.close(fd)
+    return written, digest.hexdigest()
+
+
+async def truncate_file(path: str, length: int):
+    def _truncate():
+        with open(path, "r+b") as handle:
+            handle.truncate(length)
+    await run_in_threadpool(_truncate)
+
+
+async def file_sha256(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Digest of a whole file, read sequentially on the threadpool"""
+    def _digest():
+        digest = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return await run_in_threadpool(_digest)
+
+
+async def discard_file(path: str):
+    await run_in_threadpool(_discard, path)
+
+
+async def release_object(db, sha256: str):
+    """Drop one reference to a blob and unlink it when that was the last one.
+
+    The blob's document is marked as deleting before the file is removed and only
+    deleted afterwards. Meanwhile new references to the same content wait in
+    _reference, so an upload can't land between the unlink and the document removal.
+    """
+    blob = await db[OBJECTS_COLLECTION].find_one_and_update(
+        {"_id": sha256, "refcount": {"$gt": 0}, "deleting": {"$exists": False}},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not blob or blob["refcount"] > 0:
+        return
+
+    token = uuid.uuid4().hex
+    claimed = await db[OBJECTS_COLLECTION].find_one_and_update(
+        {"_id": sha256, "refcount": 0, "deleting": {"$exists": False}},
+        {"$set": {"deleting": token}}
+    )
+    if not claimed:
+        # Referenced again in the meantime
+        return
+
+    await run_in_threadpool(_discard, blob.get("path") or object_path(sha256))
+    await db[OBJECTS_COLLECTION].delete_one({"_id": sha256, "deleting": token})
@@ -0,0 +1,168 @@
+from typing import Iterable, Optional, Tuple
+
+# Offline gazetteer of Sri Lankan cities and towns: name -> (latitude, longitude)
+CITY_COORDINATES = {
+    "colombo": (6.9271, 79.8612),
+    "dehiwala": (6.8511, 79.8659),
+    "mount lavinia": (6.8389, 79.8653),
+    "moratuwa": (6.7730, 79.8816),
+    "sri jayawardenepura kotte": (6.8868, 79.9187),
+    "kotte": (6.8868, 79.9187),
+    "battaramulla": (6.9000, 79.9186),
+    "maharagama": (6.8480, 79.9265),
+    "nugegoda": (6.8649, 79.8997),
+    "kaduwela": (6.9333, 79.9833),
+    "homagama": (6.8412, 80.0034),
+    "avissawella": (6.9533, 80.2100),
+    "piliyandala": (6.8018, 79.9227),
+    "panadura": (6.7132, 79.9026),
+    "kalutara": (6.5854, 79.9607),
+    "beruwala": (6.4788, 79.9828),
+    "bentota": (6.4210, 80.0000),
+    "horana": (6.7159, 80.0626),
+    "gampaha": (7.0917, 79.9999),
+    "negombo": (7.2083, 79.8358),
+    "ja ela": (7.0744, 79.8919),
+    "wattala": (6.9890, 79.8920),
+    "kelaniya": (6.9553, 79.9220),
+    "kadawatha": (7.0012, 79.9530),
+    "minuwangoda": (7.1663, 79.9530),
+    "katunayake": (7.1725, 79.8853),
+    "kandy": (7.2906, 80.6337),
+    "peradeniya": (7.2690, 80.5942),
+    "katugastota": (7.3167, 80.6208),
+    "gampola": (7.1643, 80.5696),
+    "matale": (7.4675, 80.6234),
+    "dambulla": (7.8742, 80.6511),
+    "sigiriya": (7.9570, 80.7603),
+    "nuwara eliya": (6.9497, 80.7891),
+    "hatton": (6.8916, 80.5955),
+    "galle": (6.0535, 80.2210),
+    "unawatuna": (6.0100, 80.2490),
+    "hikkaduwa": (6.1395, 80.1063),
+    "ambalangoda": (6.2355, 80.0538),
+    "matara": (5.9549, 80.5550),
+    "weligama": (5.9747, 80.4296),
+    "mirissa": (5.9483, 80.4716),
+    "tangalle": (6.0243, 80.7941),
+    "hambantota": (6.1241, 81.1185),
+    "tissamaharama": (6.2783, 81.2877),
+    "kataragama": (6.4134, 81.3346),
+    "ratnapura": (6.6828, 80.3992),
+    "balangoda": (6.6469, 80.7022),
+    "embilipitiya": (6.3439, 80.8489),
+    "kegalle": (7.2513, 80.3464),
+    "mawanella": (7.2525, 80.4464),
+    "badulla": (6.9934, 81.0550),
+    "bandarawela": (6.8295, 80.9877),
+    "ella": (6.8667, 81.0466),
+    "haputale": (6.7656, 80.9513),
+    "monaragala": (6.8728, 81.3507),
+    "wellawaya": (6.7366, 81.1028),
+    "kurunegala": (7.4863, 80.3647),
+    "kuliyapitiya": (7.4688, 80.0401),
+    "puttalam": (8.0362, 79.8283),
+    "chilaw": (7.5758, 79.7953),
+    "kalpitiya": (8.2295, 79.7597),
+    "anuradhapura": (8.3114, 80.4037),
+    "mihintale": (8.3500, 80.5000),
+    "polonnaruwa": (7.9403, 81.0188),
+    "habarana": (8.0379, 80.7494),
+    "trincomalee": (8.5874, 81.2152),
+    "batticaloa": (7.7310, 81.6747),
+    "kalmunai": (7.4167, 81.8167),
+    "ampara": (7.2975, 81.6820),
+    "arugam bay": (6.8400, 81.8350),
+    "pottuvil": (6.8769, 81.8317),
+    "jaffna": (9.6615, 80.0255),
+    "point pedro": (9.8167, 80.2333),
+    "kilinochchi": (9.3803, 80.3770),
+    "mullaitivu": (9.2671, 80.8142),
+    "vavuniya": (8.7514, 80.4971),
+    "mannar": (8.9810, 79.9044),
+}
+
+# Approximate centroids used when only the province is known
+PROVINCE_COORDINATES = {
+    "western": (6.9000, 80.0500),
+    "central": (7.2500, 80.7500),
+    "southern": (6.1500, 80.6000),
+    "northern": (9.2000, 80.4000),
+    "eastern": (7.6000, 81.5000),
+    "north western": (7.7500, 80.1000),
+    "north central": (8.2000, 80.7000),
+    "uva": (6.8500, 81.2000),
+    "sabaragamuwa": (6.7500, 80.4500),
+}
+
+DEFAULT_RADIUS_KM = 25.0
+
+
+def _normalize_place(name: Optional[str]) -> str:
+    """Normalize a free text place name for gazetteer lookup"""
+    if not name:
+        return ""
+    name = name.strip().lower()
+    for suffix in (" province", " district", " city"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return " ".join(name.replace("-", " ").split())
+
+
+def lookup_city(name: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Look up a city in the bundled gazetteer"""
+    return CITY_COORDINATES.get(_normalize_place(name))
+
+
+def geocode(city: Optional[str] = None, province: Optional[str] = None,
+            service_locations: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """Resolve a provider location to a GeoJSON point using the offline gazetteer"""
+    coordinates = lookup_city(city)
+
+    # Fall back to the first service location we recognise, then the province centroid
+    if not coordinates and service_locations:
+        for location in service_locations:
+            coordinates = lookup_city(location)
+            if coordinates:
+                break
+
+    if not coordinates and province:
+        coordinates = PROVINCE_COORDINATES.get(_normalize_place(province))
+
+    if not coordinates:
+        return None
+
+    lat, lng = coordinates
+    return to_geojson_point(lat, lng)
+
+
+def to_geojson_point(lat: float, lng: float) -> dict:
+    """Build a GeoJSON point (MongoDB expects [longitude, latitude])"""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def parse_near(near: str) -> Tuple[float, float]:
+    """Parse a "lat,lng" query parameter, raising ValueError when it is malformed"""
+    parts = near.split(",")
+    if len(parts) != 2:
+        raise ValueError("near must be in the form lat,lng")
+
+    lat, lng = float(parts[0]), float(parts[1])
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ValueError("near is out of range")
+
+    return lat, lng
+
+
+def geo_near_stage(lat: float, lng: float, radius_km: float, query: dict, key: str = "geo_point") -> dict:
+    """Build a $geoNear stage ranking documents by distance from the given point"""
+    return {
+        "$geoNear": {
+            "near": to_geojson_point(lat, lng),
+            "key": key,
+            "distanceField": "distance",
+            "maxDistance": radius_km * 1000,
+            "query": query,
+            "spherical": True
+        }
+    }
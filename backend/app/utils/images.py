@@ -0,0 +1,191 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Literal, Optional, Tuple
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.utils.storage import get_storage
+
+# Longest edge (px) of each responsive variant, smallest first
+VARIANT_SIZES = {
+    "thumbnail": 320,
+    "card": 800,
+    "full": 1920
+}
+DEFAULT_VARIANT = "full"
+ImageVariant = Literal["thumbnail", "card", "full"]
+# Encoder settings per output format
+FORMAT_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60, "speed": 6}
+}
+# Refuse to decode anything larger than this (decompression bombs)
+MAX_IMAGE_PIXELS = 50_000_000
+# Images of a batch stored at once (each also uploads its variants)
+IMAGE_UPLOAD_CONCURRENCY = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _encoders(formats: List[str]) -> List[str]:
+    """The requested formats this Pillow build can actually write"""
+    from PIL import Image
+    try:
+        # Pillow releases before 11.3 only write AVIF through this plugin
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    Image.init()
+    return [fmt for fmt in formats if fmt in FORMAT_OPTIONS and FORMAT_OPTIONS[fmt]["format"] in Image.SAVE]
+
+
+def render_variants(data: bytes, formats: List[str]) -> List[Tuple[str, str, bytes, int, int]]:
+    """Decode an image and encode every (variant, format); returns (variant, format, bytes, width, height).
+
+    Runs in a worker process. Variants never upscale: a source smaller than a
+    variant's edge is re-encoded at its own size.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(io.BytesIO(data)) as source:
+        # Lets JPEG decode straight at a reduced scale when the source dwarfs the "full" variant
+        source.draft("RGB", (VARIANT_SIZES[DEFAULT_VARIANT], VARIANT_SIZES[DEFAULT_VARIANT]))
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    rendered = []
+    encoders = _encoders(formats)
+    # Largest first, each variant downscaled from the previous one
+    for name, edge in sorted(VARIANT_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        for fmt in encoders:
+            buffer = io.BytesIO()
+            image.save(buffer, **FORMAT_OPTIONS[fmt])
+            rendered.append((name, fmt, buffer.getvalue(), image.width, image.height))
+    return rendered
+
+
+def start_image_pool() -> ProcessPoolExecutor:
+    """Create the encoding pool (at startup; workers are spawned, never forked from the event loop's process)"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    return _pool or start_image_pool()
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def create_image_variants(data: bytes, folder: str, public_id: str, url: str) -> dict:
+    """Render the variants of an uploaded image and store them next to the original.
+
+    Returns the entry recorded on the document:
+    {"url": original, "thumbnail": {"width", "height", "webp", "avif"}, "card": ..., "full": ..., "public_ids": [...]}
+    Decoding and encoding run in the process pool, then all variants go to
+    storage as one batch. Any
+    failure (not an image, Pillow missing) leaves an entry with only the original,
+    which the listing endpoints fall back to.
+    """
+    entry = {"url": url, "public_ids": []}
+    try:
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(_get_pool(), render_variants, data, settings.IMAGE_VARIANT_FORMATS)
+        results = await get_storage().upload_many([
+            {"data": body, "folder": folder, "public_id": f"{public_id}_{name}_{fmt}", "filename": f"{name}.{fmt}"}
+            for name, fmt, body, _, _ in rendered
+        ])
+    except Exception as e:
+        print(f"Error creating image variants for {public_id}: {str(e)}")
+        return entry
+
+    for (name, fmt, _, width, height), result in zip(rendered, results):
+        variant = entry.setdefault(name, {"width": width, "height": height})
+        variant[fmt] = result["url"]
+        entry["public_ids"].append(result["public_id"])
+    return entry
+
+
+async def store_images(uploads: List[UploadFile], folder: str, prefix: str) -> List[Tuple[str, dict]]:
+    """Store uploaded images with their variants, a few at a time; returns (url, variants entry) in order.
+
+    Each upload is only read once its turn comes, so at most IMAGE_UPLOAD_CONCURRENCY
+    images are held in memory whatever the batch size. If any image fails, the ones
+    already stored are deleted again and the error is raised, so callers never
+    record half a batch.
+    """
+    semaphore = asyncio.Semaphore(IMAGE_UPLOAD_CONCURRENCY)
+    timestamp = datetime.now().timestamp()
+
+    async def _store(index: int, upload: UploadFile) -> Tuple[dict, dict]:
+        async with semaphore:
+            data = await upload.read()
+            public_id = f"{prefix}_{timestamp}_{index}"
+            result = await get_storage().upload(io.BytesIO(data), folder=folder, public_id=public_id, filename=upload.filename)
+            return result, await create_image_variants(data, folder, public_id, result["url"])
+
+    results = await asyncio.gather(
+        *[_store(index, upload) for index, upload in enumerate(uploads)],
+        return_exceptions=True
+    )
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        stored = [result for result in results if not isinstance(result, BaseException)]
+        await get_storage().delete_many(
+            [result["public_id"] for result, _ in stored] + [key for _, entry in stored for key in entry["public_ids"]]
+        )
+        raise failures[0]
+    return [(result["url"], entry) for result, entry in results]
+
+
+def variant_url(entry: Optional[dict], size: str = DEFAULT_VARIANT, fallback: Optional[str] = None) -> Optional[str]:
+    """URL of the requested variant (WebP, served everywhere), or the original when there is none"""
+    if entry:
+        variant = entry.get(size)
+        if variant and variant.get("webp"):
+            return variant["webp"]
+        return entry.get("url", fallback)
+    return fallback
+
+
+def with_image_variants(document: dict) -> dict:
+    """Copy of a document with its stored image_variants replaced by imageVariants.
+
+    imageVariants lines up with images: one {"thumbnail", "card", "full"} URL map per
+    image, falling back to the original for images uploaded before variants existed.
+    """
+    view = dict(document)
+    by_url = {entry.get("url"): entry for entry in view.pop("image_variants", None) or []}
+    view["imageVariants"] = [
+        {name: variant_url(by_url.get(url), name, url) for name in VARIANT_SIZES}
+        for url in view.get("images") or []
+    ]
+    return view
+
+
+def select_images(view: dict, size: Optional[str]) -> dict:
+    """Swap a view's images for one rendition (views come from with_image_variants)"""
+    if not size or "imageVariants" not in view:
+        return view
+    return {**view, "images": [variants[size] for variants in view["imageVariants"]]}
+
+
+async def delete_image_variants(entries: List[dict]):
+    """Remove the stored variants of the given entries (best effort)"""
+    await get_storage().delete_many([public_id for entry in entries for public_id in entry.get("public_ids", [])])
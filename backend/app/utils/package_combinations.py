@@ -0,0 +1,339 @@
+import heapq
+from itertools import count, islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.catalogue_arrays import PackageColumns, top_k_bundles
+from app.utils.images import select_images
+from app.utils.service_types import service_type_keys
+
+# Hard ceiling on heap pops so sparse constraints can't turn a request into a full scan
+DEFAULT_MAX_EXPANSIONS = 200000
+MAX_RATING = 5.0
+# Subsets up to this many service types are scored with broadcasting instead of the heap
+VECTORIZED_MAX_TYPES = 3
+# Broadcast cells allowed per heap expansion of the budget (a cell costs far less than a pop);
+# past that a bundle size goes back to the heap search
+CELLS_PER_EXPANSION = 64
+
+
+class BundleSearch:
+    """Best-first top-K search for package bundles spanning 2..N service types.
+
+    Packages are held as NumPy columns (see PackageColumns), grouped per service
+    type and sorted by score (price, or rating deficit when sort_by="rating").
+    Pairs and triples are scored across all service types at once by broadcasting
+    over a growing, score-sorted prefix of the candidates. Larger bundles fall back
+    to enumerating service type subsets lazily in order of their lower bound and
+    exploring each with a k-smallest-sums heap, as do pairs and triples whose
+    broadcast search outgrows its share of max_expansions (sparse feasibility).
+    Either way bundles come out
+    cheapest (or best-rated) first without materializing the Cartesian product.
+    """
+
+    def __init__(
+        self,
+        packages: Sequence[dict],
+        max_budget: Optional[float] = None,
+        service_filter: Optional[str] = None,
+        max_services: int = 2,
+        sort_by: str = "price",
+        ratings: Optional[Dict[str, float]] = None,
+        crowd_size: Optional[int] = None,
+        event_type: Optional[str] = None,
+        top_k: int = 20,
+        max_expansions: int = DEFAULT_MAX_EXPANSIONS,
+        columns: Optional[PackageColumns] = None,
+        image_size: Optional[str] = None
+    ):
+        self.max_budget = max_budget
+        self.image_size = image_size
+        self.sort_by = sort_by
+        self.ratings = ratings or {}
+        self.top_k = top_k
+        self.max_expansions = max_expansions
+        self.expansions = 0
+
+        # Callers holding a prebuilt columnar catalogue can pass it in directly
+        self.columns = columns if columns is not None else PackageColumns(packages)
+        self.display_names: Dict[str, str] = self.columns.service_names
+        self.scores = self._scores()
+
+        # Per-package constraints evaluated over the whole catalogue at once
+        keep = self.columns.fits(crowd_size=crowd_size, event_type=event_type, max_price=max_budget)
+        candidates = np.flatnonzero(keep)
+
+        # Sort by (score, price) so successors in the search never get cheaper, then split per type
+        order = candidates[np.lexsort((self.columns.price[candidates], self.scores[candidates]))]
+        codes = self.columns.service_code[order]
+        self.groups: Dict[str, np.ndarray] = {}
+        for code in np.unique(codes):
+            self.groups[self.columns.service_keys[code]] = order[codes == code]
+
+        self.required = [key for key in service_type_keys(service_filter) if key in self.groups] if service_filter else []
+        self.missing_required = bool(service_filter) and len(self.required) < len(service_type_keys(service_filter))
+        self.max_services = max(max_services, len(self.required), 2)
+
+        # Budget pruning: drop packages that can't fit even with the cheapest partners
+        if self.max_budget is not None and self.sort_by == "price":
+            self._prune_to_budget()
+            self.missing_required = self.missing_required or any(key not in self.groups for key in self.required)
+
+        # Optional types ordered by their cheapest package (the subset lower bound)
+        self.optional = sorted(
+            (key for key in self.groups if key not in self.required),
+            key=lambda key: self._floor(key)
+        )
+
+    def _scores(self) -> np.ndarray:
+        """Per-package search keys; smaller is better"""
+        if self.sort_by == "rating":
+            provider_ratings = np.zeros(len(self.columns.provider_index), dtype=np.float64)
+            for provider_id, code in self.columns.provider_index.items():
+                provider_ratings[code] = self.ratings.get(provider_id, 0)
+            return MAX_RATING - provider_ratings[self.columns.provider_code]
+        return self.columns.price
+
+    def _floor(self, key: str) -> float:
+        """Best (smallest) score available for a service type"""
+        return float(self.scores[self.groups[key][0]])
+
+    def _prune_to_budget(self):
+        """Trim each sorted group to the prefix that can still fit within the budget"""
+        cheapest = {key: self._floor(key) for key in self.groups}
+
+        for key, group in list(self.groups.items()):
+            # Cheapest spend on the partners any bundle containing this type must have
+            partners = [cheapest[other] for other in self.required if other != key]
+            floor = sum(partners)
+            if len(partners) + 1 < 2:
+                floor += min(
+                    (price for other, price in cheapest.items() if other != key and other not in self.required),
+                    default=float("inf")
+                )
+            self.groups[key] = group[self.scores[group] <= self.max_budget - floor]
+
+        self.groups = {key: group for key, group in self.groups.items() if len(group)}
+
+    def _feasible(self, indices: Tuple[int, ...]) -> bool:
+        """Bundle-level constraints: distinct providers, budget, overlapping crowd sizes and event types"""
+        providers, prices, crowd_min, crowd_max, event_bits = self.columns.rows()
+
+        if len({providers[i] for i in indices}) < len(indices):
+            return False
+
+        if self.max_budget is not None and sum(prices[i] for i in indices) > self.max_budget:
+            return False
+
+        if max(crowd_min[i] for i in indices) > min(crowd_max[i] for i in indices):
+            return False
+
+        shared = event_bits[indices[0]]
+        for i in indices[1:]:
+            shared &= event_bits[i]
+        return shared != 0
+
+    def _vectorized_bundles(self) -> Tuple[List[Tuple[float, Tuple[int, ...]]], List[int]]:
+        """Top-K bundles of 2..VECTORIZED_MAX_TYPES packages, scored with broadcasting.
+
+        Also returns the bundle sizes that ran out of cell budget, for the heap search.
+        """
+        def sorted_candidates(keys):
+            candidates = np.concatenate([self.groups[key] for key in keys])
+            return candidates[np.lexsort((self.columns.price[candidates], self.scores[candidates]))]
+
+        candidates = sorted_candidates(self.groups)
+
+        required = None
+        if self.required:
+            codes = [self.columns.service_keys.index(key) for key in self.required]
+            required = np.isin(self.columns.service_code, codes)
+
+        bundles = []
+        fallback = []
+        for size in range(max(2, len(self.required)), min(self.max_services, VECTORIZED_MAX_TYPES) + 1):
+            # A bundle made only of required types never needs to look at the rest of the catalogue
+            pool = sorted_candidates(self.required) if size == len(self.required) else candidates
+            found = top_k_bundles(
+                self.columns, self.scores, pool, size, self.top_k, self.max_budget,
+                required=required, required_count=len(self.required),
+                max_cells=self.max_expansions * CELLS_PER_EXPANSION
+            )
+            if found is None:
+                fallback.append(size)
+            else:
+                bundles.extend(found)
+
+        bundles.sort(key=lambda item: item[0])
+        return bundles[:self.top_k], fallback
+
+    def _subsets(self, sizes: Sequence[int]) -> Iterator[Tuple[float, Tuple[str, ...]]]:
+        """Yield service type subsets of the given sizes for the heap search, in increasing order of their lower bound"""
+        required_floor = sum(self._floor(key) for key in self.required)
+        optional_floors = [self._floor(key) for key in self.optional]
+        n = len(optional_floors)
+
+        heap = []
+        seen = set()
+        for size in sizes:
+            extra = size - len(self.required)
+            if extra < 0 or extra > n:
+                continue
+            start = tuple(range(extra))
+            heap.append((required_floor + sum(optional_floors[i] for i in start), start))
+            seen.add(start)
+        heapq.heapify(heap)
+
+        while heap:
+            floor, indices = heapq.heappop(heap)
+            yield floor, tuple(self.required) + tuple(self.optional[i] for i in indices)
+
+            # Successors: shift one index right without colliding with its neighbour
+            for pos in range(len(indices)):
+                upper = indices[pos + 1] if pos + 1 < len(indices) else n
+                if indices[pos] + 1 < upper:
+                    successor = indices[:pos] + (indices[pos] + 1,) + indices[pos + 1:]
+                    if successor not in seen:
+                        seen.add(successor)
+                        heapq.heappush(heap, (
+                            floor - optional_floors[indices[pos]] + optional_floors[indices[pos] + 1],
+                            successor
+                        ))
+
+    def _bundles_for(self, subset: Tuple[str, ...]) -> Iterator[Tuple[float, Tuple[int, ...]]]:
+        """Yield feasible bundles (as package indices) for one subset in increasing score order"""
+        # Plain lists: this loop touches one element at a time
+        groups = [self.groups[key].tolist() for key in subset]
+        arrays = [self.scores[self.groups[key]].tolist() for key in subset]
+        start = (0,) * len(arrays)
+        heap = [(sum(array[0] for array in arrays), start, 0)]
+
+        while heap and self.expansions < self.max_expansions:
+            score, indices, last = heapq.heappop(heap)
+            self.expansions += 1
+
+            # Scores only grow from here, so nothing left in this subset fits the budget
+            if self.sort_by == "price" and self.max_budget is not None and score > self.max_budget:
+                return
+
+            bundle = tuple(group[idx] for group, idx in zip(groups, indices))
+            if self._feasible(bundle):
+                yield score, bundle
+
+            # Only advance positions >= the last advanced one so each state is generated once
+            for pos in range(last, len(arrays)):
+                if indices[pos] + 1 < len(arrays[pos]):
+                    successor = indices[:pos] + (indices[pos] + 1,) + indices[pos + 1:]
+                    heapq.heappush(heap, (
+                        score - arrays[pos][indices[pos]] + arrays[pos][indices[pos] + 1],
+                        successor,
+                        pos
+                    ))
+
+    def __iter__(self) -> Iterator[Tuple[Tuple[str, ...], Tuple[dict, ...]]]:
+        """Stream (service types, bundle) pairs across all subsets, best first"""
+        if self.missing_required or len(self.groups) < 2:
+            return
+
+        merged = []
+        tiebreak = count()
+
+        def push(generator):
+            following = next(generator, None)
+            if following is not None:
+                heapq.heappush(merged, (following[0], next(tiebreak), following[1], generator))
+
+        # Pairs and triples arrive as one pre-sorted stream
+        heap_sizes = list(range(max(VECTORIZED_MAX_TYPES + 1, len(self.required)), self.max_services + 1))
+        if self.max_services >= 2 and len(self.required) <= VECTORIZED_MAX_TYPES:
+            bundles, fallback = self._vectorized_bundles()
+            push(iter(bundles))
+            heap_sizes = fallback + heap_sizes
+
+        subsets = self._subsets(heap_sizes)
+        pending = next(subsets, None)
+
+        while True:
+            # Open subsets whose lower bound could still beat the current best bundle
+            while pending is not None and (not merged or pending[0] <= merged[0][0]):
+                floor, subset = pending
+                if self.sort_by == "price" and self.max_budget is not None and floor > self.max_budget:
+                    pending = None
+                    break
+                push(self._bundles_for(subset))
+                pending = next(subsets, None)
+
+            if not merged:
+                return
+
+            _, _, bundle, generator = heapq.heappop(merged)
+            keys = tuple(self.columns.service_keys[self.columns.service_code[i]] for i in bundle)
+            yield keys, tuple(self.columns.packages[i] for i in bundle)
+
+            push(generator)
+
+    def build_combined_package(self, subset: Tuple[str, ...], bundle: Tuple[dict, ...]) -> dict:
+        """Shape a bundle like the combined packages the frontend already renders"""
+        # Bundle packages can be raw catalogue views (prebuilt columns), so the rendition is picked here
+        if self.image_size:
+            bundle = tuple(select_images(pkg, self.image_size) for pkg in bundle)
+
+        service_names = [self.display_names[key].capitalize() for key in subset]
+        event_types = set(bundle[0].get("eventTypes", []))
+        for pkg in bundle[1:]:
+            event_types &= set(pkg.get("eventTypes", []))
+
+        combined_pkg = {
+            "id": f"combo_{'_'.join([pkg['id'] for pkg in bundle])}",
+            "name": f"{' & '.join(service_names)} Package",
+            "description": f"Combined package including {', '.join([pkg['name'] for pkg in bundle])}",
+            "price": sum(pkg.get("price", 0) for pkg in bundle),
+            "currency": bundle[0].get("currency", "LKR"),
+            "eventTypes": sorted(event_types),
+            "crowdSizeMin": max([pkg.get("crowdSizeMin", 0) for pkg in bundle]),
+            "crowdSizeMax": min([pkg.get("crowdSizeMax", 1000) for pkg in bundle]),
+            "images": [img for pkg in bundle for img in pkg.get("images", [])[:1] if img],
+            "combined": True,
+            "packages": list(bundle),
+            "serviceTypes": service_names
+        }
+
+        if self.ratings:
+            combined_pkg["rating"] = round(
+                sum(self.ratings.get(pkg.get("provider_id"), 0) for pkg in bundle) / len(bundle), 2
+            )
+
+        return combined_pkg
+
+
+def generate_package_combinations(
+    packages: Sequence[dict],
+    max_budget: Optional[float],
+    service_filter: Optional[str] = None,
+    top_k: int = 20,
+    max_services: int = 2,
+    sort_by: str = "price",
+    ratings: Optional[Dict[str, float]] = None,
+    crowd_size: Optional[int] = None,
+    event_type: Optional[str] = None,
+    columns: Optional[PackageColumns] = None,
+    image_size: Optional[str] = None
+) -> List[dict]:
+    """Return the top-K cheapest (or best-rated) bundles that fit within the budget"""
+    search = BundleSearch(
+        packages,
+        max_budget=max_budget,
+        service_filter=service_filter,
+        max_services=max_services,
+        sort_by=sort_by,
+        ratings=ratings,
+        crowd_size=crowd_size,
+        event_type=event_type,
+        top_k=top_k,
+        columns=columns,
+        image_size=image_size
+    )
+
+    # Only the bundles we actually return are turned into response dicts
+    return [search.build_combined_package(subset, bundle) for subset, bundle in islice(search, top_k)]
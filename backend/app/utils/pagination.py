@@ -0,0 +1,84 @@
+import base64
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# How long a total count is reused before it is recounted
+COUNT_CACHE_SECONDS = 60
+COUNT_CACHE_MAX_ENTRIES = 1024
+# Counts for searches stop here; listings only need "more than a few pages"
+MAX_SEARCH_COUNT = 10000
+
+_count_cache: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+
+def encode_cursor(value: Any, document_id: ObjectId) -> str:
+    """Opaque cursor for the position just after (value, _id) in a keyset-ordered listing"""
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = json.dumps([value, str(document_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """Inverse of encode_cursor; raises ValueError for anything it didn't produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, document_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if isinstance(value, dict) and "$date" in value:
+            value = datetime.fromisoformat(value["$date"])
+        return value, ObjectId(document_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_filter(field: str, cursor: Optional[str], descending: bool = True) -> dict:
+    """Filter selecting the documents after a cursor in (field, _id) order"""
+    if not cursor:
+        return {}
+    value, document_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [{field: {op: value}}, {field: value, "_id": {op: document_id}}]}
+
+
+def next_cursor(documents: list, field: str, limit: int) -> Optional[str]:
+    """Cursor for the following page, or None when this page is the last one.
+
+    Callers fetch limit + 1 documents; the extra one only signals that more exist
+    and is dropped from the list here.
+    """
+    if len(documents) <= limit:
+        return None
+    del documents[limit:]
+    last = documents[-1]
+    return encode_cursor(last.get(field), last["_id"])
+
+
+async def cached_count(collection, query: dict, limit: Optional[int] = None) -> int:
+    """Total for a listing, recounted at most every COUNT_CACHE_SECONDS per collection and filter.
+
+    The count may lag writes by up to that long, which is fine for a page total and
+    keeps a count over a million documents off every page load.
+    """
+    key = f"{collection.name}:{json.dumps(query, sort_keys=True, default=str)}:{limit}"
+    now = time.monotonic()
+    cached = _count_cache.get(key)
+    if cached and now - cached[0] < COUNT_CACHE_SECONDS:
+        _count_cache.move_to_end(key)
+        return cached[1]
+
+    count = await collection.count_documents(query, **({"limit": limit} if limit else {}))
+    _count_cache[key] = (now, count)
+    _count_cache.move_to_end(key)
+    while len(_count_cache) > COUNT_CACHE_MAX_ENTRIES:
+        _count_cache.popitem(last=False)
+    return count
@@ -0,0 +1,166 @@
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import Request, Response
+
+from app.utils.serialization import dumps
+
+# Shared caches may store these but must revalidate (cheap, thanks to ETags) before reuse
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def provider_tag(provider_id: str) -> str:
+    return f"provider:{provider_id}"
+
+
+def gallery_tag(provider_id: str) -> str:
+    return f"gallery:{provider_id}"
+
+
+def provider_packages_tag(provider_id: str) -> str:
+    return f"provider_packages:{provider_id}"
+
+
+def package_tag(package_id: str) -> str:
+    return f"package:{package_id}"
+
+
+def reviews_tag(provider_id: str) -> str:
+    return f"reviews:{provider_id}"
+
+
+PROMOTIONS_TAG = "promotions"
+
+
+def document_versions(documents: Iterable[dict], *fields: str) -> List[tuple]:
+    """(id, version) pairs for ETag computation, from a projection of _id and timestamp fields"""
+    fields = fields or ("updated_at",)
+    versions = []
+    for document in documents:
+        version = next((document.get(field) for field in fields if document.get(field) is not None), None)
+        if isinstance(version, datetime):
+            version = version.isoformat()
+        versions.append((str(document.get("_id", document.get("id"))), version))
+    return versions
+
+
+class CachedBody:
+    __slots__ = ("etag", "body", "tags")
+
+    def __init__(self, etag: str, body: bytes, tags: List[str]):
+        self.etag = etag
+        self.body = body
+        self.tags = tags
+
+
+class ResponseCache:
+    """In-process LRU of serialized JSON responses, validated by strong ETags.
+
+    ETags hash the versions (updated_at) of the documents behind a response
+    together with a per-tag generation counter. Write routes call invalidate()
+    with the affected tags, which bumps the generation (so ETags change even
+    when a write didn't touch updated_at) and drops the cached bodies.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        self._generations: Dict[str, int] = {}
+
+    def etag(self, tags: Iterable[str], *versions) -> str:
+        """Strong ETag over document versions and the current generation of each tag"""
+        digest = hashlib.sha1()
+        for tag in tags:
+            digest.update(f"{tag}#{self._generations.get(tag, 0)}|".encode("utf-8"))
+        digest.update(repr(versions).encode("utf-8"))
+        return f'"{digest.hexdigest()}"'
+
+    @staticmethod
+    def key(request: Request) -> str:
+        return f"{request.url.path}?{request.url.query}"
+
+    @staticmethod
+    def _matches(request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        candidates = [value.strip() for value in header.split(",")]
+        # Weak comparison is what If-None-Match specifies
+        return "*" in candidates or etag in [value[2:] if value.startswith("W/") else value for value in candidates]
+
+    def lookup(self, request: Request, etag: str, cache_control: str = PUBLIC_CACHE_CONTROL) -> Optional[Response]:
+        """304 when the client already has this version, the cached body when we do, else None"""
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if self._matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        entry = self._entries.get(self.key(request))
+        if entry is None or entry.etag != etag:
+            return None
+
+        self._entries.move_to_end(self.key(request))
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def store(self, request: Request, etag: str, data, tags: Iterable[str],
+              cache_control: str = PUBLIC_CACHE_CONTROL) -> Response:
+        """Serialize data, keep it for later hits and return it with validators attached"""
+        # Serialized once; cached hits skip encoding entirely
+        body = dumps(data)
+        key = self.key(request)
+        tags = list(tags)
+
+        self._remove(key)
+        if len(body) <= self.max_bytes:
+            self._entries[key] = CachedBody(etag, body, tags)
+            self.size += len(body)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            self._evict()
+
+        return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": cache_control})
+
+    def invalidate(self, *tags: str):
+        """Drop every cached response carrying any of the tags and bump their generations"""
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._keys_by_tag.pop(tag, ())):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+
+def conditional_response(request: Request, data, cache_control: str = PRIVATE_CACHE_CONTROL) -> Response:
+    """Serialize per-user data with an ETag over the body, answering revalidations with a 304"""
+    body = dumps(data)
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if ResponseCache._matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Process-wide cache shared by the public read endpoints
+response_cache = ResponseCache()
@@ -0,0 +1,40 @@
+import re
+from typing import Dict, Tuple
+
+# Fields admins can prefix-search per collection; each has a lowercased copy stored as <field>_lower
+SEARCH_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("name", "email", "business_name"),
+    "service_provider_profiles": ("provider_name", "business_name", "contact_email"),
+    "promotions": ("title",),
+}
+
+# Longest search string accepted by the admin lists
+MAX_SEARCH_LENGTH = 100
+
+
+def search_key(field: str) -> str:
+    return f"{field}_lower"
+
+
+def normalize_search(value: str) -> str:
+    """Normalize a stored value or a search string the same way"""
+    return value.strip().lower()
+
+
+def search_fields(collection: str, data: dict) -> dict:
+    """Lowercased copies of the searchable fields present in data, to $set next to them"""
+    return {
+        search_key(field): normalize_search(data[field])
+        for field in SEARCH_FIELDS[collection]
+        if isinstance(data.get(field), str)
+    }
+
+
+def prefix_filter(collection: str, search: str) -> dict:
+    """Case-insensitive prefix match on any searchable field.
+
+    The pattern is an anchored, case-sensitive regex on the lowercased copies, which
+    MongoDB turns into a bounded range scan on each field's index.
+    """
+    pattern = "^" + re.escape(normalize_search(search))
+    return {"$or": [{search_key(field): {"$regex": pattern}} for field in SEARCH_FIELDS[collection]]}
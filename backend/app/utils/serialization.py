@@ -0,0 +1,46 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# Non-string dict keys (e.g. ints) are stringified the way json.dumps would
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any):
+    """Encode the BSON and Python types orjson doesn't handle natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize raw Mongo documents straight to JSON bytes.
+
+    datetimes, dates and UUIDs are encoded natively by orjson (ISO 8601, same as
+    jsonable_encoder); ObjectIds become strings.
+    """
+    return orjson.dumps(data, default=_default, option=DUMPS_OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, skipping FastAPI's jsonable_encoder pass.
+
+    Routes return it directly (return MongoJSONResponse(result)) so FastAPI doesn't
+    walk every nested value of large lists before encoding them.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,50 @@
+from typing import List, Optional, Union
+
+
+def normalize_service_type(service_type: str) -> str:
+    """Normalize a single service type into the key used for exact index lookups"""
+    return service_type.strip().lower()
+
+
+def split_service_types(service_types: Union[str, List[str], None]) -> List[str]:
+    """Split the comma-separated service_types string into clean display values"""
+    if not service_types:
+        return []
+
+    if isinstance(service_types, str):
+        service_types = service_types.split(',')
+
+    # Drop empty entries and duplicates while keeping the original order
+    result = []
+    for service_type in service_types:
+        service_type = service_type.strip()
+        if service_type and service_type not in result:
+            result.append(service_type)
+
+    return result
+
+
+def service_type_keys(service_types: Union[str, List[str], None]) -> List[str]:
+    """Build the normalized array stored in service_provider_profiles.service_type_list"""
+    keys = []
+    for service_type in split_service_types(service_types):
+        key = normalize_service_type(service_type)
+        if key not in keys:
+            keys.append(key)
+
+    return keys
+
+
+def primary_service_type(service_types: Union[str, List[str], None]) -> Optional[str]:
+    """Get the provider's primary (first listed) service type"""
+    values = split_service_types(service_types)
+    return values[0] if values else None
+
+
+def package_service_type_fields(service_types: Union[str, List[str], None]) -> dict:
+    """Fields denormalized from the provider profile onto each provider_packages document"""
+    service_type = primary_service_type(service_types)
+    return {
+        "serviceType": service_type or "",
+        "serviceTypeKey": normalize_service_type(service_type) if service_type else None
+    }
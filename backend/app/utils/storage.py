@@ -0,0 +1,355 @@
+import asyncio
+import io
+import os
+import posixpath
+import shutil
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote, unquote
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils.file_store import UPLOAD_DIR, temp_path
+
+Upload = Union[bytes, BinaryIO]
+
+# Concurrent requests a batch keeps in flight against a remote backend
+DEFAULT_UPLOAD_CONCURRENCY = 4
+# Cloudinary's Admin API deletes at most this many resources per call
+CLOUDINARY_DELETE_BATCH = 100
+# Served by the local backend under LOCAL_STORAGE_URL
+LOCAL_STORAGE_DIR = os.path.join(UPLOAD_DIR, "media")
+
+# Leading bytes of the formats we store, for uploads that arrive without a filename
+FORMAT_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF8", "gif"),
+    (b"%PDF", "pdf")
+]
+
+
+def _sniff_format(head: bytes) -> str:
+    for signature, fmt in FORMAT_SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "avif"
+    return "bin"
+
+
+def _read_head(data: Upload, length: int = 16) -> bytes:
+    if isinstance(data, bytes):
+        return data[:length]
+    position = data.tell()
+    head = data.read(length)
+    data.seek(position)
+    return head
+
+
+def upload_format(data: Upload, filename: Optional[str] = None) -> str:
+    """File extension for an upload: from its filename, else from its content"""
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return extension or _sniff_format(_read_head(data))
+
+
+def _image_size(data: Upload) -> Tuple[Optional[int], Optional[int]]:
+    """Pixel size of an image upload, when Pillow is installed and can read it"""
+    try:
+        from PIL import Image
+        source = io.BytesIO(data) if isinstance(data, bytes) else data
+        position = source.tell()
+        try:
+            with Image.open(source) as image:
+                return image.width, image.height
+        finally:
+            source.seek(position)
+    except Exception:
+        return None, None
+
+
+def stored_object(url: str, public_id: str, resource_type: str, fmt: str, size: int,
+                  width: Optional[int] = None, height: Optional[int] = None) -> dict:
+    """What every backend returns for an upload"""
+    return {
+        "url": url,
+        "public_id": public_id,
+        "resource_type": resource_type,
+        "format": fmt,
+        "bytes": size,
+        "width": width,
+        "height": height
+    }
+
+
+class StorageBackend(ABC):
+    """Where user media lives. Routes upload, delete and build URLs only through this interface.
+
+    public_id is the backend's opaque key for an object: callers store it next to
+    the URL and hand it back to delete.
+    """
+
+    name = "base"
+    upload_concurrency = DEFAULT_UPLOAD_CONCURRENCY
+
+    @abstractmethod
+    async def upload(self, data: Upload, folder: str, public_id: str,
+                     resource_type: str = "image", filename: Optional[str] = None) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, public_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def url(self, public_id: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def public_id_from_url(self, url: str) -> Optional[str]:
+        """Key of an object from its URL, for documents that only stored the URL"""
+        raise NotImplementedError
+
+    async def upload_many(self, items: List[dict]) -> List[dict]:
+        """Upload several objects ({"data", "folder", "public_id", ...upload kwargs}), keeping order"""
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def _upload(item: dict) -> dict:
+            async with semaphore:
+                return await self.upload(**item)
+
+        return list(await asyncio.gather(*[_upload(item) for item in items]))
+
+    async def delete_many(self, public_ids: List[str]) -> List[str]:
+        """Delete several objects, best effort: failures are logged and returned, not raised"""
+        failed = []
+        for public_id in public_ids:
+            try:
+                await self.delete(public_id)
+            except Exception as e:
+                print(f"Error deleting {public_id} from {self.name} storage: {str(e)}")
+                failed.append(public_id)
+        return failed
+
+    async def delete_url(self, url: str):
+        """Delete an object known only by its URL (best effort)"""
+        public_id = self.public_id_from_url(url)
+        if public_id:
+            await self.delete_many([public_id])
+
+
+class CloudinaryStorage(StorageBackend):
+    name = "cloudinary"
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str):
+        import cloudinary
+        import cloudinary.api
+        import cloudinary.uploader
+        import cloudinary.utils
+
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self._api = cloudinary.api
+        self._uploader = cloudinary.uploader
+        self._utils = cloudinary.utils
+
+    async def upload(self, data: Upload, folder: str, public_id: str,
+                     resource_type: str = "image", filename: Optional[str] = None) -> dict:
+        result = await run_in_threadpool(
+            self._uploader.upload, data, folder=folder, public_id=public_id, resource_type=resource_type
+        )
+        return stored_object(
+            result["secure_url"],
+            result["public_id"],
+            result.get("resource_type", resource_type),
+            result.get("format", ""),
+            result.get("bytes", 0),
+            result.get("width"),
+            result.get("height")
+        )
+
+    async def delete(self, public_id: str):
+        await run_in_threadpool(self._uploader.destroy, public_id)
+
+    async def delete_many(self, public_ids: List[str]) -> List[str]:
+        # One Admin API call per hundred resources instead of one destroy each, a few calls at a time
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def _delete_batch(batch: List[str]) -> List[str]:
+            async with semaphore:
+                try:
+                    await run_in_threadpool(self._api.delete_resources, batch)
+                    return []
+                except Exception as e:
+                    print(f"Error deleting {len(batch)} resources from Cloudinary: {str(e)}")
+                    return batch
+
+        failed = await asyncio.gather(*[
+            _delete_batch(public_ids[start:start + CLOUDINARY_DELETE_BATCH])
+            for start in range(0, len(public_ids), CLOUDINARY_DELETE_BATCH)
+        ])
+        return [public_id for batch in failed for public_id in batch]
+
+    def url(self, public_id: str) -> str:
+        return self._utils.cloudinary_url(public_id, secure=True)[0]
+
+    def public_id_from_url(self, url: str) -> Optional[str]:
+        # The format is typically: .../upload/v1234567890/folder/filename.ext
+        url_parts = url.split("/")
+        if "upload" not in url_parts:
+            return None
+        upload_index = url_parts.index("upload")
+        if upload_index + 2 >= len(url_parts):
+            return None
+        # The part after the version, without the extension
+        folder_and_file = "/".join(url_parts[upload_index + 2:])
+        return folder_and_file.rsplit(".", 1)[0]
+
+
+class LocalStorage(StorageBackend):
+    """Objects as files under root, served by the app itself at base_url (see main.py)"""
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _key(self, folder: str, public_id: str, fmt: str) -> str:
+        key = posixpath.normpath(posixpath.join(folder, f"{public_id}.{fmt}"))
+        # Folders can come from users (cloud storage); never leave the storage root
+        if key.startswith("/") or key == ".." or key.startswith("../"):
+            raise ValueError(f"Invalid storage key: {key}")
+        return key
+
+    def _path(self, public_id: str) -> str:
+        # Keys also come from URLs sent by clients (delete_url), so every file access is contained in root
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, *posixpath.normpath(public_id).split("/")))
+        if path == root or os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Invalid storage key: {public_id}")
+        return path
+
+    def _write(self, data: Upload, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = temp_path(path)
+        try:
+            with open(partial, "wb") as handle:
+                if isinstance(data, bytes):
+                    handle.write(data)
+                else:
+                    shutil.copyfileobj(data, handle)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def _store(self, data: Upload, folder: str, public_id: str, resource_type: str, filename: Optional[str]) -> dict:
+        fmt = upload_format(data, filename)
+        key = self._key(folder, public_id, fmt)
+        width, height = _image_size(data) if resource_type in ("image", "auto") else (None, None)
+        path = self._path(key)
+        self._write(data, path)
+        resource = "image" if width else ("raw" if resource_type == "auto" else resource_type)
+        return stored_object(self.url(key), key, resource, fmt, os.path.getsize(path), width, height)
+
+    async def upload(self, data: Upload, folder: str, public_id: str,
+                     resource_type: str = "image", filename: Optional[str] = None) -> dict:
+        return await run_in_threadpool(self._store, data, folder, public_id, resource_type, filename)
+
+    async def upload_many(self, items: List[dict]) -> List[dict]:
+        # All files written in one threadpool hop
+        def _store_all():
+            return [
+                self._store(item["data"], item["folder"], item["public_id"],
+                            item.get("resource_type", "image"), item.get("filename"))
+                for item in items
+            ]
+        return await run_in_threadpool(_store_all)
+
+    def _remove(self, public_id: str):
+        try:
+            os.remove(self._path(public_id))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, public_id: str):
+        await run_in_threadpool(self._remove, public_id)
+
+    async def delete_many(self, public_ids: List[str]) -> List[str]:
+        # All files removed in one threadpool hop
+        def _remove_all():
+            failed = []
+            for public_id in public_ids:
+                try:
+                    self._remove(public_id)
+                except (OSError, ValueError) as e:
+                    print(f"Error deleting {public_id} from local storage: {str(e)}")
+                    failed.append(public_id)
+            return failed
+        return await run_in_threadpool(_remove_all)
+
+    def url(self, public_id: str) -> str:
+        return f"{self.base_url}/{quote(public_id)}"
+
+    def public_id_from_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.base_url}/"
+        return unquote(url[len(prefix):]) if url.startswith(prefix) else None
+
+
+class MemoryStorage(StorageBackend):
+    """Objects kept in a dict; for tests and benchmarks, nothing touches disk or network"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+
+    async def upload(self, data: Upload, folder: str, public_id: str,
+                     resource_type: str = "image", filename: Optional[str] = None) -> dict:
+        body = data if isinstance(data, bytes) else data.read()
+        key = posixpath.join(folder, public_id)
+        self.objects[key] = body
+        width, height = _image_size(body) if resource_type in ("image", "auto") else (None, None)
+        return stored_object(self.url(key), key, resource_type, upload_format(body, filename), len(body), width, height)
+
+    async def delete(self, public_id: str):
+        self.objects.pop(public_id, None)
+
+    def url(self, public_id: str) -> str:
+        return f"memory://{public_id}"
+
+    def public_id_from_url(self, url: str) -> Optional[str]:
+        return url[len("memory://"):] if url.startswith("memory://") else None
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage(backend: str) -> StorageBackend:
+    if backend == "cloudinary":
+        if not (settings.CLOUDINARY_CLOUD_NAME and settings.CLOUDINARY_API_KEY and settings.CLOUDINARY_API_SECRET):
+            raise RuntimeError("STORAGE_BACKEND is cloudinary but the CLOUDINARY_* settings are missing")
+        return CloudinaryStorage(settings.CLOUDINARY_CLOUD_NAME, settings.CLOUDINARY_API_KEY, settings.CLOUDINARY_API_SECRET)
+    if backend == "local":
+        return LocalStorage(LOCAL_STORAGE_DIR, settings.LOCAL_STORAGE_URL)
+    if backend == "memory":
+        return MemoryStorage()
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage() -> StorageBackend:
+    """The configured backend, created on first use rather than at import time"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(settings.STORAGE_BACKEND)
+    return _storage
+
+
+def set_storage(backend: Optional[StorageBackend]):
+    """Swap the backend (tests and benchmarks); None goes back to the configured one"""
+    global _storage
+    _storage = backend
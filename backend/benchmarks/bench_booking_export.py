@@ -0,0 +1,91 @@
+"""Stream a synthetic export of one million bookings and check peak memory stays flat.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_booking_export [bookings]
+"""
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.utils.booking_export import csv_chunks, parquet_chunks, pa
+
+BOOKINGS = 1_000_000
+# Peak memory allowed while exporting, independent of the number of bookings; checked against the
+# Python allocations (tracemalloc) and, for Parquet, pyarrow's memory pool, which tracemalloc doesn't see
+MEMORY_CEILING_BYTES = 32 * 1024 * 1024
+
+
+async def synthetic_cursor(count: int, seed: int = 42):
+    """Async iterator standing in for a Motor cursor; documents are generated on the fly"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for index in range(count):
+        created_at = start + timedelta(minutes=index)
+        total = rng.randint(50, 2000) * 1000
+        payments = [
+            {
+                "amount": total // 4,
+                "method": rng.choice(["card", "bank_transfer"]),
+                "date": created_at + timedelta(days=day),
+                "status": "completed",
+                "type": "advance" if day == 0 else "balance"
+            }
+            for day in range(rng.randint(0, 3))
+        ]
+        yield {
+            "_id": ObjectId(),
+            "status": rng.choice(["pending", "confirmed", "cancelled"]),
+            "eventDate": created_at + timedelta(days=rng.randint(7, 120)),
+            "eventType": rng.choice(["wedding", "birthday", "corporate"]),
+            "eventLocation": f"Venue {rng.randint(1, 200)}, Colombo",
+            "crowdSize": rng.randint(20, 800),
+            "fullName": f"Customer {index}",
+            "email": f"customer{index}@example.com",
+            "phone": "0771234567",
+            "userId": str(ObjectId()),
+            "providerId": str(ObjectId()),
+            "packageId": str(ObjectId()),
+            "totalAmount": total,
+            "remainingAmount": total - sum(p["amount"] for p in payments),
+            "createdAt": created_at,
+            "payments": payments
+        }
+
+
+async def run(label, stream_factory, count, uses_arrow=False):
+    tracemalloc.start()
+    started = time.perf_counter()
+    total_bytes = 0
+    async for chunk in stream_factory(synthetic_cursor(count)):
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    line = f"{label:<10} {elapsed:8.1f} s  output={total_bytes / 1024 / 1024:8.1f} MiB  peak={peak / 1024 / 1024:6.1f} MiB"
+    passed = peak <= MEMORY_CEILING_BYTES
+    if uses_arrow:
+        arrow_peak = pa.default_memory_pool().max_memory()
+        line += f"  arrow peak={arrow_peak / 1024 / 1024:6.1f} MiB"
+        passed = passed and arrow_peak <= MEMORY_CEILING_BYTES
+    print(f"{line}  {'ok' if passed else 'OVER CEILING'}")
+    return passed
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else BOOKINGS
+    print(f"Exporting {count} bookings (ceiling {MEMORY_CEILING_BYTES / 1024 / 1024:.0f} MiB)")
+
+    passed = asyncio.run(run("csv", csv_chunks, count))
+    if pa is not None:
+        passed = asyncio.run(run("parquet", parquet_chunks, count, uses_arrow=True)) and passed
+    else:
+        print("parquet    skipped (pyarrow not installed)")
+
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,93 @@
+"""Benchmark the grouped-mode bundle search on a synthetic catalogue.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_package_combinations
+"""
+import random
+import time
+
+from app.utils.catalogue_arrays import PackageColumns
+from app.utils.package_combinations import generate_package_combinations
+
+SERVICE_TYPES = 50
+PACKAGES_PER_TYPE = 500
+EVENT_TYPES = ["wedding", "birthday", "corporate", "engagement", "anniversary", "party"]
+# Catalogue where no bundle is feasible: each service type serves its own event type
+INFEASIBLE_SERVICE_TYPES = 3
+INFEASIBLE_PACKAGES_PER_TYPE = 1500
+
+
+def build_catalogue(seed: int = 42):
+    """Build SERVICE_TYPES x PACKAGES_PER_TYPE active packages"""
+    rng = random.Random(seed)
+    packages = []
+    for service_index in range(SERVICE_TYPES):
+        for package_index in range(PACKAGES_PER_TYPE):
+            crowd_min = rng.randint(0, 300)
+            packages.append({
+                "id": f"{service_index}_{package_index}",
+                "name": f"Package {service_index}-{package_index}",
+                "price": rng.randint(5, 500) * 1000,
+                "currency": "LKR",
+                "provider_id": f"provider_{service_index}_{rng.randint(0, 99)}",
+                "serviceType": f"Service {service_index}",
+                "crowdSizeMin": crowd_min,
+                "crowdSizeMax": crowd_min + rng.randint(50, 700),
+                "eventTypes": rng.sample(EVENT_TYPES, rng.randint(1, 4)),
+                "images": []
+            })
+    return packages
+
+
+def build_infeasible_catalogue(seed: int = 7):
+    """Build INFEASIBLE_SERVICE_TYPES x INFEASIBLE_PACKAGES_PER_TYPE packages with disjoint event types"""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"x{service_index}_{package_index}",
+            "name": f"Package x{service_index}-{package_index}",
+            "price": rng.randint(5, 500) * 1000,
+            "currency": "LKR",
+            "provider_id": f"provider_x{service_index}_{package_index}",
+            "serviceType": f"Service {service_index}",
+            "crowdSizeMin": 0,
+            "crowdSizeMax": 1000,
+            "eventTypes": [f"event {service_index}"],
+            "images": []
+        }
+        for service_index in range(INFEASIBLE_SERVICE_TYPES)
+        for package_index in range(INFEASIBLE_PACKAGES_PER_TYPE)
+    ]
+
+
+def run(label, packages, **kwargs):
+    started = time.perf_counter()
+    bundles = generate_package_combinations(packages, **kwargs)
+    elapsed = (time.perf_counter() - started) * 1000
+    cheapest = bundles[0]["price"] if bundles else None
+    print(f"{label:<40} {elapsed:8.1f} ms  bundles={len(bundles):<3} cheapest={cheapest}")
+
+
+if __name__ == "__main__":
+    catalogue = build_catalogue()
+    print(f"Catalogue: {SERVICE_TYPES} service types x {PACKAGES_PER_TYPE} packages = {len(catalogue)}")
+
+    started = time.perf_counter()
+    columns = PackageColumns(catalogue)
+    print(f"{'build columns':<40} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    run("pairs, budget 500k, top 20", catalogue, max_budget=500000)
+    run("pairs, budget 500k, prebuilt columns", catalogue, max_budget=500000, columns=columns)
+    run("pairs + triples, prebuilt columns", catalogue, max_budget=500000, max_services=3, columns=columns)
+    run("pairs + triples, budget 500k, top 20", catalogue, max_budget=500000, max_services=3)
+    run("up to 5 services, budget 1M, top 50", catalogue, max_budget=1000000, max_services=5, top_k=50)
+    run("fixed 3 services, budget 300k", catalogue, max_budget=300000, service_filter="Service 1,Service 2,Service 3")
+    run("pairs, crowd 400, wedding", catalogue, max_budget=500000, crowd_size=400, event_type="wedding")
+
+    ratings = {package["provider_id"]: random.Random(package["provider_id"]).uniform(1, 5) for package in catalogue}
+    run("pairs, best rated, budget 500k", catalogue, max_budget=500000, sort_by="rating", ratings=ratings)
+
+    # Nothing fits: the broadcast search must give up within its budget and hand over to the heap
+    infeasible = build_infeasible_catalogue()
+    run("infeasible pairs + triples, no budget", infeasible, max_budget=None, max_services=3)
@@ -0,0 +1,86 @@
+"""Compare FastAPI's default JSON encoding with the orjson response path on booking-like documents.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization
+"""
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.utils.serialization import dumps
+
+BOOKINGS = 1000
+ROUNDS = 20
+
+
+def build_bookings(seed: int = 42):
+    """BOOKINGS documents shaped like GET /bookings/user responses"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    bookings = []
+    for index in range(BOOKINGS):
+        created_at = now - timedelta(days=rng.randint(0, 365))
+        bookings.append({
+            "id": str(ObjectId()),
+            "userId": str(ObjectId()),
+            "eventDate": (created_at + timedelta(days=rng.randint(7, 120))).strftime("%Y-%m-%d"),
+            "eventLocation": f"Venue {rng.randint(1, 200)}, Colombo",
+            "guestCount": rng.randint(20, 800),
+            "totalAmount": rng.randint(50, 2000) * 1000,
+            "advanceAmount": rng.randint(10, 200) * 1000,
+            "status": rng.choice(["pending", "advance_paid", "confirmed", "completed", "cancelled"]),
+            "createdAt": created_at,
+            "updatedAt": created_at + timedelta(hours=rng.randint(1, 48)),
+            "services": [
+                {
+                    "providerId": ObjectId(),
+                    "packageId": ObjectId(),
+                    "serviceName": f"Service {rng.randint(1, 50)}",
+                    "price": rng.randint(5, 500) * 1000
+                }
+                for _ in range(rng.randint(1, 4))
+            ],
+            "payments": [
+                {
+                    "_id": ObjectId(),
+                    "amount": rng.randint(5, 200) * 1000,
+                    "method": rng.choice(["card", "bank_transfer"]),
+                    "paidAt": created_at + timedelta(days=day)
+                }
+                for day in range(rng.randint(0, 3))
+            ]
+        })
+    return bookings
+
+
+def default_encode(data) -> bytes:
+    """What FastAPI does for a route returning plain dicts"""
+    return json.dumps(jsonable_encoder(data, custom_encoder={ObjectId: str})).encode("utf-8")
+
+
+def measure(label, encode, data):
+    encode(data)
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        body = encode(data)
+    elapsed = (time.perf_counter() - started) * 1000 / ROUNDS
+
+    tracemalloc.start()
+    encode(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<32} {elapsed:8.2f} ms  peak={peak / 1024:8.1f} KiB  body={len(body) / 1024:7.1f} KiB")
+
+
+if __name__ == "__main__":
+    bookings = build_bookings()
+    print(f"{BOOKINGS} bookings, mean of {ROUNDS} rounds")
+    measure("jsonable_encoder + json.dumps", default_encode, bookings)
+    measure("orjson (MongoJSONResponse)", dumps, bookings)
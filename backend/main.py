@@ -1,11 +1,24 @@
 from fastapi import FastAPI, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
 from app.api.routes import users, auth, providers, admin, promotions, reviews, chat, bookings, provider_bookings, packages
 from app.api.routes import files, cloud_storage, notifications, provider_stats  # Add provider_stats import
 from app.db.mongodb import connect_to_mongo, close_mongo_connection
 from app.db.mongodb import get_database
+from app.db.indexes import ensure_indexes
+from app.db.migrations import run_migrations
+from app.db.catalogue import catalogue
+from app.db.booking_jobs import run_auto_accept_job
+from app.db.analytics import run_compaction_job
+from app.db.upload_sessions import run_upload_sweeper
+from app.db.cloud_jobs import resume_cloud_jobs
+from app.db.cloud_usage import run_usage_reconciliation
+from app.utils.images import start_image_pool, shutdown_image_pool
+from app.utils.storage import LOCAL_STORAGE_DIR
 import asyncio
+import os
+from urllib.parse import urlparse
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 
@@ -94,6 +107,17 @@ async def startup_db_client():
     await connect_to_mongo()
     print("Connected to MongoDB!")
     
+    # Create indexes and backfill derived fields before serving requests
+    db = await get_database()
+    await ensure_indexes(db)
+    await run_migrations(db)
+    
+    # Worker processes for image variant encoding
+    start_image_pool()
+    
+    # Load the in-memory catalogue and keep it in sync with the database
+    await catalogue.start(db)
+    
     # Validate email configuration
     if settings.SMTP_USER and settings.SMTP_PASSWORD:
         print("Email configuration found.")
@@ -102,9 +126,28 @@ async def startup_db_client():
     
     # Start background task for event reminders
     asyncio.create_task(check_upcoming_events())
+    
+    # Confirm pending bookings the provider hasn't answered in time
+    asyncio.create_task(run_auto_accept_job(db))
+    
+    # Rebuild the daily analytics counters from bookings and reviews every night
+    asyncio.create_task(run_compaction_job(db))
+    
+    # Remove resumable uploads abandoned before completion
+    asyncio.create_task(run_upload_sweeper(db))
+    
+    # Rebuild the per-user cloud storage counters from the files every night
+    asyncio.create_task(run_usage_reconciliation(db))
+    
+    # Pick up cloud storage jobs interrupted by the last shutdown
+    resumed = await resume_cloud_jobs(db)
+    if resumed:
+        print(f"Resumed {resumed} cloud storage jobs")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await catalogue.stop()
+    shutdown_image_pool()
     await close_mongo_connection()
 
 # Include routers with prefix
@@ -126,13 +169,18 @@ app.include_router(provider_stats.router, prefix=settings.API_V1_STR)  # Add thi
 # Ensure providers router is included - add this line explicitly
 app.include_router(providers.router, prefix=settings.API_V1_STR)
 
+# The local storage backend's files are served by the app itself
+if settings.STORAGE_BACKEND == "local":
+    os.makedirs(LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(urlparse(settings.LOCAL_STORAGE_URL).path or "/media", StaticFiles(directory=LOCAL_STORAGE_DIR), name="media")
+
 # Add debug route at root level
 @app.get("/debug-routes")
 async def debug_routes():
     """List all registered routes for debugging"""
     routes = []
     for route in app.routes:
-        routes.append({"path": route.path, "name": route.name, "methods": route.methods})
+        routes.append({"path": route.path, "name": route.name, "methods": getattr(route, "methods", None)})
     return {"routes": routes}
 
 @app.get("/")
@@ -39,6 +39,7 @@ import {
 import adminService, { AdminUserData } from "@/services/adminService";
 import { toast } from "sonner";
 import { formatDate, getTimeAgo } from "@/utils/dateUtils";
+import { useDebounce } from "@/hooks/use-debounce";
 
 // Define interfaces for type safety
 interface SelectedImage {
@@ -59,12 +60,15 @@ const AdminUsers = () => {
   const [currentPage, setCurrentPage] = useState(1);
   const usersPerPage = 10;
 
-  // Fetch users on component mount
+  // Searches go to the server once typing pauses
+  const debouncedSearch = useDebounce(searchQuery);
+
+  // Fetch users on mount and whenever the search changes
   useEffect(() => {
     const fetchUsers = async () => {
       try {
         setIsLoading(true);
-        const fetchedUsers = await adminService.getAllUsers();
+        const fetchedUsers = await adminService.getAllUsers({ search: debouncedSearch });
         setUsers(fetchedUsers);
       } catch (error) {
         console.error("Failed to fetch users:", error);
@@ -75,7 +79,7 @@ const AdminUsers = () => {
     };
 
     fetchUsers();
-  }, []);
+  }, [debouncedSearch]);
 
   // Filter users based on search query
   const filteredUsers = users.filter(user => 
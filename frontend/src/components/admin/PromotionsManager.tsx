@@ -42,6 +42,7 @@ import {
 } from "@/components/ui/select";
 import adminService, { Promotion } from "@/services/adminService";
 import { formatDate } from "@/utils/dateUtils";
+import { useDebounce } from "@/hooks/use-debounce";
 import { PublicEvent } from "@/types";
 
 // Define interfaces for both promotions and public events
@@ -111,15 +112,18 @@ const PromotionsManager = () => {
   const [promotionBannerFile, setPromotionBannerFile] = useState<File | null>(null);
   const [eventBannerFile, setEventBannerFile] = useState<File | null>(null);
 
-  // Fetch promotions and events on component mount
+  // Searches go to the server once typing pauses
+  const debouncedSearch = useDebounce(searchQuery);
+
+  // Fetch promotions and events on mount and whenever the search changes
   useEffect(() => {
     fetchItems();
-  }, []);
+  }, [debouncedSearch]);
 
   const fetchItems = async () => {
     setIsLoading(true);
     try {
-      const promotions = await adminService.getAllPromotions();
+      const promotions = await adminService.getAllPromotions({ search: debouncedSearch });
       setItems(promotions);
     } catch (error) {
       console.error("Error fetching promotions:", error);
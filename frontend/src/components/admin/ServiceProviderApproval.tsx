@@ -58,6 +58,7 @@ import { toast } from "sonner";
 import ServiceProviderDetailsDialog from "./ServiceProviderDetailsDialog";
 import adminService from "@/services/adminService";
 import { formatDistanceToNow } from "date-fns";
+import { useDebounce } from "@/hooks/use-debounce";
 
 // Interfaces
 interface ServiceProvider {
@@ -100,16 +101,20 @@ const ServiceProviderApproval: React.FC = () => {
   const [sortDirection, setSortDirection] = useState<"asc" | "desc">("desc");
   const [isRefreshing, setIsRefreshing] = useState(false);
 
+  // Searches go to the server once typing pauses
+  const debouncedSearch = useDebounce(searchTerm);
+
   // Fetch service providers
   const fetchServiceProviders = async () => {
     try {
       setIsLoading(true);
       
       // Get pending providers from your API
-      const pendingProviders = await adminService.getPendingServiceProviders();
+      const options = { search: debouncedSearch };
+      const pendingProviders = await adminService.getPendingServiceProviders(options);
       // Get approved and rejected providers
-      const approvedProviders = await adminService.getApprovedServiceProviders();
-      const rejectedProviders = await adminService.getRejectedServiceProviders();
+      const approvedProviders = await adminService.getApprovedServiceProviders(options);
+      const rejectedProviders = await adminService.getRejectedServiceProviders(options);
       
       // Transform all data to match ServiceProvider interface
       const formattedProviders = [...pendingProviders, ...approvedProviders, ...rejectedProviders].map(provider => ({
@@ -146,10 +151,10 @@ const ServiceProviderApproval: React.FC = () => {
     }
   };
 
-  // Initial load
+  // Initial load, and again whenever the search changes
   useEffect(() => {
     fetchServiceProviders();
-  }, []);
+  }, [debouncedSearch]);
 
   // Apply filters, search, and sorting
   const applyFilters = (
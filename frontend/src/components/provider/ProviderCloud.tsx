@@ -33,14 +33,18 @@ const ProviderCloud = () => {
   const [isUploading, setIsUploading] = useState(false);
   const [totalFiles, setTotalFiles] = useState(0);
   const [page, setPage] = useState(0);
+  // Cursor of every page visited so far (the first page has none), so Previous can go back
+  const [pageCursors, setPageCursors] = useState<(string | undefined)[]>([undefined]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const limit = 30;
+  const cursor = pageCursors[page];
   
   // Load files, folders and stats
   const loadData = useCallback(async () => {
     setIsLoading(true);
     try {
       const [filesData, foldersData, statsData] = await Promise.all([
-        cloudService.getFiles(currentFolder, limit, page * limit),
+        cloudService.getFiles(currentFolder, limit, cursor),
         cloudService.getFolders(),
         cloudService.getStats()
       ]);
@@ -49,6 +53,7 @@ const ProviderCloud = () => {
       setFolders(foldersData);
       setStats(statsData);
       setTotalFiles(filesData.total);
+      setNextCursor(filesData.nextCursor);
       
     } catch (error) {
       toast.error("Failed to load cloud data");
@@ -56,12 +61,24 @@ const ProviderCloud = () => {
     } finally {
       setIsLoading(false);
     }
-  }, [currentFolder, page]);
+  }, [currentFolder, cursor]);
   
   useEffect(() => {
     loadData();
   }, [loadData]);
   
+  // Start from the first page when switching folders
+  useEffect(() => {
+    setPage(0);
+    setPageCursors([undefined]);
+  }, [currentFolder]);
+  
+  const goToNextPage = () => {
+    if (!nextCursor) return;
+    setPageCursors((prev) => [...prev.slice(0, page + 1), nextCursor]);
+    setPage((prev) => prev + 1);
+  };
+  
   // File upload handling
   const handleFileUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const files = event.target.files;
@@ -187,7 +204,7 @@ const ProviderCloud = () => {
   );
   
   // For pagination
-  const hasMoreFiles = (page + 1) * limit < totalFiles;
+  const hasMoreFiles = nextCursor !== null;
   
   return (
     <div className="space-y-6">
@@ -434,7 +451,7 @@ const ProviderCloud = () => {
                       variant="outline" 
                       size="sm"
                       disabled={!hasMoreFiles}
-                      onClick={() => setPage(prev => prev + 1)}
+                      onClick={goToNextPage}
                     >
                       Next
                     </Button>
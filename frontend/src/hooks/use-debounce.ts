@@ -0,0 +1,12 @@
+import * as React from "react"
+
+export function useDebounce<T>(value: T, delay = 300) {
+  const [debounced, setDebounced] = React.useState(value)
+
+  React.useEffect(() => {
+    const timer = setTimeout(() => setDebounced(value), delay)
+    return () => clearTimeout(timer)
+  }, [value, delay])
+
+  return debounced
+}
@@ -106,6 +106,29 @@ export interface Promotion {
   eventDate?: string;
 }
 
+// Options for the paginated admin lists
+export interface AdminListOptions {
+  // Case-insensitive prefix search, done by the server
+  search?: string;
+}
+
+// Largest page the admin list endpoints return
+const ADMIN_PAGE_SIZE = 100;
+
+// Fetch every page of an admin list by following the X-Next-Cursor header
+const fetchAllPages = async <T>(url: string, options: AdminListOptions = {}): Promise<T[]> => {
+  const items: T[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await adminApi.get(url, {
+      params: { limit: ADMIN_PAGE_SIZE, cursor, search: options.search?.trim() || undefined },
+    });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'] || undefined;
+  } while (cursor);
+  return items;
+};
+
 // Admin service functions
 const adminService = {
   // Check if super admin exists
@@ -126,10 +149,9 @@ const adminService = {
   },
 
   // Get pending service providers
-  getPendingServiceProviders: async (): Promise<ServiceProviderProfile[]> => {
+  getPendingServiceProviders: async (options: AdminListOptions = {}): Promise<ServiceProviderProfile[]> => {
     try {
-      const response = await adminApi.get('/admin/service-providers/pending');
-      return response.data;
+      return await fetchAllPages<ServiceProviderProfile>('/admin/service-providers/pending', options);
     } catch (error: any) {
       console.error('Error fetching pending service providers:', error);
       // If it's a CORS error, log a more helpful message
@@ -141,10 +163,9 @@ const adminService = {
   },
 
   // Get approved service providers
-  getApprovedServiceProviders: async (): Promise<ServiceProviderProfile[]> => {
+  getApprovedServiceProviders: async (options: AdminListOptions = {}): Promise<ServiceProviderProfile[]> => {
     try {
-      const response = await adminApi.get('/admin/service-providers/approved');
-      return response.data;
+      return await fetchAllPages<ServiceProviderProfile>('/admin/service-providers/approved', options);
     } catch (error) {
       console.error('Error fetching approved service providers:', error);
       if (error instanceof Error && error.message === 'Network Error') {
@@ -155,17 +176,16 @@ const adminService = {
   },
 
   // Get rejected service providers
-  getRejectedServiceProviders: async (): Promise<ServiceProviderProfile[]> => {
-    const response = await adminApi.get('/admin/service-providers/rejected');
-    return response.data;
+  getRejectedServiceProviders: async (options: AdminListOptions = {}): Promise<ServiceProviderProfile[]> => {
+    return fetchAllPages<ServiceProviderProfile>('/admin/service-providers/rejected', options);
   },
 
   // Get all service providers
-  getAllServiceProviders: async (): Promise<ServiceProviderProfile[]> => {
+  getAllServiceProviders: async (options: AdminListOptions = {}): Promise<ServiceProviderProfile[]> => {
     try {
       // Get all service providers - approved and rejected
-      const approved = await adminService.getApprovedServiceProviders();
-      const rejected = await adminService.getRejectedServiceProviders();
+      const approved = await adminService.getApprovedServiceProviders(options);
+      const rejected = await adminService.getRejectedServiceProviders(options);
       
       // Combine both lists
       return [...approved, ...rejected];
@@ -193,10 +213,9 @@ const adminService = {
   },
 
   // Get all regular users
-  getAllUsers: async (): Promise<AdminUserData[]> => {
+  getAllUsers: async (options: AdminListOptions = {}): Promise<AdminUserData[]> => {
     try {
-      const response = await adminApi.get('/admin/users');
-      return response.data;
+      return await fetchAllPages<AdminUserData>('/admin/users', options);
     } catch (error: any) {
       console.error('Error fetching users:', error);
       if (error.message === 'Network Error') {
@@ -223,10 +242,9 @@ const adminService = {
   // Promotion management functions
   
   // Get all promotions
-  getAllPromotions: async (): Promise<Promotion[]> => {
+  getAllPromotions: async (options: AdminListOptions = {}): Promise<Promotion[]> => {
     try {
-      const response = await adminApi.get('/admin/promotions');
-      return response.data;
+      return await fetchAllPages<Promotion>('/admin/promotions', options);
     } catch (error: any) {
       console.error('Error fetching promotions:', error);
       throw error;
@@ -75,17 +75,22 @@ const cloudService = {
   },
   
   // Get all files with optional folder filter
-  getFiles: async (folder?: string, limit: number = 50, skip: number = 0): Promise<{files: CloudFile[], total: number}> => {
-    let url = `/cloud/files?limit=${limit}&skip=${skip}`;
+  // Pages are chained through nextCursor (pass the previous page's value as cursor)
+  getFiles: async (folder?: string, limit: number = 50, cursor?: string): Promise<{files: CloudFile[], total: number, nextCursor: string | null}> => {
+    let url = `/cloud/files?limit=${limit}`;
     if (folder) {
       url += `&folder=${encodeURIComponent(folder)}`;
     }
+    if (cursor) {
+      url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
     
     try {
       const response = await api.get(url);
       return {
         files: response.data.files,
-        total: response.data.total
+        total: response.data.total,
+        nextCursor: response.data.next_cursor ?? null
       };
     } catch (error) {
       console.error('Error fetching files:', error);